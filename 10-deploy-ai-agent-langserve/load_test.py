@@ -0,0 +1,345 @@
+"""
+Load generator and soak test for the LangServe endpoints of langserve-endpoints.py.
+
+Sessions (conversations of LOAD_TEST_TURNS turns, sent like langserve-chatbot.py
+does) arrive at random (a Poisson process of LOAD_TEST_RATE sessions per second)
+for LOAD_TEST_DURATION seconds, each one against one of the LOAD_TEST_ENDPOINTS
+(invoke, stream and/or stream_events). For every request it records the latency,
+the time to the first token of the response (TTFT) and whether it failed, and
+meanwhile samples the memory (RSS) of the server process.
+
+The report has the throughput, p50/p95/p99 latency and TTFT and the error rate per
+endpoint, and the server's RSS over time (a steady climb during a long soak test
+is a leak). Latencies count from when the request was due, so a saturated server
+(or client) shows up in the percentiles instead of slowing down the arrivals.
+
+For reproducible results, run the server with the offline LLM and tools
+(OFFLINE_MODE=true, see offline_stubs.py, with AGENT_VERBOSE=false and
+AGENT_CHECKPOINTER=memory), or let the load test start it (LOAD_TEST_START_SERVER=true). Every session picks its prompts from a seeded
+random generator, so two runs send the same load.
+
+python load_test.py [report.json]
+"""
+
+from dotenv import load_dotenv
+from datetime import datetime
+import contextlib
+import subprocess
+import asyncio
+import psutil
+import random
+import httpx
+import json
+import time
+import uuid
+import sys
+import os
+
+load_dotenv()
+
+agent_endpoint_url = os.getenv('AGENT_ENDPOINT_URL', 'http://localhost:8000')
+arrival_rate = float(os.getenv('LOAD_TEST_RATE', '5'))
+duration = float(os.getenv('LOAD_TEST_DURATION', '60'))
+# The number of turns per session, a single number or a range like 1-4
+turns_range = os.getenv('LOAD_TEST_TURNS', '1-4')
+endpoints = [endpoint.strip() for endpoint in os.getenv('LOAD_TEST_ENDPOINTS', 'invoke,stream,stream_events').split(",")]
+think_time = float(os.getenv('LOAD_TEST_THINK_TIME', '0'))
+max_connections = int(os.getenv('LOAD_TEST_MAX_CONNECTIONS', '500'))
+request_timeout = float(os.getenv('LOAD_TEST_TIMEOUT', '120'))
+sample_interval = float(os.getenv('LOAD_TEST_SAMPLE_INTERVAL', '1'))
+server_pid = int(os.getenv('LOAD_TEST_SERVER_PID', '0'))
+start_server = os.getenv('LOAD_TEST_START_SERVER', 'false').lower() in ["true", "yes", "1"]
+seed = int(os.getenv('LOAD_TEST_SEED', '42'))
+
+system_message = f"""
+You are a personal assistant who helps manage tasks in Asana and documents in Google Drive.
+You never give IDs to the user since those are just for you to keep track of.
+The current date is: {datetime.now().date()}
+"""
+
+# Each prompt matches one of the scripted fixtures of the offline mode, so every turn exercises
+# the Asana, Drive or knowledgebase tools (or a plain answer) without errors. Realistic for a real model too.
+prompts = [
+    "Hi! What can you help me with?",
+    "What projects do I have in Asana?",
+    "What tasks are in my Website Redesign project?",
+    "Create a task to review the wireframes due tomorrow.",
+    "Remind me to book the offsite.",
+    "Find the meeting notes in my Google Drive.",
+    "What are the action items from the meeting?",
+    "Thanks, that's all for today."
+]
+
+def get_turn_count(rng):
+    low, _, high = turns_range.partition("-")
+    return rng.randint(int(low), int(high or low))
+
+def get_ai_text(data):
+    """Gets the text of the AI messages (or chunks) anywhere in a serialized output."""
+    if isinstance(data, list):
+        return "".join(get_ai_text(item) for item in data)
+    if not isinstance(data, dict):
+        return ""
+    if data.get("type") in ["ai", "AIMessageChunk"]:
+        content = data.get("content", "")
+        if isinstance(content, list):
+            return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+        return content
+    return "".join(get_ai_text(value) for value in data.values() if isinstance(value, (dict, list)))
+
+async def send_invoke(client, body):
+    response = await client.post(f"{agent_endpoint_url}/invoke", json=body)
+    response.raise_for_status()
+    messages = response.json()["output"]["messages"]
+    # The response is the last AI message of the final state
+    return None, get_ai_text([message for message in messages if message.get("type") == "ai"][-1:])
+
+async def send_streaming(client, endpoint, body, start):
+    """
+    Sends a request to /stream or /stream_events and reads the server-sent events.
+
+    Returns:
+        tuple: The TTFT in seconds (None if no text was streamed) and the response text
+    """
+    ttft = None
+    text = ""
+    event_type = None
+
+    async with client.stream("POST", f"{agent_endpoint_url}/{endpoint}", json=body) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                event_type = line[len("event:"):].strip()
+            elif line.startswith("data:") and event_type == "error":
+                raise Exception(f"Error event: {line[len('data:'):].strip()}")
+            elif line.startswith("data:") and event_type == "data":
+                data = json.loads(line[len("data:"):])
+                if endpoint == "stream_events":
+                    chunk_text = get_ai_text(data["data"].get("chunk")) if data.get("event") == "on_chat_model_stream" else ""
+                    text += chunk_text
+                else:
+                    # /stream sends the state update of each node, the last AI message is the response
+                    chunk_text = get_ai_text(data)
+                    text = chunk_text or text
+
+                if chunk_text and ttft is None:
+                    ttft = time.perf_counter() - start
+
+    return ttft, text
+
+async def run_session(client, session_index, endpoint, rng, results, arrival):
+    """Runs one conversation, sending the whole history every turn like langserve-chatbot.py."""
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    messages = [{"type": "system", "content": system_message}]
+
+    for turn in range(get_turn_count(rng)):
+        messages.append({"type": "human", "content": rng.choice(prompts)})
+        body = {"input": {"messages": messages}, "config": config}
+        # The first turn counts from when the session was due to arrive, even if the client was busy
+        record = {"session": session_index, "turn": turn + 1, "endpoint": endpoint, "started": arrival if turn == 0 else time.perf_counter()}
+
+        try:
+            if endpoint == "invoke":
+                ttft, text = await send_invoke(client, body)
+            else:
+                ttft, text = await send_streaming(client, endpoint, body, record["started"])
+            record.update(error=None, ttft=ttft)
+        except Exception as e:
+            record.update(error=f"{type(e).__name__}: {e}"[:200], ttft=None)
+            text = ""
+
+        record["finished"] = time.perf_counter()
+        record["latency"] = record["finished"] - record["started"]
+        # A non streaming response arrives all at once
+        if record["ttft"] is None and record["error"] is None:
+            record["ttft"] = record["latency"]
+        results.append(record)
+
+        if record["error"]:
+            break
+
+        messages.append({"type": "ai", "content": text})
+        if think_time:
+            await asyncio.sleep(rng.expovariate(1 / think_time))
+
+def get_server_process():
+    try:
+        if server_pid:
+            return psutil.Process(server_pid)
+
+        # Otherwise the process listening on the endpoint's port, if it's on this machine
+        port = httpx.URL(agent_endpoint_url).port or 80
+        for connection in psutil.net_connections(kind="tcp"):
+            if connection.status == psutil.CONN_LISTEN and connection.laddr.port == port and connection.pid:
+                return psutil.Process(connection.pid)
+    except psutil.Error as e:
+        # Listing other processes' connections needs root on macOS (AccessDenied), the load test runs without RSS
+        print(f"Couldn't look up the server process: {e!r}")
+
+    return None
+
+def get_rss(process):
+    # With gunicorn the workers are child processes of the one listening
+    processes = [process] + process.children(recursive=True)
+    return sum(child.memory_info().rss for child in processes if child.is_running())
+
+async def sample_rss(process, samples, start, active):
+    while True:
+        try:
+            samples.append({"time": time.perf_counter() - start, "rss_mb": get_rss(process) / 1024 ** 2, "active_sessions": active()})
+        except psutil.Error:
+            pass
+        await asyncio.sleep(sample_interval)
+
+def percentile(values, p):
+    """Gets the p-th percentile (0-100) of the values, interpolating between the closest ranks."""
+    if not values:
+        return None
+
+    values = sorted(values)
+    rank = (len(values) - 1) * p / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+def summarize(records, elapsed):
+    completed = [record for record in records if record["error"] is None]
+    latencies = [record["latency"] for record in completed]
+    ttfts = [record["ttft"] for record in completed if record["ttft"] is not None]
+
+    return {
+        "requests": len(records),
+        "errors": len(records) - len(completed),
+        "error_rate": (len(records) - len(completed)) / len(records) if records else 0.0,
+        "throughput": len(completed) / elapsed if elapsed else 0.0,
+        **{f"latency_p{p}": percentile(latencies, p) for p in (50, 95, 99)},
+        **{f"ttft_p{p}": percentile(ttfts, p) for p in (50, 95, 99)}
+    }
+
+async def run_load_test():
+    """
+    Sends the load and samples the server's memory.
+
+    Returns:
+        dict: The settings, the summary per endpoint (and overall), every request and the RSS samples
+    """
+    rng = random.Random(seed)
+    process = get_server_process()
+    if process is None:
+        print("Couldn't find the server process (set LOAD_TEST_SERVER_PID), the RSS won't be sampled")
+
+    results = []
+    samples = []
+    sessions = []
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+
+    async with httpx.AsyncClient(limits=limits, timeout=request_timeout) as client:
+        start = time.perf_counter()
+        sampler = asyncio.create_task(sample_rss(process, samples, start, lambda: sum(not session.done() for session in sessions))) if process else None
+
+        # Poisson arrivals: exponential gaps between the sessions, whether or not the previous ones finished
+        next_arrival = start
+        while next_arrival - start < duration:
+            await asyncio.sleep(max(0, next_arrival - time.perf_counter()))
+            session_index = len(sessions)
+            session_rng = random.Random(rng.random())
+            sessions.append(asyncio.create_task(run_session(client, session_index, endpoints[session_index % len(endpoints)], session_rng, results, next_arrival)))
+            next_arrival += rng.expovariate(arrival_rate)
+
+        print(f"Sent {len(sessions)} sessions in {duration:.0f}s, waiting for them to finish")
+        await asyncio.gather(*sessions)
+        elapsed = time.perf_counter() - start
+
+        if sampler:
+            sampler.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await sampler
+
+    for record in results:
+        record["started"] -= start
+        record["finished"] -= start
+
+    return {
+        "started_at": datetime.now().isoformat(),
+        "settings": {
+            "endpoint_url": agent_endpoint_url, "rate": arrival_rate, "duration": duration, "turns": turns_range,
+            "endpoints": endpoints, "think_time": think_time, "max_connections": max_connections, "seed": seed
+        },
+        "elapsed": elapsed,
+        "sessions": len(sessions),
+        "summary": {
+            "all": summarize(results, elapsed),
+            **{endpoint: summarize([record for record in results if record["endpoint"] == endpoint], elapsed) for endpoint in endpoints}
+        },
+        "rss": samples,
+        "requests": results
+    }
+
+def format_seconds(value):
+    return "-" if value is None else f"{value * 1000:.0f}ms"
+
+def print_report(report):
+    print(f"\n{report['sessions']} sessions in {report['elapsed']:.1f}s at {report['settings']['rate']} sessions/s")
+    print(f"\n{'Endpoint':<14} | {'Requests':>8} | {'Errors':>6} | {'Req/s':>7} | {'p50':>8} | {'p95':>8} | {'p99':>8} | {'TTFT p50':>8} | {'TTFT p95':>8} | {'TTFT p99':>8}")
+    print("-" * 112)
+    for endpoint, summary in report["summary"].items():
+        print(
+            f"{endpoint:<14} | {summary['requests']:>8} | {summary['error_rate']:>6.1%} | {summary['throughput']:>7.1f} | "
+            f"{format_seconds(summary['latency_p50']):>8} | {format_seconds(summary['latency_p95']):>8} | {format_seconds(summary['latency_p99']):>8} | "
+            f"{format_seconds(summary['ttft_p50']):>8} | {format_seconds(summary['ttft_p95']):>8} | {format_seconds(summary['ttft_p99']):>8}"
+        )
+
+    if report["rss"]:
+        rss = [sample["rss_mb"] for sample in report["rss"]]
+        # Not every climb is a leak: the offline tools keep what they create up to OFFLINE_STORE_MAX_ITEMS
+        # per store, and the memory checkpointer keeps the checkpoints of every session until the server stops
+        print(f"\nServer RSS: {rss[0]:.0f}MB at the start, {max(rss):.0f}MB peak, {rss[-1]:.0f}MB at the end")
+        # Roughly 10 points of the RSS over time
+        for sample in report["rss"][::max(1, len(report["rss"]) // 10)]:
+            print(f"  {sample['time']:>6.0f}s  {sample['rss_mb']:>7.1f}MB  {sample['active_sessions']:>5} active sessions")
+
+    errors = {}
+    for record in report["requests"]:
+        if record["error"]:
+            errors[record["error"]] = errors.get(record["error"], 0) + 1
+    for error, count in sorted(errors.items(), key=lambda item: -item[1])[:5]:
+        print(f"\n{count}x {error}")
+
+def start_offline_server():
+    """Starts langserve-endpoints.py with the offline LLM and tools and waits for it to accept requests."""
+    server = subprocess.Popen(
+        [sys.executable, "langserve-endpoints.py"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        # Quiet and with the in-memory checkpointer unless set otherwise: printing every node (even to /dev/null)
+        # and the aiosqlite checkpointer each cost about a fifth of the throughput (see offline_stubs.py)
+        env={"AGENT_VERBOSE": "false", "AGENT_CHECKPOINTER": "memory", **os.environ, "OFFLINE_MODE": "true"},
+        stdout=subprocess.DEVNULL
+    )
+
+    for _ in range(60):
+        try:
+            httpx.get(f"{agent_endpoint_url}/docs", timeout=1)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.5)
+
+    server.terminate()
+    raise Exception("The offline server didn't start in 30 seconds")
+
+if __name__ == "__main__":
+    server = start_offline_server() if start_server else None
+    if server:
+        server_pid = server.pid
+
+    try:
+        report = asyncio.run(run_load_test())
+    finally:
+        if server:
+            server.terminate()
+
+    print_report(report)
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "w") as report_file:
+            json.dump(report, report_file, indent=2)
+        print(f"\nSaved the report to {sys.argv[1]}")
@@ -0,0 +1,573 @@
+"""
+Offline mode for the agent: a chat model that replays recorded or scripted
+responses, and in-memory Asana, Google Drive and Chroma tools.
+
+With OFFLINE_MODE=true, runnable.py builds the same graph (nodes, checkpointer,
+tool calls, streaming) without calling OpenAI, Anthropic or Groq and without
+touching Asana, Drive or the vector DB. Everything is deterministic, so load
+tests (load_test.py) and profiles of the graph's own overhead are reproducible
+and don't cost any API quota.
+
+The fixtures are JSON lines, each one a conversation turn: a regex "match" for
+the latest user message and the "steps" of the agent for it (a tool calls step
+per agent call, then the final response):
+
+{"match": "projects", "steps": [
+    {"tool_calls": [{"name": "get_asana_projects", "args": {}}]},
+    {"content": "You have two projects: Website Redesign and Marketing."}
+]}
+
+Set OFFLINE_FIXTURES to a fixtures file (the scripted fixtures below are used
+otherwise). To record fixtures from a real model, run the agent normally with
+OFFLINE_RECORD set to a file: every agent step is appended to it, and that file
+can then be used as OFFLINE_FIXTURES.
+
+The latency of the real services is simulated with OFFLINE_FIRST_TOKEN_DELAY,
+OFFLINE_TOKEN_DELAY (per streamed token) and OFFLINE_TOOL_DELAY (per tool call),
+all in seconds and 0 by default to measure only the agent's overhead.
+
+For load tests also set AGENT_VERBOSE=false and AGENT_CHECKPOINTER=memory (see
+runnable.py). Measured in one process on 1 CPU (800 of the load test's prompts,
+50 at a time, with ainvoke), the graph does about 60 requests per second with
+the per node prints or the aiosqlite checkpointer and about 77 with neither.
+Through langserve-endpoints.py, with load_test.py on the same CPU, /invoke
+saturates at about 26 requests per second.
+Most of what's left is LangChain serializing the graph and its runnables on
+every run, so more throughput than that needs more worker processes.
+
+Whatever the tools create (tasks, projects, files, folders, documents) is kept
+in memory on top of the seed data, up to OFFLINE_STORE_MAX_ITEMS items per store
+with the oldest ones dropped first, so a long load test doesn't grow the server.
+"""
+
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.tools import tool
+from datetime import datetime
+from dotenv import load_dotenv
+from typing import List
+import threading
+import itertools
+import hashlib
+import asyncio
+import time
+import json
+import re
+import os
+
+load_dotenv()
+
+offline_mode = os.getenv('OFFLINE_MODE', 'false').lower() in ["true", "yes", "1"]
+offline_fixtures_path = os.getenv('OFFLINE_FIXTURES', '')
+offline_record_path = os.getenv('OFFLINE_RECORD', '')
+first_token_delay = float(os.getenv('OFFLINE_FIRST_TOKEN_DELAY', '0'))
+token_delay = float(os.getenv('OFFLINE_TOKEN_DELAY', '0'))
+tool_delay = float(os.getenv('OFFLINE_TOOL_DELAY', '0'))
+store_max_items = int(os.getenv('OFFLINE_STORE_MAX_ITEMS', '1000'))
+
+# The turns the fake model knows without a fixtures file, the last one matches any message
+scripted_fixtures = [
+    {"match": r"\b(create|add|remind)\b.*\btask\b|\bremind me\b", "steps": [
+        {"tool_calls": [{"name": "get_asana_projects", "args": {}}]},
+        {"tool_calls": [{"name": "create_asana_task", "args": {"task_name": "New task", "project_gid": "1000", "due_on": "today"}}]},
+        {"content": "I created the task in your Website Redesign project, due today."}
+    ]},
+    {"match": r"\bprojects?\b.*\btasks?\b|\btasks?\b.*\bprojects?\b", "steps": [
+        {"tool_calls": [{"name": "get_asana_projects", "args": {}}]},
+        {"tool_calls": [{"name": "get_asana_tasks", "args": {"project_gid": "1000"}}]},
+        {"content": "Website Redesign has 2 tasks: Draft the homepage copy (due 2024-09-20) and Review the wireframes (due 2024-09-27)."}
+    ]},
+    {"match": r"\bprojects?\b", "steps": [
+        {"tool_calls": [{"name": "get_asana_projects", "args": {}}]},
+        {"content": "You have two projects in Asana: Website Redesign and Marketing."}
+    ]},
+    {"match": r"\b(drive|files?|documents?|docs?)\b", "steps": [
+        {"tool_calls": [{"name": "search_file", "args": {"query": "meeting"}}]},
+        {"content": "I found one file in your Google Drive: Meeting Notes."}
+    ]},
+    {"match": r"\b(knowledgebase|action items|meeting)\b", "steps": [
+        {"tool_calls": [{"name": "query_documents", "args": {"question": "What are the action items from the meeting?"}}]},
+        {"content": "The action items from the meeting are to ship the new homepage and to book the offsite."}
+    ]},
+    {"match": "", "steps": [
+        {"content": "I'm your personal assistant for Asana, Google Drive and your documents. I can create and update tasks and projects, and find, create and organize files. What would you like to do?"}
+    ]}
+]
+
+def load_fixtures(path=offline_fixtures_path):
+    """
+    Loads the fixtures from a JSON lines file (the scripted fixtures if there is no file).
+
+    Recorded lines (one agent step each, with the "step" number) are grouped into
+    turns by their "match", in the order they were recorded.
+
+    Returns:
+        list: The fixtures, each with its compiled "pattern"
+    """
+    if not path:
+        fixtures = [dict(fixture) for fixture in scripted_fixtures]
+    else:
+        fixtures = []
+        recorded = {}
+        with open(path) as fixtures_file:
+            for line in fixtures_file:
+                if not line.strip():
+                    continue
+
+                fixture = json.loads(line)
+                if "steps" in fixture:
+                    fixtures.append(fixture)
+                elif fixture["match"] not in recorded:
+                    recorded[fixture["match"]] = {"match": fixture["match"], "steps": [fixture]}
+                    fixtures.append(recorded[fixture["match"]])
+                elif fixture.get("step", 0) >= len(recorded[fixture["match"]]["steps"]):
+                    # A turn that was recorded more than once keeps the steps of the first recording
+                    recorded[fixture["match"]]["steps"].append(fixture)
+
+    for fixture in fixtures:
+        fixture["pattern"] = re.compile(fixture["match"], re.IGNORECASE)
+
+    return fixtures
+
+def estimate_tokens(text):
+    # About 4 characters per token for English text and JSON
+    return max(1, len(text) // 4)
+
+def get_message_text(message):
+    if isinstance(message.content, str):
+        return message.content
+    return " ".join(part.get("text", "") for part in message.content if isinstance(part, dict))
+
+def get_turn(messages):
+    """
+    Gets the latest user message and how many times the agent was called since it.
+
+    Returns:
+        tuple: The text of the latest user message and the index of the agent step
+    """
+    for index in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[index], HumanMessage):
+            step = sum(isinstance(message, AIMessage) for message in messages[index + 1:])
+            return get_message_text(messages[index]), step
+
+    return "", 0
+
+class OfflineChatModel(BaseChatModel):
+    """
+    A chat model that replays fixture responses, streaming them token by token.
+
+    The response only depends on the latest user message and how many agent steps
+    followed it, so concurrent conversations always get the same responses.
+    """
+
+    fixtures: List[dict]
+    first_token_delay: float = first_token_delay
+    token_delay: float = token_delay
+    model_name: str = "offline"
+
+    @property
+    def _llm_type(self) -> str:
+        return "offline-fixtures"
+
+    def bind_tools(self, tools, **kwargs):
+        # The fixtures already name the tools to call
+        return self
+
+    def get_step(self, messages):
+        query, step = get_turn(messages)
+        for fixture in self.fixtures:
+            if fixture["pattern"].search(query):
+                steps = fixture["steps"]
+                # Past the recorded steps (like a failed tool call being retried) the turn just ends
+                return (query, step, steps[step]) if step < len(steps) else (query, step, {"content": steps[-1].get("content", "")})
+
+        return query, step, {"content": ""}
+
+    def get_response(self, messages):
+        """
+        Gets the response for the conversation.
+
+        Returns:
+            AIMessage: The fixture's content and tool calls, with token usage and response metadata like a real model's
+        """
+        query, step, fixture_step = self.get_step(messages)
+        # The tool call IDs only need to be unique in the conversation, so they are derived from the turn
+        turn_id = hashlib.sha256(f"{query}:{step}".encode()).hexdigest()[:12]
+        tool_calls = [
+            {"name": call["name"], "args": call.get("args", {}), "id": f"call_{turn_id}_{index}"}
+            for index, call in enumerate(fixture_step.get("tool_calls", []))
+        ]
+        content = fixture_step.get("content", "")
+
+        input_tokens = sum(estimate_tokens(get_message_text(message)) for message in messages)
+        output_tokens = estimate_tokens(content + json.dumps(tool_calls)) if content or tool_calls else 0
+        return AIMessage(
+            content=content,
+            tool_calls=tool_calls,
+            usage_metadata={"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens},
+            response_metadata={"model_name": self.model_name, "finish_reason": "tool_calls" if tool_calls else "stop"}
+        )
+
+    def get_chunks(self, response):
+        # Words with their trailing whitespace, like a tokenizer would stream them
+        tokens = re.findall(r"\S+\s*|\s+", response.content) or [""]
+        for index, token in enumerate(tokens):
+            last = index == len(tokens) - 1
+            yield AIMessageChunk(
+                content=token,
+                tool_call_chunks=[
+                    {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": call_index}
+                    for call_index, call in enumerate(response.tool_calls)
+                ] if last else [],
+                usage_metadata=response.usage_metadata if last else None,
+                response_metadata=response.response_metadata if last else {}
+            )
+
+    def get_generation_delay(self, response):
+        return self.first_token_delay + self.token_delay * len(re.findall(r"\S+\s*|\s+", response.content))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        response = self.get_response(messages)
+        if self.first_token_delay or self.token_delay:
+            time.sleep(self.get_generation_delay(response))
+        return ChatResult(generations=[ChatGeneration(message=response)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        response = self.get_response(messages)
+        if self.first_token_delay or self.token_delay:
+            await asyncio.sleep(self.get_generation_delay(response))
+        return ChatResult(generations=[ChatGeneration(message=response)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for index, chunk in enumerate(self.get_chunks(self.get_response(messages))):
+            delay = self.first_token_delay if index == 0 else self.token_delay
+            if delay:
+                time.sleep(delay)
+            if run_manager and chunk.content:
+                run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        for index, chunk in enumerate(self.get_chunks(self.get_response(messages))):
+            delay = self.first_token_delay if index == 0 else self.token_delay
+            if delay:
+                await asyncio.sleep(delay)
+            if run_manager and chunk.content:
+                await run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+def get_offline_chat_model():
+    return OfflineChatModel(fixtures=load_fixtures())
+
+record_lock = threading.Lock()
+
+def record_fixture(messages, response, path=offline_record_path):
+    """Appends an agent step of a real model to the recorded fixtures file (if OFFLINE_RECORD is set)."""
+    if not path:
+        return
+
+    query, step = get_turn(messages)
+    fixture = {
+        "match": f"^{re.escape(query)}$",
+        "step": step,
+        "tool_calls": [{"name": call["name"], "args": call["args"]} for call in getattr(response, "tool_calls", None) or []],
+        "content": get_message_text(response)
+    }
+
+    with record_lock:
+        with open(path, "a") as fixtures_file:
+            fixtures_file.write(json.dumps(fixture) + "\n")
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# ~~~~~~~~~~~~~~~~~~~ In-Memory Asana, Drive and Chroma ~~~~~~~~~~~~~~~~
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+# The tools below have the same names and arguments as the ones in tools/, but
+# keep everything in these dicts (shared by every conversation of the process)
+store_lock = threading.Lock()
+gids = itertools.count(2000)
+projects = {
+    "1000": {"gid": "1000", "name": "Website Redesign", "resource_type": "project"},
+    "1001": {"gid": "1001", "name": "Marketing", "resource_type": "project"}
+}
+tasks = {
+    "1100": {"gid": "1100", "name": "Draft the homepage copy", "due_on": "2024-09-20", "projects": ["1000"]},
+    "1101": {"gid": "1101", "name": "Review the wireframes", "due_on": "2024-09-27", "projects": ["1000"]}
+}
+drive_files = {
+    "file-1": {"id": "file-1", "name": "Meeting Notes", "content": "Action items: ship the new homepage, book the offsite.", "folder": False},
+    "folder-1": {"id": "folder-1", "name": "Meeting Notes Archive", "content": "", "folder": True}
+}
+documents = {
+    "meeting_notes": {"source": "data/meeting_notes.txt", "content": "Action items: ship the new homepage, book the offsite."}
+}
+# Never dropped to make room for new items
+seed_keys = set(projects) | set(tasks) | set(drive_files) | set(documents)
+
+def simulate_latency():
+    if tool_delay:
+        time.sleep(tool_delay)
+
+def next_gid():
+    return str(next(gids))
+
+def add_to_store(store, key, item):
+    """
+    Adds an item to one of the stores (under store_lock), dropping the oldest items
+    the tools created when there are more than store_max_items of them
+
+    Args:
+        store (dict): projects, tasks, drive_files or documents
+        key (str): The ID of the item
+        item (dict): The item
+    """
+    # Re-adding an item makes it the newest one
+    store.pop(key, None)
+    store[key] = item
+    while len(store) - len(seed_keys & store.keys()) > store_max_items:
+        del store[next(key for key in store if key not in seed_keys)]
+
+@tool
+def create_asana_task(task_name: str, project_gid: str, due_on: str = "today") -> str:
+    """
+    Creates a task in Asana given the name of the task and when it is due
+
+    Args:
+        task_name (str): The name of the task in Asana
+        project_gid (str): The ID of the project to add the task to
+        due_on (str): The date the task is due in the format YYYY-MM-DD. If not given, the current day is used
+    """
+    simulate_latency()
+    if due_on == "today":
+        due_on = str(datetime.now().date())
+
+    with store_lock:
+        task = {"gid": next_gid(), "name": task_name, "due_on": due_on, "projects": [project_gid]}
+        add_to_store(tasks, task["gid"], task)
+    return json.dumps(task, indent=2)
+
+@tool
+def get_asana_projects() -> str:
+    """
+    Gets all of the projects in the user's Asana workspace
+    """
+    simulate_latency()
+    with store_lock:
+        return json.dumps(list(projects.values()), indent=2)
+
+@tool
+def create_asana_project(project_name: str, due_on=None) -> str:
+    """
+    Creates a project in Asana given the name of the project and optionally when it is due
+
+    Args:
+        project_name (str): The name of the project in Asana
+        due_on (str): The date the project is due in the format YYYY-MM-DD. If not supplied, the project is not given a due date
+    """
+    simulate_latency()
+    with store_lock:
+        project = {"gid": next_gid(), "name": project_name, "due_on": due_on, "resource_type": "project"}
+        add_to_store(projects, project["gid"], project)
+    return json.dumps(project, indent=2)
+
+@tool
+def get_asana_tasks(project_gid: str) -> str:
+    """
+    Gets all the Asana tasks in a project
+
+    Args:
+        project_gid (str): The ID of the project in Asana to fetch the tasks for
+    """
+    simulate_latency()
+    with store_lock:
+        return json.dumps([task for task in tasks.values() if project_gid in task["projects"]], indent=2)
+
+@tool
+def update_asana_task(task_gid: str, data: dict) -> str:
+    """
+    Updates a task in Asana by updating one or both of completed and/or the due date
+
+    Args:
+        task_gid (str): The ID of the task to update
+        data (dict): A dictionary with either one or both of the keys 'completed' and/or 'due_on'
+    """
+    simulate_latency()
+    with store_lock:
+        if task_gid not in tasks:
+            return f"Exception when calling TasksApi->update_task: task {task_gid} not found\n"
+        tasks[task_gid].update(data)
+        return json.dumps(tasks[task_gid], indent=2)
+
+@tool
+def delete_task(task_gid: str) -> str:
+    """
+    Deletes a task in Asana
+
+    Args:
+        task_gid (str): The ID of the task to delete
+    """
+    simulate_latency()
+    with store_lock:
+        tasks.pop(task_gid, None)
+    return json.dumps({}, indent=2)
+
+@tool
+def search_file(query: str) -> list:
+    """
+    Searches for files in Google Drive based on a query string (the name or part of the name of the file).
+    """
+    simulate_latency()
+    with store_lock:
+        return str([{"id": file["id"], "name": file["name"]} for file in drive_files.values() if not file["folder"] and query.lower() in file["name"].lower()])
+
+@tool
+def download_file(file_id: str, file_name: str, mime_type: str = 'text/plain') -> str:
+    """
+    Downloads a file from Google Drive by its file ID to the data folder.
+    """
+    simulate_latency()
+    with store_lock:
+        if file_id not in drive_files:
+            return f"Error downloading the file: file {file_id} not found"
+        # The "downloaded" file can then be added to the knowledgebase
+        add_to_store(drive_files, f"data/{file_name}", dict(drive_files[file_id], id=f"data/{file_name}", name=file_name))
+    return f"File downloaded to data/{file_name}"
+
+@tool
+def upload_file(file_path: str, folder_id: str = None) -> str:
+    """
+    Uploads a local file to Google Drive, optionally into a folder.
+    """
+    simulate_latency()
+    with store_lock:
+        file = {"id": f"file-{next_gid()}", "name": file_path.split("/")[-1], "content": drive_files.get(file_path, {}).get("content", ""), "folder": False}
+        add_to_store(drive_files, file["id"], file)
+    return f"File uploaded with ID: {file['id']}"
+
+@tool
+def delete_file(file_id: str) -> str:
+    """
+    Deletes a file from Google Drive by its file ID.
+    """
+    simulate_latency()
+    with store_lock:
+        drive_files.pop(file_id, None)
+    return f"File with ID {file_id} has been deleted."
+
+@tool
+def update_file(file_id: str, new_file_path: str) -> str:
+    """
+    Updates (replaces) the content of a file in Google Drive with a local file.
+    """
+    simulate_latency()
+    with store_lock:
+        if file_id in drive_files:
+            drive_files[file_id]["content"] = drive_files.get(new_file_path, {}).get("content", "")
+    return f"File with ID {file_id} has been updated."
+
+@tool
+def search_folder(query: str) -> list:
+    """
+    Searches for folders in Google Drive based on a query string (the name or part of the name of the folder).
+    """
+    simulate_latency()
+    with store_lock:
+        return str([{"id": file["id"], "name": file["name"]} for file in drive_files.values() if file["folder"] and query.lower() in file["name"].lower()])
+
+@tool
+def create_folder(folder_name: str, parent_folder_id: str = None) -> str:
+    """
+    Creates a folder in Google Drive, inside the parent folder if one is given.
+    """
+    simulate_latency()
+    with store_lock:
+        folder = {"id": f"folder-{next_gid()}", "name": folder_name, "content": "", "folder": True}
+        add_to_store(drive_files, folder["id"], folder)
+    return f"Folder created with ID: {folder['id']}"
+
+@tool
+def delete_folder(folder_id: str) -> str:
+    """
+    Deletes a folder from Google Drive based on its folder ID.
+    """
+    simulate_latency()
+    with store_lock:
+        drive_files.pop(folder_id, None)
+    return f"Folder with ID {folder_id} has been deleted."
+
+@tool
+def create_text_file(content: str, file_name: str) -> str:
+    """
+    Creates a text file with the given content + file name and returns the file path.
+    """
+    simulate_latency()
+    file_path = f"data/{file_name}"
+    with store_lock:
+        add_to_store(drive_files, file_path, {"id": file_path, "name": file_name, "content": content, "folder": False})
+    return file_path
+
+@tool
+def query_documents(question: str) -> str:
+    """
+    Uses RAG to query documents for information to answer a question
+    that requires specific context that could be found in documents
+    """
+    simulate_latency()
+    words = set(re.findall(r"[a-z0-9]+", question.lower()))
+    with store_lock:
+        # Word overlap instead of embeddings, the 3 closest documents like the real tool
+        ranked = sorted(documents.values(), key=lambda doc: len(words & set(re.findall(r"[a-z0-9]+", doc["content"].lower()))), reverse=True)
+    return str([f"Source: {doc['source']}\nContent: {doc['content']}" for doc in ranked[:3]])
+
+@tool
+def add_doc_to_knowledgebase(file_path: str) -> str:
+    """
+    Adds a local document to the vector DB knowledgebase for RAG.
+    This function can only be called on local documents - Google Drive docs must be downloaded first.
+    """
+    simulate_latency()
+    with store_lock:
+        if file_path not in drive_files:
+            return f"Error adding file to knowledgbase: {file_path} not found"
+        add_to_store(documents, file_path.split("/")[-1], {"source": file_path, "content": drive_files[file_path]["content"]})
+    return "Successfully added the file to the knowledgebase."
+
+@tool
+def clear_knowledgebase() -> str:
+    """
+    Removes all documents from the vector DB knowledgebase to clear it.
+    """
+    simulate_latency()
+    with store_lock:
+        documents.clear()
+    return "Successfully cleared the knowledgebase."
+
+offline_asana_functions = {
+    "create_asana_task": create_asana_task,
+    "get_asana_projects": get_asana_projects,
+    "create_asana_project": create_asana_project,
+    "get_asana_tasks": get_asana_tasks,
+    "update_asana_task": update_asana_task,
+    "delete_task": delete_task
+}
+
+offline_drive_functions = {
+    "search_file": search_file,
+    "download_file": download_file,
+    "upload_file": upload_file,
+    "delete_file": delete_file,
+    "update_file": update_file,
+    "search_folder": search_folder,
+    "create_folder": create_folder,
+    "delete_folder": delete_folder,
+    "create_text_file": create_text_file
+}
+
+offline_vector_db_functions = {
+    "query_documents": query_documents,
+    "add_doc_to_knowledgebase": add_doc_to_knowledgebase,
+    "clear_knowledgebase": clear_knowledgebase
+}
@@ -0,0 +1,415 @@
+"""
+Opt-in per request profiling of the agent graph.
+
+With PROFILE_RUNS=true, every graph run (or a PROFILE_SAMPLE_RATE share of them)
+records a span for each node (call_model and tool_node), each LLM call, each
+tool and each checkpointer operation, with the checkpoint (de)serialization as
+its own spans. Every span has its wall time and CPU time, and with
+PROFILE_ALLOCATIONS=true the memory it allocated (net, traced with tracemalloc).
+That's off by default: once started, tracemalloc traces every allocation of the
+process, so it slows down every request (the ones that aren't sampled too) and
+inflates the times of the spans it measures.
+
+At the end of the run the spans are written to PROFILE_DIR as a Chrome trace
+(open it in chrome://tracing or https://ui.perfetto.dev) and/or a speedscope
+file (https://www.speedscope.app), and a summary of where the time went is printed:
+
+Profile of thread 3f2a...: 412.3ms total, model 398.1ms, tool 9.2ms, checkpoint 3.1ms, serde 1.4ms, node 0.5ms
+
+The time per category is the wall time during which at least one of its spans
+was running, so concurrent spans (like the checkpoint writes of parallel tool
+calls) aren't counted twice.
+
+The CPU time and the allocations are per thread / process, so for the async
+spans (call_model, the checkpointer) they also count whatever other requests
+ran on the event loop meanwhile. Profile one request at a time (like with
+PROFILE_SAMPLE_RATE and a low load) for exact numbers.
+
+A run's spans are found through the run tree: every LangChain run started under a
+profiled graph run (the nodes, their LLM and tool runs) is mapped to its profile
+by its parent run ID, and the code that isn't given a config (like the serializer
+and the checkpointer) uses the profile of the enclosing span or graph run, kept in
+a context variable. Concurrent requests, even on the same thread ID, get their
+own profiles.
+"""
+
+from langchain_core.callbacks import BaseCallbackHandler
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from functools import wraps
+from datetime import datetime
+from dotenv import load_dotenv
+import tracemalloc
+import threading
+import asyncio
+import inspect
+import random
+import time
+import json
+import os
+
+load_dotenv()
+
+profiling_enabled = os.getenv('PROFILE_RUNS', 'false').lower() in ["true", "yes", "1"]
+sample_rate = float(os.getenv('PROFILE_SAMPLE_RATE', '1'))
+profile_dir = os.getenv('PROFILE_DIR', 'profiles')
+# chrome, speedscope or both
+profile_format = os.getenv('PROFILE_FORMAT', 'chrome')
+profile_allocations = os.getenv('PROFILE_ALLOCATIONS', 'false').lower() in ["true", "yes", "1"]
+
+# The profile of the run the current code belongs to, for the code that isn't given the config (like the serializer)
+current_profile = ContextVar("current_profile", default=None)
+
+def get_union_length(intervals):
+    """Gets the total length covered by (start, end) intervals, counting overlaps once."""
+    length = 0.0
+    covered_until = None
+    for start, end in sorted(intervals):
+        if covered_until is None or start > covered_until:
+            length += end - start
+            covered_until = end
+        elif end > covered_until:
+            length += end - covered_until
+            covered_until = end
+    return length
+
+def get_lane():
+    # Spans of different threads or asyncio tasks get their own row in the trace so they nest correctly
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return f"task-{id(task)}" if task else f"thread-{threading.get_ident()}"
+
+class RunProfile:
+    """The spans of one graph run."""
+
+    def __init__(self, run_id, thread_id):
+        self.run_id = run_id
+        self.thread_id = thread_id
+        self.start = time.perf_counter()
+        self.finish = None
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def add_span(self, span):
+        with self.lock:
+            self.spans.append(span)
+
+    def get_summary(self):
+        """
+        Gets the time spent per kind of span.
+
+        Returns:
+            dict: The total wall time in ms and the wall time per category (the union of its
+            spans), where "node" is the time in the nodes outside of their model and tool calls
+        """
+        with self.lock:
+            spans = list(self.spans)
+
+        intervals = {}
+        for span in spans:
+            intervals.setdefault(span["cat"], []).append((span["ts"], span["ts"] + span["dur"]))
+
+        def covered(*cats):
+            return get_union_length([interval for cat in cats for interval in intervals.get(cat, [])])
+
+        totals = {cat: covered(cat) for cat in intervals}
+        # The nodes' and checkpointer's own time is what's left outside of the spans inside them
+        if "node" in totals:
+            totals["node"] = covered("node", "model", "tool") - covered("model", "tool")
+        if "checkpoint" in totals:
+            totals["checkpoint"] = covered("checkpoint", "serde") - covered("serde")
+        return {"total_ms": self.end_time() / 1000, **{cat: dur / 1000 for cat, dur in totals.items()}}
+
+    def end_time(self):
+        if self.finish is not None:
+            return (self.finish - self.start) * 1_000_000
+        return max((span["ts"] + span["dur"] for span in self.spans), default=0.0)
+
+    def to_chrome_trace(self):
+        lanes = {}
+        events = []
+        for span in self.spans:
+            events.append({
+                "name": span["name"], "cat": span["cat"], "ph": "X", "ts": span["ts"], "dur": span["dur"],
+                "pid": 1, "tid": lanes.setdefault(span["lane"], len(lanes) + 1), "args": span["args"]
+            })
+
+        for lane, tid in lanes.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": lane}})
+        events.append({"name": "process_name", "ph": "M", "pid": 1, "args": {"name": f"thread {self.thread_id}"}})
+
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"run_id": self.run_id, "thread_id": self.thread_id}}
+
+    def to_speedscope(self):
+        frames = []
+        frame_indexes = {}
+        profiles = []
+        lanes = {}
+        for span in sorted(self.spans, key=lambda span: (span["ts"], -span["dur"])):
+            lanes.setdefault(span["lane"], []).append(span)
+
+        for lane, spans in lanes.items():
+            events = []
+            for span in spans:
+                frame = frame_indexes.setdefault(f"{span['cat']}: {span['name']}", len(frame_indexes))
+                if frame == len(frames):
+                    frames.append({"name": f"{span['cat']}: {span['name']}"})
+                # At the same time, outer spans open first and inner spans (the ones opened last) close first
+                events.append((span["ts"], 1, -span["dur"], frame))
+                events.append((span["ts"] + span["dur"], 0, -span["ts"], frame))
+
+            # Closes come before opens at the same time
+            events.sort(key=lambda event: event[:3])
+            profiles.append({
+                "type": "evented", "name": lane, "unit": "microseconds",
+                "startValue": 0, "endValue": self.end_time(),
+                "events": [{"type": "O" if opened else "C", "frame": frame, "at": at} for at, opened, _, frame in events]
+            })
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"Agent run {self.run_id}",
+            "shared": {"frames": frames},
+            "profiles": profiles
+        }
+
+class RunProfiler:
+    """Keeps the profiles of the graph runs in progress and writes them out when they finish."""
+
+    def __init__(self, enabled=profiling_enabled, sample_rate=sample_rate, output_dir=profile_dir, output_format=profile_format):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self.output_format = output_format
+        # Run ID -> profile, for the graph runs being profiled and every run under them
+        self.runs = {}
+        self.lock = threading.Lock()
+
+        if enabled and profile_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def start_run(self, run_id, thread_id):
+        """
+        Starts profiling a graph run (a run without a parent), if it is sampled.
+
+        Returns:
+            RunProfile: The profile the run belongs to, None if it isn't profiled
+        """
+        if not self.enabled:
+            return None
+
+        # A run started from code inside a profiled run (like a graph invoked by a tool) is part of the outer profile
+        outer_profile = current_profile.get()
+        if outer_profile is not None and outer_profile.finish is None:
+            with self.lock:
+                self.runs[str(run_id)] = outer_profile
+            return outer_profile
+
+        if random.random() >= self.sample_rate:
+            return None
+
+        profile = RunProfile(str(run_id), thread_id)
+        with self.lock:
+            self.runs[str(run_id)] = profile
+        return profile
+
+    def add_child_run(self, run_id, parent_run_id):
+        """Maps a run (a node, LLM call or tool) to the profile of its parent run, if that one is profiled."""
+        with self.lock:
+            profile = self.runs.get(str(parent_run_id))
+            if profile is not None:
+                self.runs[str(run_id)] = profile
+
+    def finish_run(self, run_id):
+        with self.lock:
+            profile = self.runs.get(str(run_id))
+            # Only the end of the run that started the profile finishes it
+            if profile is None or profile.run_id != str(run_id):
+                return None
+            profile.finish = time.perf_counter()
+            self.runs = {other_run_id: other for other_run_id, other in self.runs.items() if other is not profile}
+
+        self.export(profile)
+        return profile
+
+    def get_profile(self, config=None):
+        """Gets the profile of the run the config (or else the current span or graph run) belongs to."""
+        # A node's config carries the callback manager of its run, whose parent run ID is the node's run
+        parent_run_id = getattr((config or {}).get("callbacks"), "parent_run_id", None)
+        profile = self.runs.get(str(parent_run_id)) if parent_run_id else None
+        if profile is None:
+            profile = current_profile.get()
+
+        # The context variable outlives the run in the task that started it
+        if profile is None or profile.finish is not None:
+            return None
+        return profile
+
+    @contextmanager
+    def record_span(self, profile, name, cat):
+        token = current_profile.set(profile)
+        lane = get_lane()
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        memory_start = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+
+        try:
+            yield
+        finally:
+            args = {"cpu_ms": round((time.thread_time() - cpu_start) * 1000, 3)}
+            if memory_start is not None:
+                args["alloc_kb"] = round((tracemalloc.get_traced_memory()[0] - memory_start) / 1024, 1)
+
+            profile.add_span({
+                "name": name, "cat": cat, "lane": lane, "args": args,
+                "ts": (start - profile.start) * 1_000_000, "dur": (time.perf_counter() - start) * 1_000_000
+            })
+            try:
+                current_profile.reset(token)
+            except ValueError:
+                # An async generator finished in another context than the one it started in
+                pass
+
+    def span(self, name, cat, config=None):
+        """
+        Times the code in the with block as a span of the run the config (or the current span) belongs to.
+
+        Returns:
+            A context manager, that does nothing if the run isn't being profiled
+        """
+        if not self.runs:
+            return nullcontext()
+
+        profile = self.get_profile(config)
+        if profile is None:
+            return nullcontext()
+
+        return self.record_span(profile, name, cat)
+
+    def export(self, profile):
+        os.makedirs(self.output_dir, exist_ok=True)
+        base_path = os.path.join(self.output_dir, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{str(profile.thread_id)[:8]}-{profile.run_id}")
+
+        if self.output_format in ["chrome", "both"]:
+            with open(f"{base_path}.trace.json", "w") as trace_file:
+                json.dump(profile.to_chrome_trace(), trace_file)
+        if self.output_format in ["speedscope", "both"]:
+            with open(f"{base_path}.speedscope.json", "w") as speedscope_file:
+                json.dump(profile.to_speedscope(), speedscope_file)
+
+        summary = profile.get_summary()
+        parts = ", ".join(f"{cat} {ms:.1f}ms" for cat, ms in sorted(summary.items(), key=lambda item: -item[1]) if cat != "total_ms")
+        print(f"Profile of thread {profile.thread_id}: {summary['total_ms']:.1f}ms total, {parts} ({base_path})")
+
+profiler = RunProfiler()
+
+class ProfilingCallbackHandler(BaseCallbackHandler):
+    """Starts a profile when a graph run starts and writes it out when the run ends."""
+
+    # Called right away (not in a thread pool) so the profile exists before the first node runs
+    run_inline = True
+
+    def __init__(self, profiler=profiler):
+        self.profiler = profiler
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        if parent_run_id is not None:
+            self.profiler.add_child_run(run_id, parent_run_id)
+            return
+
+        # LangChain copies the configurable values (like the thread ID) into the run's metadata, it only names the profile
+        profile = self.profiler.start_run(run_id, (metadata or {}).get("thread_id"))
+        # Run inline, so this is the context the graph runs in (and its node tasks copy), for the checkpointer's spans
+        current_profile.set(profile)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self.profiler.add_child_run(run_id, parent_run_id)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self.profiler.add_child_run(run_id, parent_run_id)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self.profiler.add_child_run(run_id, parent_run_id)
+
+    def on_chain_end(self, outputs, *, run_id, parent_run_id=None, **kwargs):
+        if parent_run_id is None:
+            self.profiler.finish_run(run_id)
+
+    def on_chain_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        if parent_run_id is None:
+            self.profiler.finish_run(run_id)
+
+def profile_node(func):
+    """Decorates a graph node (that takes the state and the config) to record it as a span, if profiling is on."""
+    if not profiler.enabled:
+        return func
+
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(state, config):
+            with profiler.span(func.__name__, "node", config):
+                return await func(state, config)
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(state, config):
+        with profiler.span(func.__name__, "node", config):
+            return func(state, config)
+    return wrapper
+
+class ProfiledSerializer:
+    """Records the checkpoint serializer's dumps and loads as spans."""
+
+    def __init__(self, serde):
+        self.serde = serde
+
+    def dumps(self, obj):
+        with profiler.span("dumps", "serde"):
+            return self.serde.dumps(obj)
+
+    def loads(self, data):
+        with profiler.span("loads", "serde"):
+            return self.serde.loads(data)
+
+    def __getattr__(self, name):
+        return getattr(self.serde, name)
+
+def profile_checkpointer(checkpointer):
+    """
+    Records the checkpointer's async operations (and its serializer's) as spans, if profiling is on.
+
+    Returns:
+        The same checkpointer
+    """
+    if not profiler.enabled:
+        return checkpointer
+
+    def wrap_coroutine(name, method):
+        @wraps(method)
+        async def wrapper(*args, **kwargs):
+            config = args[0] if args and isinstance(args[0], dict) else kwargs.get("config")
+            with profiler.span(name, "checkpoint", config):
+                return await method(*args, **kwargs)
+        return wrapper
+
+    def wrap_generator(name, method):
+        @wraps(method)
+        async def wrapper(*args, **kwargs):
+            config = args[0] if args and isinstance(args[0], dict) else kwargs.get("config")
+            with profiler.span(name, "checkpoint", config):
+                async for item in method(*args, **kwargs):
+                    yield item
+        return wrapper
+
+    # setup() is left out since the other operations call it
+    for name in ["aget_tuple", "aput", "aput_writes", "alist"]:
+        method = getattr(checkpointer, name, None)
+        if inspect.iscoroutinefunction(method):
+            setattr(checkpointer, name, wrap_coroutine(name, method))
+        elif inspect.isasyncgenfunction(method):
+            setattr(checkpointer, name, wrap_generator(name, method))
+
+    checkpointer.serde = ProfiledSerializer(checkpointer.serde)
+    return checkpointer
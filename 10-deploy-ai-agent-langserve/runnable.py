@@ -1,5 +1,6 @@
 from langgraph.graph.message import AnyMessage, add_messages
 from langgraph.checkpoint.aiosqlite import AsyncSqliteSaver
+from langgraph.checkpoint.memory import MemorySaver
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END, StateGraph
 from typing_extensions import TypedDict
@@ -13,12 +14,23 @@ from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from langchain_core.messages import ToolMessage, AIMessage
 
-from tools.asana_tools import available_asana_functions
+from offline_stubs import offline_mode, record_fixture
+from profiling import profiling_enabled, profiler, profile_node, profile_checkpointer, ProfilingCallbackHandler
+
+# With OFFLINE_MODE the model replays fixtures and the tools are in memory (see offline_stubs.py)
+if offline_mode:
+    from offline_stubs import get_offline_chat_model, offline_asana_functions, offline_drive_functions, offline_vector_db_functions
+else:
+    from tools.asana_tools import available_asana_functions
 # from tools.google_drive_tools import available_drive_functions
 # from tools.vector_db_tools import available_vector_db_functions
 
 load_dotenv()
 model = os.getenv('LLM_MODEL', 'gpt-4o')
+# The per node prints cost a lot of throughput under load, false turns them off
+verbose = os.getenv('AGENT_VERBOSE', 'true').lower() in ["true", "yes", "1"]
+# sqlite (AsyncSqliteSaver in memory) or memory (MemorySaver, faster for offline load tests)
+checkpointer_type = os.getenv('AGENT_CHECKPOINTER', 'sqlite').lower()
 
 model_mapping = {
     "gpt": ChatOpenAI,
@@ -30,15 +42,24 @@ model_mapping = {
 # To load the Vector DB and add Google Drive documents to the knowledgebase. You could also use something else like
 # Pinecone instead of running Chroma locally! Uncomment lines 17 and 18 + replace line 33 with 32 if you want to use these tools.
 # available_functions = available_asana_functions | available_drive_functions | available_vector_db_functions
-available_functions = available_asana_functions
+if offline_mode:
+    # The in-memory stubs need no credentials or droplet, so the offline mode has every tool
+    available_functions = offline_asana_functions | offline_drive_functions | offline_vector_db_functions
+else:
+    available_functions = available_asana_functions
 tools = [tool for _, tool in available_functions.items()]
 
-for key, chatbot_class in model_mapping.items():
-    if key in model.lower():
-        chatbot = chatbot_class(model=model) if key != "llama" else chatbot_class(llm=get_local_model())
-        break
+if offline_mode:
+    chatbot = get_offline_chat_model()
+else:
+    for key, chatbot_class in model_mapping.items():
+        if key in model.lower():
+            chatbot = chatbot_class(model=model) if key != "llama" else chatbot_class(llm=get_local_model())
+            break
 
 chatbot_with_tools = chatbot.bind_tools(tools)
+# The name of the model actually called ("offline" in the offline mode), for the profiles
+chatbot_model_name = getattr(chatbot, "model_name", None) or getattr(chatbot, "model", None) or model
 
 ### State
 class GraphState(TypedDict):
@@ -50,6 +71,11 @@ class GraphState(TypedDict):
     """
     messages: Annotated[list[AnyMessage], add_messages]
 
+def log(*args):
+    if verbose:
+        print(*args)
+
+@profile_node
 async def call_model(state: GraphState, config: RunnableConfig) -> Dict[str, AnyMessage]:
     """
     Function that calls the model to generate a response.
@@ -60,7 +86,7 @@ async def call_model(state: GraphState, config: RunnableConfig) -> Dict[str, Any
     Returns:
         dict: The updated state with a new AI message
     """
-    print("---CALL MODEL---")
+    log("---CALL MODEL---")
 
     messages = list(filter(
         lambda m: not isinstance(m, AIMessage) or hasattr(m, "response_metadata") and m.response_metadata, 
@@ -68,13 +94,17 @@ async def call_model(state: GraphState, config: RunnableConfig) -> Dict[str, Any
     ))
 
     # Invoke the chatbot with the binded tools
-    response = await chatbot_with_tools.ainvoke(messages, config)
+    with profiler.span(chatbot_model_name, "model", config):
+        response = await chatbot_with_tools.ainvoke(messages, config)
+    # Saves the step as a fixture for the offline mode if OFFLINE_RECORD is set
+    record_fixture(messages, response)
     # print("Response from model:", response)
 
     # We return an object because this will get added to the existing list
     return {"messages": response}
 
-def tool_node(state: GraphState) -> Dict[str, AnyMessage]:
+@profile_node
+def tool_node(state: GraphState, config: RunnableConfig) -> Dict[str, AnyMessage]:
     """
     Function that handles all tool calls.
 
@@ -84,7 +114,7 @@ def tool_node(state: GraphState) -> Dict[str, AnyMessage]:
     Returns:
         dict: The updated state with tool messages
     """
-    print("---TOOL NODE---")
+    log("---TOOL NODE---")
     messages = state["messages"]
     last_message = messages[-1] if messages else None
 
@@ -97,9 +127,10 @@ def tool_node(state: GraphState) -> Dict[str, AnyMessage]:
             if tool is None:
                 raise Exception(f"Tool '{call['name']}' not found.")
 
-            print(f"\n\nInvoking tool: {call['name']} with args {call['args']}")
-            output = tool.invoke(call['args'])
-            print(f"Result of invoking tool: {output}\n\n")
+            log(f"\n\nInvoking tool: {call['name']} with args {call['args']}")
+            with profiler.span(call['name'], "tool", config):
+                output = tool.invoke(call['args'])
+            log(f"Result of invoking tool: {output}\n\n")
 
             outputs.append(ToolMessage(
                 output if isinstance(output, str) else json.dumps(output), 
@@ -118,7 +149,7 @@ def should_continue(state: GraphState) -> Literal["__end__", "tools"]:
     Returns:
         str: The next node to execute or END
     """
-    print("---SHOULD CONTINUE---")
+    log("---SHOULD CONTINUE---")
     messages = state["messages"]
     last_message = messages[-1] if messages else None
 
@@ -144,7 +175,14 @@ def get_runnable():
     workflow.add_edge("tools", "agent")
 
     # Compile the LangGraph graph into a runnable
-    memory = AsyncSqliteSaver.from_conn_string(":memory:")
-    app = workflow.compile(checkpointer=memory)
+    if checkpointer_type == "memory":
+        memory = MemorySaver()
+    else:
+        memory = AsyncSqliteSaver.from_conn_string(":memory:")
+    app = workflow.compile(checkpointer=profile_checkpointer(memory))
+
+    if profiling_enabled:
+        # Profiles every run (or PROFILE_SAMPLE_RATE of them) from start to end, see profiling.py
+        return app.with_config(callbacks=[ProfilingCallbackHandler(profiler)])
 
     return app
\ No newline at end of file
@@ -8,14 +8,14 @@ import json
 import os
 
 from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
 from langchain_core.messages import SystemMessage, AIMessage, HumanMessage, ToolMessage
 from langchain_community.embeddings.sentence_transformer import SentenceTransformerEmbeddings
 from langchain_community.document_loaders import DirectoryLoader
 from langchain_text_splitters import CharacterTextSplitter
 from langchain_chroma import Chroma
 
+from model_registry import get_chat_model
+
 load_dotenv()
 
 model = os.getenv('LLM_MODEL', 'gpt-4o')
@@ -251,9 +251,9 @@ def prompt_ai(messages, nested_calls=0):
         raise "AI is tool calling too much!"
 
     # First, prompt the AI with the latest user message
+    # The registry hands back the same tool-bound client every call so HTTP connections are reused
     tools = [tool for _, tool in available_functions.items()]
-    asana_chatbot = ChatOpenAI(model=model) if "gpt" in model.lower() else ChatAnthropic(model=model)
-    asana_chatbot_with_tools = asana_chatbot.bind_tools(tools)
+    asana_chatbot_with_tools = get_chat_model(model, tools=tools, provider="openai" if "gpt" in model.lower() else "anthropic")
 
     stream = asana_chatbot_with_tools.stream(messages)
     first = True
@@ -0,0 +1,307 @@
+"""
+Pluggable AI router that decides if a request goes to the CHEAP or EXPENSIVE LLM.
+
+The original router made a full Groq LLM call for every user message before any
+real work started. This module adds two faster paths in front of that LLM call:
+
+1. A cache of router decisions keyed by a hash of the latest messages
+2. A local CPU classifier (hashed word n-grams + logistic regression) trained
+   from the decisions the LLM router logged. It is only trusted when its
+   confidence is above ROUTER_CONFIDENCE_THRESHOLD, otherwise the LLM decides.
+
+Every LLM router decision is appended to ROUTER_DECISIONS_LOG so the local
+classifier can be (re)trained with the command:
+
+python ai_router.py train
+
+And the latency/cost of each route can be printed with:
+
+python ai_router.py stats
+"""
+
+from collections import OrderedDict
+from dotenv import load_dotenv
+import threading
+import hashlib
+import pickle
+import json
+import time
+import sys
+import os
+
+from model_registry import get_chat_model
+
+load_dotenv()
+
+groq_model = os.getenv('GROQ_MODEL', 'llama3-groq-70b-8192-tool-use-preview')
+router_mode = os.getenv('ROUTER_MODE', 'llm').lower()
+confidence_threshold = float(os.getenv('ROUTER_CONFIDENCE_THRESHOLD', '0.85'))
+decisions_log = os.getenv('ROUTER_DECISIONS_LOG', 'router_decisions.jsonl')
+classifier_path = os.getenv('ROUTER_CLASSIFIER_PATH', 'router_classifier.pkl')
+decision_cache_size = int(os.getenv('ROUTER_CACHE_SIZE', '1000'))
+router_price_per_1m_tokens = float(os.getenv('ROUTER_PRICE_PER_1M_TOKENS', '0.89'))
+
+CHEAP = "CHEAP"
+EXPENSIVE = "EXPENSIVE"
+
+def get_latest_messages(messages, num_messages=3):
+    return "\n\n".join([message.content for message in messages[-num_messages:]])
+
+def normalize_decision(text):
+    """Turns the raw router output into exactly CHEAP or EXPENSIVE (CHEAP unless EXPENSIVE is mentioned)."""
+    return EXPENSIVE if EXPENSIVE in str(text).upper() else CHEAP
+
+def get_router_prompt(latest_messages):
+    return f"""
+        Your only job is to take requests from users (as the last message in chat history), and determine the complexity of the
+        request to route it to a more powerful and more expensive LLM if the request is complicated, and a less powerful
+        and cheaper LLM if the request is not complicated.
+
+        A request is complicated if it requires the LLM to take more than one action (create a task, search for tasks, etc.).
+        A request is not complicated if it will involve the LLM taking zero or one action.
+
+        The last three messages in the conversation (ending with the user's message/request) is:
+
+        {latest_messages}
+
+        Output CHEAP if the request is not complicated and can be routed to the cheaper LLM.
+        Output EXPENSIVE if the request is complicated (involves more than one action likely)
+        and needs to be routed to the more expensive LLM.
+
+        Your output needs to be CHEAP or EXPENSIVE, nothing else.
+    """
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~ Router Backends ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class LLMRouter:
+    """Asks the (cheap) Groq model whether the request is CHEAP or EXPENSIVE."""
+    name = "llm"
+
+    def __init__(self, model=groq_model):
+        self.model = model
+
+    def decide(self, latest_messages):
+        """
+        Args:
+            latest_messages (str): The last few messages of the conversation
+
+        Returns:
+            tuple: (decision, confidence, tokens used, whether the tokens are estimated)
+        """
+        ai_router = get_chat_model(self.model, provider="groq")
+        router_prompt = get_router_prompt(latest_messages)
+        response = ai_router.invoke(router_prompt)
+
+        usage = getattr(response, "usage_metadata", None) or {}
+        if usage.get("total_tokens"):
+            return normalize_decision(response.content), 1.0, usage["total_tokens"], False
+
+        # Groq didn't report the usage, so estimate it with ~4 characters per token
+        return normalize_decision(response.content), 1.0, (len(str(router_prompt)) + len(str(response.content))) // 4, True
+
+def get_classifier_pipeline():
+    # Imported here so scikit-learn is only needed when the local router is used
+    from sklearn.feature_extraction.text import HashingVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+
+    return make_pipeline(
+        HashingVectorizer(n_features=2**18, ngram_range=(1, 2), alternate_sign=False, norm="l2"),
+        LogisticRegression(max_iter=1000, class_weight="balanced")
+    )
+
+class LocalClassifierRouter:
+    """
+    CPU-only classifier trained on the decisions logged by the LLM router.
+    Takes well under a millisecond per decision compared to a full LLM round trip.
+    """
+    name = "local"
+
+    def __init__(self, path=classifier_path):
+        self.path = path
+        self.classifier = None
+
+        if os.path.exists(path):
+            with open(path, "rb") as classifier_file:
+                self.classifier = pickle.load(classifier_file)
+
+    def decide(self, latest_messages):
+        """
+        Args:
+            latest_messages (str): The last few messages of the conversation
+
+        Returns:
+            tuple: (decision, confidence, tokens used) or None if no classifier has been trained yet
+        """
+        if self.classifier is None:
+            return None
+
+        probabilities = self.classifier.predict_proba([latest_messages])[0]
+        best = probabilities.argmax()
+        return self.classifier.classes_[best], float(probabilities[best]), 0
+
+    @staticmethod
+    def train(log_path=decisions_log, path=classifier_path):
+        """
+        Trains the classifier from the LLM router decisions in the log and saves it to disk.
+
+        Returns:
+            float: The cross-validated accuracy of the classifier (or None if there isn't enough data)
+        """
+        from sklearn.model_selection import cross_val_score
+
+        texts, labels = [], []
+        with open(log_path, "r") as log_file:
+            for line in log_file:
+                record = json.loads(line)
+                if record.get("router") == LLMRouter.name:
+                    texts.append(record["text"])
+                    labels.append(record["decision"])
+
+        if len(set(labels)) < 2:
+            print(f"Need logged LLM router decisions for both CHEAP and EXPENSIVE to train, found {len(labels)} decisions.")
+            return None
+
+        classifier = get_classifier_pipeline()
+        folds = min(5, min(labels.count(CHEAP), labels.count(EXPENSIVE)))
+        accuracy = cross_val_score(classifier, texts, labels, cv=folds).mean() if folds >= 2 else None
+
+        classifier.fit(texts, labels)
+        with open(path, "wb") as classifier_file:
+            pickle.dump(classifier, classifier_file)
+
+        print(f"Trained the router classifier on {len(texts)} decisions (cross-validated accuracy: {accuracy}), saved to {path}")
+        return accuracy
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~ Router Front ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class Router:
+    """
+    Decides CHEAP or EXPENSIVE for a conversation by trying, in order, the decision
+    cache, the local classifier (if enabled and confident) and finally the LLM router.
+    """
+
+    def __init__(self, mode=router_mode, threshold=confidence_threshold):
+        self.llm_router = LLMRouter()
+        self.local_router = LocalClassifierRouter() if mode == "local" else None
+        self.threshold = threshold
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def record(self, route, decision, latency, tokens=0):
+        with self.lock:
+            route_stats = self.stats.setdefault(route, {
+                "calls": 0, "total_latency": 0.0, "tokens": 0, "cost": 0.0, CHEAP: 0, EXPENSIVE: 0
+            })
+            route_stats["calls"] += 1
+            route_stats["total_latency"] += latency
+            route_stats["tokens"] += tokens
+            route_stats["cost"] += tokens * router_price_per_1m_tokens / 1_000_000
+            route_stats[decision] += 1
+
+    def log_decision(self, latest_messages, decision, router, confidence):
+        # Appended so LLM decisions can later be used to train the local classifier
+        with open(decisions_log, "a") as log_file:
+            log_file.write(json.dumps({
+                "time": time.time(),
+                "text": latest_messages,
+                "decision": decision,
+                "router": router,
+                "confidence": confidence
+            }) + "\n")
+
+    def decide(self, messages, usage=None):
+        """
+        Determines which model to route the conversation to.
+
+        Args:
+            messages (list): The chat history ending with the user's latest message
+            usage (dict, optional): The request's usage, the router's own LLM tokens are added
+                to its router_tokens (and router_estimated set if they are estimated)
+
+        Returns:
+            str: CHEAP or EXPENSIVE
+        """
+        start = time.perf_counter()
+        latest_messages = get_latest_messages(messages)
+        key = hashlib.sha256(latest_messages.encode("utf-8")).hexdigest()
+
+        with self.lock:
+            decision = self.cache.get(key)
+            if decision is not None:
+                self.cache.move_to_end(key)
+
+        if decision is not None:
+            self.record("cache", decision, time.perf_counter() - start)
+            return decision
+
+        result = self.local_router.decide(latest_messages) if self.local_router else None
+        if result is not None and result[1] >= self.threshold:
+            decision, confidence, tokens = result
+            estimated = False
+            route = LocalClassifierRouter.name
+        else:
+            # Local classifier isn't enabled, trained or confident enough so fall back to the LLM
+            decision, confidence, tokens, estimated = self.llm_router.decide(latest_messages)
+            route = LLMRouter.name
+
+        if usage is not None and tokens:
+            usage["router_tokens"] = usage.get("router_tokens", 0) + tokens
+            usage["router_estimated"] = usage.get("router_estimated", False) or estimated
+
+        self.record(route, decision, time.perf_counter() - start, tokens)
+        self.log_decision(latest_messages, decision, route, confidence)
+
+        with self.lock:
+            self.cache[key] = decision
+            if len(self.cache) > decision_cache_size:
+                self.cache.popitem(last=False)
+
+        return decision
+
+    def get_stats(self):
+        """
+        Gets the latency and cost accounting for each route (cache, local, llm).
+
+        Returns:
+            dict: For each route the number of calls, average latency in seconds,
+            tokens and estimated cost in dollars, and how often it chose CHEAP/EXPENSIVE
+        """
+        with self.lock:
+            stats = {route: dict(route_stats) for route, route_stats in self.stats.items()}
+
+        for route_stats in stats.values():
+            route_stats["avg_latency"] = route_stats["total_latency"] / route_stats["calls"]
+
+        return stats
+
+def print_log_stats(log_path=decisions_log):
+    """Prints how many decisions each route made according to the decisions log."""
+    counts = {}
+    with open(log_path, "r") as log_file:
+        for line in log_file:
+            record = json.loads(line)
+            route_counts = counts.setdefault(record["router"], {CHEAP: 0, EXPENSIVE: 0})
+            route_counts[record["decision"]] += 1
+
+    for route, route_counts in counts.items():
+        print(f"{route}: {route_counts[CHEAP]} CHEAP, {route_counts[EXPENSIVE]} EXPENSIVE")
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "train"
+
+    if command == "train":
+        LocalClassifierRouter.train()
+    elif command == "stats":
+        print_log_stats()
+    else:
+        print("Usage: python ai_router.py [train|stats]")
@@ -1,20 +1,27 @@
 import asana
 from asana.rest import ApiException
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from dotenv import load_dotenv
 from datetime import datetime
+from itertools import chain
 import streamlit as st
+import threading
 import json
+import time
 import os
 
-from langchain_groq import ChatGroq
-from langchain_openai import ChatOpenAI
 from langchain_core.tools import tool
 from langchain_core.messages import SystemMessage, AIMessage, HumanMessage, ToolMessage
 
+from model_registry import get_chat_model, get_registry_stats
+from ai_router import Router
+from ledger import Ledger
+
 load_dotenv()
 
 groq_model = os.getenv('GROQ_MODEL', 'llama3-groq-70b-8192-tool-use-preview')
 openai_model = os.getenv('OPENAI_MODEL', 'gpt-4o')
+speculative_routing = os.getenv('SPECULATIVE_ROUTING', 'false').lower() in ["true", "yes", "1"]
 
 configuration = asana.Configuration()
 configuration.access_token = os.getenv('ASANA_ACCESS_TOKEN', '')
@@ -206,45 +213,63 @@ available_functions = {
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-def get_latest_messages(messages, num_messages=3):
-    return "\n\n".join([message.content for message in messages[-num_messages:]])
-
-def decide_model_from_prompt(messages):
-    ai_router = ChatGroq(model=groq_model)
-    latest_messages = get_latest_messages(messages)
-
-    router_prompt = f"""
-        Your only job is to take requests from users (as the last message in chat history), and determine the complexity of the 
-        request to route it to a more powerful and more expensive LLM if the request is complicated, and a less powerful
-        and cheaper LLM if the request is not complicated.
-
-        A request is complicated if it requires the LLM to take more than one action (create a task, search for tasks, etc.). 
-        A request is not complicated if it will involve the LLM taking zero or one action.
-
-        The last three messages in the conversation (ending with the user's message/request) is:
+# Tries the decision cache, then the local classifier (ROUTER_MODE=local), then the Groq LLM router
+# Cached as a resource so the decision cache and stats survive Streamlit reruns
+@st.cache_resource
+def get_router():
+    return Router()
 
-        {latest_messages}
+router = get_router()
 
-        Output CHEAP if the request is not complicated and can be routed to the cheaper LLM.
-        Output EXPENSIVE if the request is complicated (involves more than one action likely)
-        and needs to be routed to the more expensive LLM.
+# Append-only SQLite ledger of every request, also enforces the daily spend ceiling
+@st.cache_resource
+def get_ledger():
+    return Ledger()
 
-        Your output needs to be CHEAP or EXPENSIVE, nothing else.
-    """
+ledger = get_ledger()
 
-    response = ai_router.invoke(router_prompt)
-    return response.content
+def decide_model_from_prompt(messages, usage=None):
+    return router.decide(messages, usage)
 
-def prompt_ai(messages, router_decided_model, nested_calls=0):
+def get_asana_chatbot(router_decided_model):
+    # The registry hands back the same tool-bound client every call so HTTP connections are reused
+    tools = [tool for _, tool in available_functions.items()]
+    if router_decided_model.lower() == "cheap":
+        return get_chat_model(groq_model, tools=tools, provider="groq")
+    else:
+        # stream_usage makes OpenAI send the token usage at the end of the stream for the ledger
+        return get_chat_model(openai_model, tools=tools, provider="openai", stream_usage=True)
+
+def estimate_tokens(chunks):
+    # Not every provider sends usage when streaming, so estimate with ~4 characters per token
+    characters = 0
+    for chunk in chunks:
+        characters += len(str(chunk.content))
+        characters += sum(len(str(tool_call_chunk.get("args") or "")) for tool_call_chunk in getattr(chunk, "tool_call_chunks", []))
+
+    return characters // 4
+
+def record_usage(usage, messages, gathered):
+    """Adds the tokens and tool calls of one model call to the usage totals of the request."""
+    usage_metadata = getattr(gathered, "usage_metadata", None)
+    if usage_metadata:
+        usage["prompt_tokens"] += usage_metadata.get("input_tokens", 0)
+        usage["completion_tokens"] += usage_metadata.get("output_tokens", 0)
+    else:
+        usage["prompt_tokens"] += estimate_tokens(messages)
+        usage["completion_tokens"] += estimate_tokens([gathered])
+        usage["estimated"] = True
+
+    usage["tool_calls"] += len(gathered.tool_calls)
+
+def prompt_ai(messages, router_decided_model, nested_calls=0, stream=None, usage=None):
     if nested_calls > 5:
         raise "AI is tool calling too much!"
 
-    # First, prompt the AI with the latest user message
-    tools = [tool for _, tool in available_functions.items()]
-    asana_chatbot = ChatGroq(model=groq_model) if router_decided_model.lower() == "cheap" else ChatOpenAI(model=openai_model)
-    asana_chatbot_with_tools = asana_chatbot.bind_tools(tools)
+    # First, prompt the AI with the latest user message (unless a speculative stream was already started)
+    if stream is None:
+        stream = get_asana_chatbot(router_decided_model).stream(messages)
 
-    stream = asana_chatbot_with_tools.stream(messages)
     first = True
     for chunk in stream:
         if first:
@@ -255,6 +280,9 @@ def prompt_ai(messages, router_decided_model, nested_calls=0):
 
         yield chunk
 
+    if usage is not None:
+        record_usage(usage, messages, gathered)
+
     has_tool_calls = len(gathered.tool_calls) > 0
 
     # Second, see if the AI decided it needs to invoke a tool
@@ -271,10 +299,122 @@ def prompt_ai(messages, router_decided_model, nested_calls=0):
             messages.append(ToolMessage(tool_output, tool_call_id=tool_call["id"]))                
 
         # Call the AI again so it can produce a response with the result of calling the tool(s)
-        additional_stream = prompt_ai(messages, router_decided_model, nested_calls + 1)
+        additional_stream = prompt_ai(messages, router_decided_model, nested_calls + 1, usage=usage)
         for additional_chunk in additional_stream:
             yield additional_chunk
 
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# ~~~~~~~~~~~~~~~~~~~ Speculative Dual-Model Execution ~~~~~~~~~~~~~~~~~
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+@st.cache_resource
+def get_router_executor():
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="ai-router")
+
+# Pulls the speculative stream's chunks in the background so the router verdict never waits on the cheap model
+@st.cache_resource
+def get_stream_executor():
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative-stream")
+
+@st.cache_resource
+def get_speculation_stats():
+    # hits: router said CHEAP so the speculative stream was kept
+    # misses: router said EXPENSIVE so the speculative stream was thrown away
+    return {"hits": 0, "misses": 0, "wasted_tokens": 0, "latency_saved": 0.0}
+
+# Streamlit runs every session in its own thread, so the shared stats are updated under a lock
+@st.cache_resource
+def get_speculation_lock():
+    return threading.Lock()
+
+speculation_stats = get_speculation_stats()
+speculation_lock = get_speculation_lock()
+
+def timed_decision(messages, usage=None):
+    start = time.perf_counter()
+    router_decided_model = decide_model_from_prompt(messages, usage)
+    return router_decided_model, time.perf_counter() - start
+
+def close_stream(stream, pending_chunk):
+    # A generator can't be closed while another thread is pulling from it, so wait for that pull to end
+    if pending_chunk is None or pending_chunk.done():
+        stream.close()
+    else:
+        pending_chunk.add_done_callback(lambda _: stream.close())
+
+def speculative_prompt_ai(messages, usage=None):
+    """
+    Starts streaming from the cheap model right away while the router decides in the background.
+    Chunks are held back until the router verdict arrives. If the verdict is CHEAP the held chunks
+    and the rest of the stream are used as is, otherwise the cheap stream is cancelled and the
+    expensive model is prompted instead. Tools are only ever invoked after the verdict.
+
+    The verdict and the next cheap chunk are waited on together, so an EXPENSIVE verdict switches
+    models right away instead of waiting for the cheap model's next chunk.
+    """
+    start = time.perf_counter()
+    router_future = get_router_executor().submit(timed_decision, list(messages), usage)
+    cheap_stream = get_asana_chatbot("cheap").stream(messages)
+    stream_executor = get_stream_executor()
+    end_of_stream = object()
+
+    buffered_chunks = []
+    time_to_first_chunk = None
+    pending_chunk = stream_executor.submit(next, cheap_stream, end_of_stream)
+    while True:
+        wait([router_future, pending_chunk], return_when=FIRST_COMPLETED)
+        if not pending_chunk.done():
+            # The verdict came first
+            break
+
+        chunk = pending_chunk.result()
+        if chunk is end_of_stream:
+            pending_chunk = None
+            break
+
+        if time_to_first_chunk is None:
+            time_to_first_chunk = time.perf_counter() - start
+        buffered_chunks.append(chunk)
+        pending_chunk = stream_executor.submit(next, cheap_stream, end_of_stream)
+
+        if router_future.done():
+            break
+
+    router_decided_model, router_latency = router_future.result()
+    router_decided_model, downgraded = ledger.enforce_budget(router_decided_model)
+    print(f"Going with {router_decided_model} LLM model (speculative)...")
+
+    if usage is not None:
+        usage["route"], usage["downgraded"] = router_decided_model, downgraded
+
+    if router_decided_model.lower() == "cheap":
+        # The chunk being pulled when the verdict came is the next one of the stream
+        if pending_chunk is not None:
+            chunk = pending_chunk.result()
+            if chunk is not end_of_stream:
+                buffered_chunks.append(chunk)
+
+        # Without speculation the cheap model would only have started after the router answered
+        with speculation_lock:
+            speculation_stats["hits"] += 1
+            speculation_stats["latency_saved"] += min(router_latency, time_to_first_chunk or router_latency)
+        yield from prompt_ai(messages, "cheap", stream=chain(buffered_chunks, cheap_stream), usage=usage)
+    else:
+        close_stream(cheap_stream, pending_chunk)
+        if usage is not None:
+            # The cheap model still read the whole prompt and generated the buffered chunks, so they go in the ledger
+            usage["speculation_prompt_tokens"] = estimate_tokens(messages)
+            usage["speculation_completion_tokens"] = estimate_tokens(buffered_chunks)
+        with speculation_lock:
+            speculation_stats["misses"] += 1
+            speculation_stats["wasted_tokens"] += estimate_tokens(buffered_chunks)
+        yield from prompt_ai(messages, "expensive", usage=usage)
+
+    with speculation_lock:
+        print(f"Speculation stats: {speculation_stats}")
+
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -315,11 +455,42 @@ def main():
 
         # Display assistant response in chat message container
         with st.chat_message("assistant"):
-            router_decided_model = decide_model_from_prompt(st.session_state.messages)
-            print(f"Going with {router_decided_model} LLM model...")
+            start = time.perf_counter()
+            usage = {"route": "CHEAP", "downgraded": False, "prompt_tokens": 0, "completion_tokens": 0, "tool_calls": 0, "estimated": False}
+
+            if speculative_routing:
+                stream = speculative_prompt_ai(st.session_state.messages, usage)
+            else:
+                router_decided_model = decide_model_from_prompt(st.session_state.messages, usage)
+                router_decided_model, downgraded = ledger.enforce_budget(router_decided_model)
+                usage["route"], usage["downgraded"] = router_decided_model, downgraded
+                print(f"Going with {router_decided_model} LLM model...")
+                stream = prompt_ai(st.session_state.messages, router_decided_model, usage=usage)
 
-            stream = prompt_ai(st.session_state.messages, router_decided_model)
             response = st.write_stream(stream)
+
+            cost = ledger.record(
+                usage["route"],
+                groq_model if usage["route"].lower() == "cheap" else openai_model,
+                usage["prompt_tokens"],
+                usage["completion_tokens"],
+                time.perf_counter() - start,
+                usage["tool_calls"],
+                usage["downgraded"],
+                usage["estimated"]
+            )
+
+            # The routing overhead: the router's own LLM call and the thrown away speculative tokens
+            if usage.get("router_tokens"):
+                cost += ledger.record("ROUTER", groq_model, usage["router_tokens"], 0, 0.0, 0, estimated=usage["router_estimated"])
+            if usage.get("speculation_prompt_tokens") or usage.get("speculation_completion_tokens"):
+                cost += ledger.record(
+                    "SPECULATION", groq_model, usage["speculation_prompt_tokens"], usage["speculation_completion_tokens"],
+                    0.0, 0, estimated=True
+                )
+            print(f"Request cost ${cost:.5f}, spent ${ledger.spend_today():.4f} today")
+            print(f"Model registry stats: {get_registry_stats()}")
+            print(f"Router stats: {router.get_stats()}")
         
         st.session_state.messages.append(AIMessage(content=response))
 
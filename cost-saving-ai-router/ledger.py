@@ -0,0 +1,226 @@
+"""
+Append-only cost and latency ledger for the AI router.
+
+Every request the cost-saving agent answers is recorded in a local SQLite
+database (LEDGER_PATH) with the route the router picked, the model used, the
+prompt/completion tokens, the wall time and the number of tool calls. Rows can
+only be inserted - triggers reject any UPDATE or DELETE.
+
+The overhead of routing is recorded too, as rows of its own: the router's LLM
+classification (route ROUTER) and the cheap model tokens thrown away when a
+speculative stream loses to an EXPENSIVE verdict (route SPECULATION). Rows whose
+tokens were estimated (~4 characters per token) because the provider didn't
+report its usage are marked as estimated.
+
+The ledger also enforces a daily budget: once today's spend reaches
+DAILY_SPEND_CEILING dollars, EXPENSIVE requests are downgraded to the cheap model.
+
+To see how much the router is saving compared to sending everything to the
+expensive model, run:
+
+python ledger.py report
+
+Or only for the last 7 days:
+
+python ledger.py report 7
+"""
+
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+import threading
+import sqlite3
+import sys
+import os
+
+load_dotenv()
+
+ledger_path = os.getenv('LEDGER_PATH', 'router_ledger.db')
+daily_spend_ceiling = float(os.getenv('DAILY_SPEND_CEILING', '0'))
+
+# Dollars per 1M tokens for each route, defaults are for llama3-groq-70b and gpt-4o
+route_prices = {
+    "CHEAP": (
+        float(os.getenv('CHEAP_MODEL_INPUT_PRICE_PER_1M', '0.89')),
+        float(os.getenv('CHEAP_MODEL_OUTPUT_PRICE_PER_1M', '0.89'))
+    ),
+    "EXPENSIVE": (
+        float(os.getenv('EXPENSIVE_MODEL_INPUT_PRICE_PER_1M', '2.50')),
+        float(os.getenv('EXPENSIVE_MODEL_OUTPUT_PRICE_PER_1M', '10.00'))
+    ),
+    "ROUTER": (
+        float(os.getenv('ROUTER_PRICE_PER_1M_TOKENS', '0.89')),
+        float(os.getenv('ROUTER_PRICE_PER_1M_TOKENS', '0.89'))
+    )
+}
+# The wasted speculative tokens were generated by the cheap model
+route_prices["SPECULATION"] = route_prices["CHEAP"]
+
+# Routes that only exist because of the router, they would cost nothing if everything went to EXPENSIVE
+overhead_routes = ["ROUTER", "SPECULATION"]
+
+ledger_schema = """
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at DATETIME NOT NULL,
+    day DATE NOT NULL,
+    route VARCHAR(20) NOT NULL,
+    model VARCHAR(255) NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    wall_time REAL NOT NULL,
+    tool_calls INTEGER NOT NULL,
+    cost REAL NOT NULL,
+    downgraded INTEGER NOT NULL DEFAULT 0,
+    estimated INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_requests_day ON requests (day);
+
+CREATE TRIGGER IF NOT EXISTS requests_no_update BEFORE UPDATE ON requests
+BEGIN
+    SELECT RAISE(ABORT, 'The ledger is append-only');
+END;
+
+CREATE TRIGGER IF NOT EXISTS requests_no_delete BEFORE DELETE ON requests
+BEGIN
+    SELECT RAISE(ABORT, 'The ledger is append-only');
+END;
+"""
+
+def compute_cost(route, prompt_tokens, completion_tokens):
+    """
+    Computes the dollar cost of a request.
+
+    Args:
+        route (str): CHEAP, EXPENSIVE, ROUTER or SPECULATION
+        prompt_tokens (int): The number of input tokens
+        completion_tokens (int): The number of output tokens
+
+    Returns:
+        float: The cost of the request in dollars
+    """
+    input_price, output_price = route_prices[route.upper()]
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+class Ledger:
+    def __init__(self, path=ledger_path, ceiling=daily_spend_ceiling):
+        self.ceiling = ceiling
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(ledger_schema)
+
+        # Ledgers created before the estimated column existed get it added (ALTER isn't blocked by the triggers)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(requests)")]
+        if "estimated" not in columns:
+            self.conn.execute("ALTER TABLE requests ADD COLUMN estimated INTEGER NOT NULL DEFAULT 0")
+            self.conn.commit()
+
+    def record(self, route, model, prompt_tokens, completion_tokens, wall_time, tool_calls, downgraded=False, estimated=False):
+        """
+        Appends a request (or the routing overhead of one) to the ledger.
+
+        Returns:
+            float: The cost of the request in dollars
+        """
+        route = route.upper()
+        cost = compute_cost(route, prompt_tokens, completion_tokens)
+        now = datetime.now()
+
+        with self.lock:
+            self.conn.execute(
+                """INSERT INTO requests (created_at, day, route, model, prompt_tokens, completion_tokens,
+                wall_time, tool_calls, cost, downgraded, estimated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (now.isoformat(), str(now.date()), route, model, prompt_tokens, completion_tokens,
+                 wall_time, tool_calls, cost, int(downgraded), int(estimated))
+            )
+            self.conn.commit()
+
+        return cost
+
+    def spend_today(self):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT COALESCE(SUM(cost), 0) FROM requests WHERE day = ?", (str(datetime.now().date()),)
+            ).fetchone()
+
+        return row[0]
+
+    def enforce_budget(self, route):
+        """
+        Downgrades EXPENSIVE requests to CHEAP once the daily spend ceiling is reached.
+
+        Args:
+            route (str): The route the router decided on
+
+        Returns:
+            tuple: (route to use, whether the request was downgraded)
+        """
+        if route.upper() == "EXPENSIVE" and self.ceiling > 0 and self.spend_today() >= self.ceiling:
+            print(f"Daily spend ceiling of ${self.ceiling:.2f} reached, downgrading to the CHEAP model...")
+            return "CHEAP", True
+
+        return route, False
+
+    def summarize(self, days=None):
+        """
+        Summarizes the ledger per route and the savings compared to routing everything to the expensive model.
+
+        Args:
+            days (int, optional): Only include the last number of days
+
+        Returns:
+            dict: Per route totals plus the actual cost (including the routing overhead),
+            the all-expensive cost and the savings
+        """
+        where, params = "", ()
+        if days:
+            where, params = "WHERE day >= ?", (str((datetime.now() - timedelta(days=days - 1)).date()),)
+
+        with self.lock:
+            rows = self.conn.execute(
+                f"""SELECT route, COUNT(*), SUM(prompt_tokens), SUM(completion_tokens), SUM(cost),
+                AVG(wall_time), SUM(tool_calls), SUM(downgraded), SUM(estimated) FROM requests {where} GROUP BY route""",
+                params
+            ).fetchall()
+
+        summary = {"routes": {}, "actual_cost": 0.0, "all_expensive_cost": 0.0}
+        for route, requests, prompt_tokens, completion_tokens, cost, avg_wall_time, tool_calls, downgraded, estimated in rows:
+            summary["routes"][route] = {
+                "requests": requests,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "cost": cost,
+                "avg_wall_time": avg_wall_time,
+                "tool_calls": tool_calls,
+                "downgraded": downgraded,
+                "estimated": estimated
+            }
+            summary["actual_cost"] += cost
+            if route not in overhead_routes:
+                summary["all_expensive_cost"] += compute_cost("EXPENSIVE", prompt_tokens, completion_tokens)
+
+        summary["savings"] = summary["all_expensive_cost"] - summary["actual_cost"]
+        return summary
+
+def print_report(days=None):
+    summary = Ledger().summarize(days)
+    period = f"last {days} days" if days else "all time"
+
+    print(f"AI router ledger report ({period})\n")
+    print(f"{'Route':<11} | {'Requests':>8} | {'Prompt tok':>10} | {'Output tok':>10} | {'Tools':>5} | {'Avg time':>8} | {'Cost':>10} | {'Estimated':>9}")
+    print("-" * 94)
+    for route, totals in summary["routes"].items():
+        print(
+            f"{route:<11} | {totals['requests']:>8} | {totals['prompt_tokens']:>10} | {totals['completion_tokens']:>10} | "
+            f"{totals['tool_calls']:>5} | {totals['avg_wall_time']:>7.2f}s | ${totals['cost']:>9.4f} | {totals['estimated']:>9}"
+        )
+
+    print(f"\n{'Actual cost (with the overhead):':<34} ${summary['actual_cost']:.4f}")
+    print(f"{'Cost if everything was EXPENSIVE:':<34} ${summary['all_expensive_cost']:.4f}")
+    print(f"{'Savings from the router:':<34} ${summary['savings']:.4f}")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "report":
+        print_report(int(sys.argv[2]) if len(sys.argv) > 2 else None)
+    else:
+        print("Usage: python ledger.py report [days]")
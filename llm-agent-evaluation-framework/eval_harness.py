@@ -0,0 +1,289 @@
+"""
+Headless evaluation harness for the agent in runnable.py.
+
+Replays a suite of conversations (JSON lines) through get_runnable() for every
+target model, a bounded number of conversations at a time, and records per turn:
+
+- The time to the first token of the response (TTFT) and the total latency
+- The input/output tokens of every LLM call in the turn
+- The tools the agent called
+- Whether the turn passed its checks
+
+Each line of the suite is one conversation:
+
+{"id": "create-task", "turns": [
+    {"user": "Create a task to buy milk in my Groceries project",
+     "expect": {"tools": ["get_asana_projects", "create_asana_task"], "contains": ["milk"]}}
+]}
+
+The checks in "expect" are all optional: "tools" (each of them must be called),
+"not_tools" (none of them can be called), "contains" / "not_contains" (case
+insensitive substrings of the response) and "regex" (must match the response).
+A conversation can also give its own "system" prompt.
+
+The tools run for real, so point the tool credentials at test accounts.
+
+Run the suite for LLM_MODEL, or for EVAL_TARGETS (comma separated, with an
+optional :provider, e.g. gpt-4o-mini,claude-3-5-sonnet-20240620:anthropic):
+
+python eval_harness.py eval_suite.jsonl [report.json]
+
+And compare two reports (e.g. before and after a change) with:
+
+python eval_harness.py compare baseline.json report.json
+"""
+
+from langchain_core.messages import SystemMessage, HumanMessage
+from datetime import datetime
+import asyncio
+import json
+import time
+import uuid
+import sys
+import re
+import os
+
+from runnable import get_runnable, model as default_model, provider as default_provider
+
+concurrency = int(os.getenv('EVAL_CONCURRENCY', '4'))
+eval_targets = os.getenv('EVAL_TARGETS', '')
+turn_timeout = float(os.getenv('EVAL_TURN_TIMEOUT', '120'))
+
+system_message = f"""
+You are a personal assistant who helps manage tasks in Asana and documents in Google Drive.
+You never give IDs to the user since those are just for you to keep track of.
+The current date is: {datetime.now().date()}
+"""
+
+def get_targets(targets=eval_targets):
+    """
+    Gets the (model, provider) pairs to evaluate.
+
+    Returns:
+        list: One (model, provider) tuple per target, LLM_MODEL/LLM_PROVIDER if EVAL_TARGETS isn't set
+    """
+    if not targets.strip():
+        return [(default_model, default_provider)]
+
+    pairs = []
+    for target in targets.split(","):
+        target_model, _, target_provider = target.strip().partition(":")
+        pairs.append((target_model, target_provider or "auto"))
+
+    return pairs
+
+def load_suite(path):
+    with open(path) as suite_file:
+        suite = [json.loads(line) for line in suite_file if line.strip() and not line.startswith("//")]
+
+    for i, conversation in enumerate(suite):
+        conversation.setdefault("id", f"conversation-{i + 1}")
+
+    return suite
+
+def get_chunk_text(content):
+    # Anthropic streams lists of content blocks, the other providers strings
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") for block in content if isinstance(block, dict))
+
+def check_turn(response, tool_calls, expect):
+    """
+    Runs a turn's checks.
+
+    Returns:
+        list: The failed checks (empty if the turn passed)
+    """
+    failures = []
+    lowered = response.lower()
+
+    for tool_name in expect.get("tools", []):
+        if tool_name not in tool_calls:
+            failures.append(f"tool {tool_name} wasn't called")
+    for tool_name in expect.get("not_tools", []):
+        if tool_name in tool_calls:
+            failures.append(f"tool {tool_name} was called")
+    for text in expect.get("contains", []):
+        if text.lower() not in lowered:
+            failures.append(f"response doesn't contain '{text}'")
+    for text in expect.get("not_contains", []):
+        if text.lower() in lowered:
+            failures.append(f"response contains '{text}'")
+    if expect.get("regex") and not re.search(expect["regex"], response):
+        failures.append(f"response doesn't match /{expect['regex']}/")
+
+    return failures
+
+async def run_turn(runnable, messages, config):
+    """
+    Sends one user turn through the graph and measures it.
+
+    Returns:
+        dict: The response, TTFT and total latency in seconds, LLM calls, tokens and tool calls
+    """
+    result = {"response": "", "ttft": None, "llm_calls": 0, "input_tokens": 0, "output_tokens": 0, "tool_calls": []}
+    start = time.perf_counter()
+
+    async for event in runnable.astream_events({"messages": messages}, config, version="v2"):
+        if event["event"] == "on_chat_model_stream":
+            text = get_chunk_text(event["data"]["chunk"].content)
+            if text:
+                if result["ttft"] is None:
+                    result["ttft"] = time.perf_counter() - start
+                result["response"] += text
+        elif event["event"] == "on_chat_model_end":
+            output = event["data"].get("output")
+            usage = getattr(output, "usage_metadata", None) or {}
+            result["llm_calls"] += 1
+            result["input_tokens"] += usage.get("input_tokens", 0)
+            result["output_tokens"] += usage.get("output_tokens", 0)
+            result["tool_calls"] += [call["name"] for call in getattr(output, "tool_calls", None) or []]
+            # The response to the user is the text of the last LLM call
+            if getattr(output, "tool_calls", None):
+                result["response"] = ""
+
+    result["total"] = time.perf_counter() - start
+    return result
+
+async def run_conversation(runnable, target, conversation, semaphore):
+    """Runs every turn of a conversation in order, in its own thread of the graph's checkpointer."""
+    async with semaphore:
+        config = {"configurable": {"thread_id": f"eval-{uuid.uuid4()}"}}
+        messages = [SystemMessage(content=conversation.get("system", system_message))]
+        turns = []
+
+        for index, turn in enumerate(conversation["turns"]):
+            # The checkpointer keeps the history of the thread, so only the new messages are sent
+            messages.append(HumanMessage(content=turn["user"]))
+            record = {"model": target, "conversation": conversation["id"], "turn": index + 1}
+            try:
+                result = await asyncio.wait_for(run_turn(runnable, messages, config), turn_timeout)
+                failures = check_turn(result["response"], result["tool_calls"], turn.get("expect", {}))
+                record.update(result, passed=not failures, failures=failures, error=None)
+            except Exception as e:
+                record.update(passed=False, failures=[], error=f"{type(e).__name__}: {e}")
+                turns.append(record)
+                # The rest of the conversation depends on this turn, so it is skipped
+                break
+
+            turns.append(record)
+            messages = []
+
+        return turns
+
+def percentile(values, p):
+    """Gets the p-th percentile (0-100) of the values, interpolating between the closest ranks."""
+    if not values:
+        return None
+
+    values = sorted(values)
+    rank = (len(values) - 1) * p / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+def summarize(turns):
+    """
+    Summarizes the turns of one target.
+
+    Returns:
+        dict: Turn counts, pass and error rates, TTFT and total latency percentiles and token and tool call averages
+    """
+    completed = [turn for turn in turns if turn["error"] is None]
+    ttfts = [turn["ttft"] for turn in completed if turn["ttft"] is not None]
+    totals = [turn["total"] for turn in completed]
+    count = len(completed) or 1
+
+    return {
+        "turns": len(turns),
+        "passed": sum(turn["passed"] for turn in turns),
+        "pass_rate": sum(turn["passed"] for turn in turns) / len(turns) if turns else None,
+        "errors": len(turns) - len(completed),
+        **{f"ttft_p{p}": percentile(ttfts, p) for p in (50, 90, 95, 99)},
+        **{f"total_p{p}": percentile(totals, p) for p in (50, 90, 95, 99)},
+        "avg_llm_calls": sum(turn["llm_calls"] for turn in completed) / count,
+        "avg_input_tokens": sum(turn["input_tokens"] for turn in completed) / count,
+        "avg_output_tokens": sum(turn["output_tokens"] for turn in completed) / count,
+        "avg_tool_calls": sum(len(turn["tool_calls"]) for turn in completed) / count
+    }
+
+async def run_suite(suite, targets=None, max_concurrency=concurrency):
+    """
+    Replays the suite for every target.
+
+    Args:
+        suite (list): The conversations
+        targets (list, optional): (model, provider) tuples, defaults to get_targets()
+        max_concurrency (int): How many conversations run at the same time per target
+
+    Returns:
+        dict: The report, with every turn and the summary per target ("model:provider")
+    """
+    targets = targets or get_targets()
+    report = {"started_at": datetime.now().isoformat(), "concurrency": max_concurrency, "turns": [], "summary": {}}
+
+    for target_model, target_provider in targets:
+        print(f"Evaluating {target_model} ({target_provider}) on {len(suite)} conversations")
+        runnable = get_runnable(target_model, target_provider)
+        semaphore = asyncio.Semaphore(max_concurrency)
+        start = time.perf_counter()
+
+        # The same model can be evaluated through several providers, so targets are keyed by both
+        target = f"{target_model}:{target_provider}"
+        results = await asyncio.gather(*(run_conversation(runnable, target, conversation, semaphore) for conversation in suite))
+        turns = [turn for conversation_turns in results for turn in conversation_turns]
+
+        report["turns"] += turns
+        report["summary"][target] = {"model": target_model, "provider": target_provider, "seconds": time.perf_counter() - start, **summarize(turns)}
+
+    return report
+
+def format_seconds(value):
+    return "-" if value is None else f"{value:.2f}s"
+
+def print_report(report):
+    print(f"\n{'Target':<32} | {'Pass':>9} | {'Err':>3} | {'TTFT p50':>8} | {'TTFT p95':>8} | {'Total p50':>9} | {'Total p95':>9} | {'Total p99':>9} | {'In tok':>7} | {'Out tok':>7} | {'Tools':>5}")
+    print("-" * 140)
+    for target, summary in report["summary"].items():
+        print(
+            f"{target[:32]:<32} | {summary['passed']:>4}/{summary['turns']:<4} | {summary['errors']:>3} | "
+            f"{format_seconds(summary['ttft_p50']):>8} | {format_seconds(summary['ttft_p95']):>8} | "
+            f"{format_seconds(summary['total_p50']):>9} | {format_seconds(summary['total_p95']):>9} | {format_seconds(summary['total_p99']):>9} | "
+            f"{summary['avg_input_tokens']:>7.0f} | {summary['avg_output_tokens']:>7.0f} | {summary['avg_tool_calls']:>5.1f}"
+        )
+
+    failed = [turn for turn in report["turns"] if not turn["passed"]]
+    if failed:
+        print("\nFailed turns:")
+        for turn in failed:
+            print(f"  {turn['model']} {turn['conversation']} turn {turn['turn']}: {turn['error'] or '; '.join(turn['failures'])}")
+
+def compare_reports(baseline, candidate):
+    """Prints the change of the key metrics per target ("model:provider") between two reports."""
+    metrics = ["pass_rate", "ttft_p50", "ttft_p95", "total_p50", "total_p95", "avg_input_tokens", "avg_output_tokens"]
+    print(f"{'Target':<32} | {'Metric':<17} | {'Baseline':>10} | {'Candidate':>10} | {'Change':>8}")
+    print("-" * 90)
+    for target, summary in candidate["summary"].items():
+        base = baseline["summary"].get(target)
+        if base is None:
+            continue
+
+        for metric in metrics:
+            before, after = base.get(metric), summary.get(metric)
+            change = f"{(after - before) / before:+.1%}" if before and after is not None else "-"
+            print(f"{target[:32]:<32} | {metric:<17} | {before if before is not None else '-':>10.4} | {after if after is not None else '-':>10.4} | {change:>8}")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python eval_harness.py [suite.jsonl] [report.json] or python eval_harness.py compare [baseline.json] [report.json]")
+    elif sys.argv[1] == "compare":
+        with open(sys.argv[2]) as baseline_file, open(sys.argv[3]) as candidate_file:
+            compare_reports(json.load(baseline_file), json.load(candidate_file))
+    else:
+        report = asyncio.run(run_suite(load_suite(sys.argv[1])))
+        print_report(report)
+
+        if len(sys.argv) > 2:
+            with open(sys.argv[2], "w") as report_file:
+                json.dump(report, report_file, indent=2)
+            print(f"\nSaved the report to {sys.argv[2]}")
@@ -0,0 +1,233 @@
+"""
+Shared registry for the chat model clients used by the agents in this directory.
+
+Creating a new ChatOpenAI/ChatGroq/ChatAnthropic and calling bind_tools on every
+prompt throws away the HTTP connection pool the provider SDK keeps underneath.
+This registry creates each client once per (provider, model), hands every
+OpenAI client the same pooled httpx client so connections stay
+alive between turns, and caches the tool-bound model per tool set.
+
+Example usage:
+
+from model_registry import get_chat_model, get_registry_stats
+
+chatbot_with_tools = get_chat_model("gpt-4o", tools=tools)
+print(get_registry_stats())
+"""
+
+from importlib import import_module
+import threading
+import httpx
+import os
+
+# Maps the provider name to the LangChain chat model class (imported lazily so
+# you only need the packages installed for the providers you actually use)
+provider_mapping = {
+    "openai": ("langchain_openai", "ChatOpenAI"),
+    "anthropic": ("langchain_anthropic", "ChatAnthropic"),
+    "groq": ("langchain_groq", "ChatGroq"),
+    "ollama": ("langchain_ollama", "ChatOllama"),
+    "llama": ("langchain_groq", "ChatGroq")
+}
+
+# Substrings of the model name used to guess the provider when it isn't given
+model_mapping = {
+    "gpt": "openai",
+    "o1": "openai",
+    "claude": "anthropic",
+    "groq": "groq",
+    "llama": "groq"
+}
+
+# Providers whose LangChain class accepts our own pooled httpx clients.
+# The other SDK clients keep their own connection pool, which is reused as
+# long as the client instance itself is reused (which this registry does).
+pooled_providers = ["openai"]
+
+max_connections = int(os.getenv('LLM_MAX_CONNECTIONS', '20'))
+max_keepalive_connections = int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', '10'))
+keepalive_expiry = float(os.getenv('LLM_KEEPALIVE_EXPIRY', '60'))
+
+def resolve_provider(model, provider="auto"):
+    """
+    Determines which provider serves a model.
+
+    Args:
+        model (str): The model ID, e.g. gpt-4o or llama3-groq-70b-8192-tool-use-preview
+        provider (str): The provider to use, or "auto" to guess it from the model name
+
+    Returns:
+        str: The provider name (a key of provider_mapping)
+    """
+    if provider and provider != "auto":
+        if provider.lower() not in provider_mapping:
+            raise ValueError(f"Unsupported LLM provider: {provider}")
+        return provider.lower()
+
+    for key, provider_name in model_mapping.items():
+        if key in model.lower():
+            return provider_name
+
+    raise ValueError(f"Could not determine the provider for model '{model}', set LLM_PROVIDER.")
+
+class ModelRegistry:
+    """
+    Thread-safe cache of chat model clients and their tool-bound variants.
+
+    Base clients are keyed by (provider, model, extra kwargs) and tool-bound
+    clients by (provider, model, extra kwargs, tool names), so the same bound
+    model is reused for every turn that binds the same tools.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.models = {}
+        self.bound_models = {}
+        self.http_client = None
+        self.http_async_client = None
+        self.stats = {
+            "models_created": 0,
+            "model_cache_hits": 0,
+            "bound_models_created": 0,
+            "bound_model_cache_hits": 0,
+            "http_requests": 0,
+            "http_async_requests": 0
+        }
+
+    def get_http_clients(self):
+        """Creates the shared keep-alive httpx clients the first time they are needed."""
+        if self.http_client is None:
+            limits = httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry
+            )
+
+            # The hooks run outside of get_model, so they can take the lock themselves
+            def count_request(request):
+                with self.lock:
+                    self.stats["http_requests"] += 1
+
+            async def count_async_request(request):
+                with self.lock:
+                    self.stats["http_async_requests"] += 1
+
+            self.http_client = httpx.Client(limits=limits, event_hooks={"request": [count_request]})
+            self.http_async_client = httpx.AsyncClient(limits=limits, event_hooks={"request": [count_async_request]})
+
+        return self.http_client, self.http_async_client
+
+    def get_model(self, model, provider="auto", **kwargs):
+        """
+        Gets the (cached) chat model client for a model.
+
+        Args:
+            model (str): The model ID
+            provider (str): The provider to use, or "auto" to guess it from the model name
+            **kwargs: Extra arguments for the chat model class, e.g. streaming=True
+
+        Returns:
+            BaseChatModel: The chat model client
+        """
+        provider = resolve_provider(model, provider)
+        key = (provider, model, tuple(sorted(kwargs.items())))
+
+        with self.lock:
+            if key in self.models:
+                self.stats["model_cache_hits"] += 1
+                return self.models[key]
+
+            module_name, class_name = provider_mapping[provider]
+            chatbot_class = getattr(import_module(module_name), class_name)
+
+            if provider in pooled_providers:
+                http_client, http_async_client = self.get_http_clients()
+                kwargs = {"http_client": http_client, "http_async_client": http_async_client, **kwargs}
+
+            chatbot = chatbot_class(model=model, **kwargs)
+            self.models[key] = chatbot
+            self.stats["models_created"] += 1
+
+            return chatbot
+
+    def get_model_with_tools(self, model, tools, provider="auto", **kwargs):
+        """
+        Gets the (cached) chat model client with the given tools bound to it.
+
+        Args:
+            model (str): The model ID
+            tools (list): The LangChain tools to bind to the model
+            provider (str): The provider to use, or "auto" to guess it from the model name
+            **kwargs: Extra arguments for the chat model class, e.g. streaming=True
+
+        Returns:
+            Runnable: The chat model client with the tools bound
+        """
+        provider = resolve_provider(model, provider)
+        tool_names = tuple(sorted(tool.name for tool in tools))
+        key = (provider, model, tuple(sorted(kwargs.items())), tool_names)
+
+        with self.lock:
+            if key in self.bound_models:
+                self.stats["bound_model_cache_hits"] += 1
+                return self.bound_models[key]
+
+        chatbot_with_tools = self.get_model(model, provider, **kwargs).bind_tools(tools)
+
+        with self.lock:
+            # Another thread may have bound the same tools meanwhile, only the first one is kept and counted
+            if key in self.bound_models:
+                self.stats["bound_model_cache_hits"] += 1
+            else:
+                self.bound_models[key] = chatbot_with_tools
+                self.stats["bound_models_created"] += 1
+            return self.bound_models[key]
+
+    def get_stats(self):
+        """
+        Gets the cache and connection statistics of the registry.
+
+        Returns:
+            dict: Cache hits/misses, the number of HTTP requests sent through the
+            shared pool and how many pooled connections are currently open
+        """
+        with self.lock:
+            stats = dict(self.stats)
+            stats["cached_models"] = len(self.models)
+            stats["cached_bound_models"] = len(self.bound_models)
+        stats["open_connections"] = count_pool_connections(self.http_client)
+        stats["open_async_connections"] = count_pool_connections(self.http_async_client)
+
+        return stats
+
+def count_pool_connections(client):
+    # httpx doesn't expose its pool publicly, so this is best effort
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = getattr(pool, "connections", None)
+    return len(connections) if connections is not None else 0
+
+registry = ModelRegistry()
+
+def get_chat_model(model, tools=None, provider="auto", **kwargs):
+    """
+    Gets a cached chat model client from the shared registry, with tools bound if given.
+
+    Example call:
+
+    get_chat_model("gpt-4o", tools=[create_asana_task])
+    Args:
+        model (str): The model ID
+        tools (list, optional): The LangChain tools to bind to the model
+        provider (str): The provider to use, or "auto" to guess it from the model name
+        **kwargs: Extra arguments for the chat model class, e.g. streaming=True
+    Returns:
+        Runnable: The chat model client (with the tools bound if any were given)
+    """
+    if tools:
+        return registry.get_model_with_tools(model, tools, provider, **kwargs)
+
+    return registry.get_model(model, provider, **kwargs)
+
+def get_registry_stats():
+    """Gets the cache and connection statistics of the shared registry."""
+    return registry.get_stats()
@@ -0,0 +1,231 @@
+"""
+Prompt assembly for provider-side prompt caching, and per call reporting of
+the cached and uncached prompt tokens.
+
+Every step of the agent re-sends the same long prefix: the schemas of every
+bound tool and the system message. The providers only charge less (and answer
+faster) for that prefix when it is byte for byte the same as a recent request's:
+
+- OpenAI caches prompts of 1024+ tokens automatically, by their exact prefix
+  (the tools, then the messages in order)
+- Anthropic caches up to the blocks marked with cache_control, so the system
+  message gets a cache_control breakpoint (which covers the tools before it too)
+- Ollama reuses the KV cache of the longest matching prefix as long as the model
+  stays loaded, which OLLAMA_KEEP_ALIVE keeps it for between turns
+
+So the tools are bound sorted by name and the system messages always go first,
+with everything that changes (the conversation) after them. Each call's prompt
+tokens are then logged as cached/uncached, along with whether the static
+prefix (tool schemas + system messages) changed since the previous call of the
+same conversation (calls of other conversations in between don't count).
+
+Example usage:
+
+from prompt_cache import assemble_messages, get_prefix_hash, prompt_cache_tracker
+
+response = chatbot_with_tools.invoke(assemble_messages(messages, provider))
+prompt_cache_tracker.record(response, get_prefix_hash(messages, tools), conversation=thread_id)
+print(prompt_cache_tracker.get_stats())
+"""
+
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import SystemMessage
+from collections import OrderedDict, deque
+from dotenv import load_dotenv
+import threading
+import hashlib
+import json
+import os
+
+load_dotenv()
+
+ollama_keep_alive = os.getenv('OLLAMA_KEEP_ALIVE', '30m')
+log_prompt_cache = os.getenv('LOG_PROMPT_CACHE', 'true').lower() in ["true", "yes", "1"]
+# How many of the latest calls the tracker keeps (the totals cover every call)
+recent_calls_kept = int(os.getenv('PROMPT_CACHE_RECENT_CALLS', '100'))
+# How many conversations the last static prefix is remembered for, least recently used first out
+max_tracked_conversations = 1000
+
+def sort_tools(tools):
+    """Sorts the tools by name so the bound tool schemas are the same whatever order they were collected in."""
+    return sorted(tools, key=lambda tool: tool.name)
+
+def get_cache_kwargs(provider):
+    """
+    Gets the extra chat model arguments that make a provider reuse the cached prefix (and report it).
+
+    Returns:
+        dict: Keyword arguments for the chat model class (empty when caching is automatic)
+    """
+    if provider == "ollama":
+        return {"keep_alive": ollama_keep_alive}
+    if provider == "openai":
+        # OpenAI only sends the token usage (with the cached tokens) of a streamed response when asked to
+        return {"stream_usage": True}
+    return {}
+
+def assemble_messages(messages, provider=None):
+    """
+    Orders the messages so the static prefix comes first: the system messages
+    (in their original order), then the conversation.
+
+    For Anthropic the last system message is marked as the end of the cached prefix.
+
+    Args:
+        messages (list): The messages to send
+        provider (str): The provider the messages are sent to
+
+    Returns:
+        list: The messages in prefix-stable order
+    """
+    system_messages = [message for message in messages if isinstance(message, SystemMessage)]
+    conversation = [message for message in messages if not isinstance(message, SystemMessage)]
+
+    if provider == "anthropic" and system_messages and isinstance(system_messages[-1].content, str):
+        system_messages[-1] = SystemMessage(content=[
+            {"type": "text", "text": system_messages[-1].content, "cache_control": {"type": "ephemeral"}}
+        ])
+
+    return system_messages + conversation
+
+# The JSON schemas of each set of bound tools (by tool names), so they're only converted once
+tool_schemas = {}
+
+def get_tool_schemas(tools):
+    key = tuple(tool.name for tool in tools)
+    if key not in tool_schemas:
+        tool_schemas[key] = [convert_to_openai_tool(tool) for tool in tools]
+    return tool_schemas[key]
+
+def get_prefix_hash(messages, tools=None):
+    """Hashes the static prefix of a request (the tool schemas and system messages) to check it stays the same."""
+    prefix = {
+        "tools": get_tool_schemas(tools or []),
+        "system": [message.content for message in messages if isinstance(message, SystemMessage)]
+    }
+    return hashlib.sha256(json.dumps(prefix, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def get_cache_usage(message, llm_output=None):
+    """
+    Gets the prompt token usage of a response, with how much of the prompt was read from the cache.
+
+    Args:
+        message (AIMessage): The response from the chat model
+        llm_output (dict, optional): The LLMResult's llm_output, for older integrations
+
+    Returns:
+        dict: input_tokens, cached_tokens (None if the provider doesn't say), cache_write_tokens and uncached_tokens
+    """
+    usage = getattr(message, "usage_metadata", None) or {}
+    metadata = getattr(message, "response_metadata", None) or {}
+    raw_usage = metadata.get("token_usage") or metadata.get("usage") or (llm_output or {}).get("token_usage") or {}
+    if not isinstance(raw_usage, dict):
+        raw_usage = {}
+
+    input_tokens = usage.get("input_tokens") or raw_usage.get("prompt_tokens") or raw_usage.get("input_tokens") or metadata.get("prompt_eval_count")
+    details = usage.get("input_token_details") or {}
+    cached_tokens = details.get("cache_read")
+    cache_write_tokens = details.get("cache_creation") or raw_usage.get("cache_creation_input_tokens") or 0
+
+    if cached_tokens is None:
+        # OpenAI (prompt_tokens_details.cached_tokens) and Anthropic (cache_read_input_tokens) report it in the raw usage
+        cached_tokens = (raw_usage.get("prompt_tokens_details") or {}).get("cached_tokens", raw_usage.get("cache_read_input_tokens"))
+
+    if cached_tokens is not None and raw_usage.get("cache_read_input_tokens") is not None and not details:
+        # Anthropic's raw input_tokens only counts the tokens after the last cache breakpoint
+        input_tokens = (input_tokens or 0) + cached_tokens + cache_write_tokens
+
+    return {
+        "input_tokens": input_tokens,
+        "cached_tokens": cached_tokens,
+        "cache_write_tokens": cache_write_tokens,
+        "uncached_tokens": input_tokens - cached_tokens if input_tokens is not None and cached_tokens is not None else input_tokens
+    }
+
+class PromptCacheTracker:
+    """Thread-safe running totals of the cached and uncached prompt tokens, plus the latest calls."""
+
+    def __init__(self, recent_calls=recent_calls_kept):
+        self.lock = threading.Lock()
+        self.totals = {"calls": 0, "input_tokens": 0, "cached_tokens": 0, "cache_write_tokens": 0, "prefix_changes": 0}
+        self.recent_calls = deque(maxlen=recent_calls)
+        # Conversation -> the static prefix of its last call
+        self.last_prefix_hashes = OrderedDict()
+
+    def record(self, message, prefix_hash=None, llm_output=None, label=None, conversation=None):
+        """
+        Records the prompt token usage of a call (and prints it if LOG_PROMPT_CACHE is on).
+
+        Args:
+            conversation (str, optional): The conversation (like the thread ID) the call belongs to, the
+                static prefix is only compared with the previous call of the same conversation
+
+        Returns:
+            dict: The call's usage, with prefix_changed telling if the static prefix differs from the
+            conversation's previous call
+        """
+        call = get_cache_usage(message, llm_output)
+        with self.lock:
+            self.totals["calls"] += 1
+            call["call"] = self.totals["calls"]
+            call["label"] = label
+            call["prefix_hash"] = prefix_hash
+            call["prefix_changed"] = False
+            if prefix_hash is not None and conversation is not None:
+                call["prefix_changed"] = self.last_prefix_hashes.get(conversation) not in (None, prefix_hash)
+                self.last_prefix_hashes[conversation] = prefix_hash
+                self.last_prefix_hashes.move_to_end(conversation)
+                while len(self.last_prefix_hashes) > max_tracked_conversations:
+                    self.last_prefix_hashes.popitem(last=False)
+
+            self.totals["input_tokens"] += call["input_tokens"] or 0
+            self.totals["cached_tokens"] += call["cached_tokens"] or 0
+            self.totals["cache_write_tokens"] += call["cache_write_tokens"] or 0
+            self.totals["prefix_changes"] += int(call["prefix_changed"])
+            self.recent_calls.append(call)
+
+        if log_prompt_cache:
+            cached = "unknown" if call["cached_tokens"] is None else call["cached_tokens"]
+            changed = " (static prefix changed!)" if call["prefix_changed"] else ""
+            print(f"Prompt tokens: {call['input_tokens']}, cached: {cached}, uncached: {call['uncached_tokens']}{changed}")
+
+        return call
+
+    def get_stats(self):
+        """
+        Gets the totals over every call recorded.
+
+        Returns:
+            dict: Calls, input/cached/uncached token totals, the cache hit ratio and how often the static prefix changed
+        """
+        with self.lock:
+            stats = dict(self.totals)
+
+        stats["uncached_tokens"] = stats["input_tokens"] - stats["cached_tokens"]
+        stats["cache_hit_ratio"] = stats["cached_tokens"] / stats["input_tokens"] if stats["input_tokens"] else 0.0
+        return stats
+
+    def get_recent_calls(self):
+        """Gets the usage of the latest PROMPT_CACHE_RECENT_CALLS calls, oldest first."""
+        with self.lock:
+            return list(self.recent_calls)
+
+class PromptCacheCallbackHandler(BaseCallbackHandler):
+    """
+    Records every chat model call in a tracker, for chains where the response
+    message isn't available (like a chat model piped into an output parser).
+    """
+
+    def __init__(self, tracker, label=None):
+        self.tracker = tracker
+        self.label = label
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                if message is not None:
+                    self.tracker.record(message, llm_output=response.llm_output, label=self.label)
+
+prompt_cache_tracker = PromptCacheTracker()
@@ -9,13 +9,12 @@ import streamlit as st
 import json
 import os
 
-from langchain_groq import ChatGroq
-from langchain_ollama import ChatOllama
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
 from langchain_core.messages import ToolMessage, AIMessage
 from langchain_huggingface import HuggingFacePipeline, HuggingFaceEndpoint, ChatHuggingFace
 
+from model_registry import get_chat_model, resolve_provider
+from prompt_cache import sort_tools, get_cache_kwargs, assemble_messages, get_prefix_hash, prompt_cache_tracker
+from tool_selector import ToolSelector
 from tools.asana_tools import available_asana_functions
 from tools.google_drive_tools import available_drive_functions
 from tools.vector_db_tools import available_vector_db_functions
@@ -24,20 +23,6 @@ load_dotenv()
 model = os.getenv('LLM_MODEL', 'gpt-4o')
 provider = os.getenv('LLM_PROVIDER', 'auto')
 
-provider_mapping = {
-    "openai": ChatOpenAI,
-    "anthropic": ChatAnthropic,
-    "ollama": ChatOllama,
-    "llama": ChatGroq
-}
-
-model_mapping = {
-    "gpt": ChatOpenAI,
-    "claude": ChatAnthropic,
-    "groq": ChatGroq,
-    "llama": ChatGroq
-}
-
 # Support for HuggingFace with local models coming soon! This function isn't used yet.
 @st.cache_resource
 def get_local_model():
@@ -60,20 +45,11 @@ def get_local_model():
     # )
 
 available_functions = available_asana_functions | available_drive_functions | available_vector_db_functions
-tools = [tool for _, tool in available_functions.items()]
-
-if provider == "auto":
-    for key, chatbot_class in model_mapping.items():
-        if key in model.lower():
-            chatbot = chatbot_class(model=model) if key != "huggingface" else chatbot_class(llm=get_local_model())
-            break
-else:
-    for key, chatbot_class in provider_mapping.items():
-        if key in provider.lower():
-            chatbot = chatbot_class(model=model) if key != "huggingface" else chatbot_class(llm=get_local_model())
-            break
+# Sorted by name so the tool schemas at the start of every prompt are byte for byte the same (for prompt caching)
+tools = sort_tools(available_functions.values())
 
-chatbot_with_tools = chatbot.bind_tools(tools)
+# Picks the TOOL_SELECTION_TOP_N most relevant tools for each call (all of them when it is 0)
+tool_selector = ToolSelector(tools)
 
 ### State
 class GraphState(TypedDict):
@@ -102,8 +78,23 @@ def call_model(state: GraphState, config: RunnableConfig) -> Dict[str, AnyMessag
         state["messages"]
     ))
 
-    # Invoke the chatbot with the binded tools
-    response = chatbot_with_tools.invoke(messages, config)
+    # The model can be overridden per graph (see get_runnable), otherwise it's LLM_MODEL and LLM_PROVIDER
+    configurable = config.get("configurable", {})
+    llm_model = configurable.get("llm_model") or model
+    llm_provider = configurable.get("llm_provider") or provider
+    llm_resolved_provider = resolve_provider(llm_model, llm_provider)
+
+    # Only bind the tools relevant to the latest messages, the registry caches the bound model per subset
+    selected_tools = tool_selector.select(messages)
+    chatbot = get_chat_model(llm_model, tools=selected_tools, provider=llm_provider, **get_cache_kwargs(llm_resolved_provider))
+
+    # Invoke the chatbot with the binded tools, with the static system prompt first so the provider can cache it
+    response = chatbot.invoke(assemble_messages(messages, llm_resolved_provider), config)
+    # The static prefix is compared per conversation, so concurrent threads don't count as prefix changes
+    prompt_cache_tracker.record(
+        response, get_prefix_hash(messages, selected_tools), label="agent", conversation=configurable.get("thread_id")
+    )
+    tool_selector.record(messages, selected_tools, response)
     # print("Response from model:", response)
 
     # We return an object because this will get added to the existing list
@@ -163,7 +154,17 @@ def should_continue(state: GraphState) -> Literal["__end__", "tools"]:
     else:
         return "tools"
 
-def get_runnable():
+def get_runnable(model=None, provider=None):
+    """
+    Builds the agent graph.
+
+    Args:
+        model (str, optional): The model to use instead of LLM_MODEL
+        provider (str, optional): The provider to use instead of LLM_PROVIDER
+
+    Returns:
+        Runnable: The compiled graph, with an in memory checkpointer per graph
+    """
     workflow = StateGraph(GraphState)
 
     # Define the nodes and how they connect
@@ -182,4 +183,8 @@ def get_runnable():
     memory = AsyncSqliteSaver.from_conn_string(":memory:")
     app = workflow.compile(checkpointer=memory)
 
+    if model or provider:
+        # call_model reads the model and provider to use from the config
+        return app.with_config(configurable={"llm_model": model, "llm_provider": provider})
+
     return app
\ No newline at end of file
@@ -0,0 +1,255 @@
+"""
+Retrieval-based tool selection for the agent.
+
+runnable.py binds every Asana, Google Drive and vector DB tool (about 20 schemas)
+on every call, even when a turn only needs one family of them. The selector
+embeds the tool descriptions once and, for each call, binds only the top
+TOOL_SELECTION_TOP_N tools for the latest messages (plus the tools already
+called in the conversation, so multi-step tasks keep what they need).
+
+The tools are scored with a sentence-transformers model
+(TOOL_SELECTION_EMBEDDING_MODEL) if it is installed, otherwise by word overlap.
+The selected tools are sorted by name, so the same subset always binds the
+same cached model from the model registry and keeps the same prompt prefix.
+
+Every selection can be logged to TOOL_SELECTION_LOG (JSON lines with the query,
+the selected tools and the tools the model then called). To measure the token
+savings and the selection accuracy (did the top N contain every tool the model
+called) on a log, ideally one recorded with the selection turned off, run:
+
+python tool_selector.py tool-selection-log.jsonl [top n]
+"""
+
+from langchain_core.messages import HumanMessage, AIMessage
+from collections import Counter
+from dotenv import load_dotenv
+import threading
+import json
+import time
+import sys
+import re
+import os
+
+from prompt_cache import get_tool_schemas, sort_tools
+
+load_dotenv()
+
+top_n = int(os.getenv('TOOL_SELECTION_TOP_N', '0'))
+embedding_model_name = os.getenv('TOOL_SELECTION_EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+selection_log_path = os.getenv('TOOL_SELECTION_LOG', '')
+# How many of the latest user messages are used to pick the tools (the latest one counts the most)
+context_messages = int(os.getenv('TOOL_SELECTION_CONTEXT_MESSAGES', '2'))
+
+def estimate_tokens(text):
+    # About 4 characters per token for English text and JSON
+    return len(text) // 4
+
+def get_tool_text(tool):
+    """Gets the text a tool is matched on: its name in words and the first paragraph of its description."""
+    description = tool.description.strip().split("\n\n")[0]
+    return f"{tool.name.replace('_', ' ')}: {' '.join(description.split())}"
+
+def tokenize(text):
+    # Plurals match their singular ("files" -> "file") so the word overlap fallback isn't too literal
+    return [word[:-1] if len(word) > 3 and word.endswith("s") else word for word in re.findall(r"[a-z0-9]+", text.lower())]
+
+def get_message_text(message):
+    if isinstance(message.content, str):
+        return message.content
+    return " ".join(part.get("text", "") for part in message.content if isinstance(part, dict))
+
+class ToolSelector:
+    """Picks the tools to bind for a conversation from all of the available tools."""
+
+    def __init__(self, tools, top_n=top_n, log_path=selection_log_path):
+        self.tools = sort_tools(tools)
+        self.top_n = top_n
+        self.log_path = log_path
+        self.lock = threading.Lock()
+        self.tool_texts = [get_tool_text(tool) for tool in self.tools]
+        self.tool_tokens = [set(tokenize(text)) for text in self.tool_texts]
+        self.embedding_model = None
+        self.tool_embeddings = None
+        self.use_embeddings = True
+        self.full_schema_tokens = self.get_schema_tokens(self.tools)
+        self.stats = {"selections": 0, "tools_bound": 0, "schema_tokens": 0, "full_schema_tokens": 0,
+                      "tool_calls": 0, "tool_calls_selected": 0, "selection_seconds": 0.0}
+
+    def get_schema_tokens(self, tools):
+        return estimate_tokens(json.dumps(get_tool_schemas(tools)))
+
+    def get_embedding_scores(self, query):
+        if not self.use_embeddings:
+            return None
+
+        with self.lock:
+            if self.embedding_model is None:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                except ImportError:
+                    self.use_embeddings = False
+                    return None
+
+                # The tool descriptions are only embedded once
+                self.embedding_model = SentenceTransformer(embedding_model_name)
+                self.tool_embeddings = self.embedding_model.encode(self.tool_texts, normalize_embeddings=True)
+
+        return (self.tool_embeddings @ self.embedding_model.encode([query], normalize_embeddings=True)[0]).tolist()
+
+    def get_scores(self, query):
+        """
+        Scores every tool for a query.
+
+        Returns:
+            list: One score per tool (in self.tools order), higher is more relevant
+        """
+        scores = self.get_embedding_scores(query)
+        if scores is None:
+            # Words repeated in the query (like the ones in the latest message) count more
+            words = Counter(tokenize(query))
+            scores = [sum(words[word] for word in tool_tokens) / (len(tool_tokens) ** 0.5) for tool_tokens in self.tool_tokens]
+
+        return scores
+
+    def get_query(self, messages):
+        """Gets the text to select the tools for: the latest user messages, the most recent repeated so it counts the most."""
+        user_messages = [get_message_text(message) for message in messages if isinstance(message, HumanMessage)]
+        recent = user_messages[-context_messages:]
+        return "\n".join(recent + recent[-1:])
+
+    def get_called_tools(self, messages):
+        return {call["name"] for message in messages if isinstance(message, AIMessage) for call in message.tool_calls or []}
+
+    def select(self, messages, top_n=None):
+        """
+        Selects the tools to bind for the next call.
+
+        Args:
+            messages (list): The conversation so far
+            top_n (int, optional): How many tools to select, defaults to the selector's
+
+        Returns:
+            list: The selected tools sorted by name (all of the tools if top_n is 0 or there is no user message yet)
+        """
+        top_n = self.top_n if top_n is None else top_n
+        query = self.get_query(messages)
+        if not top_n or top_n >= len(self.tools) or not query:
+            return self.tools
+
+        start = time.perf_counter()
+        scores = self.get_scores(query)
+        ranked = sorted(range(len(self.tools)), key=lambda i: scores[i], reverse=True)
+        selected = {self.tools[i].name for i in ranked[:top_n]}
+
+        # Tools the model already called in this conversation stay bound for the follow up steps
+        selected |= self.get_called_tools(messages) & {tool.name for tool in self.tools}
+
+        with self.lock:
+            self.stats["selection_seconds"] += time.perf_counter() - start
+
+        return [tool for tool in self.tools if tool.name in selected]
+
+    def record(self, messages, selected_tools, response):
+        """
+        Records a selection and the tools the model then called, for the stats and the selection log.
+
+        Returns:
+            dict: The logged selection
+        """
+        selected_names = [tool.name for tool in selected_tools]
+        called = [call["name"] for call in getattr(response, "tool_calls", None) or []]
+        entry = {
+            "query": self.get_query(messages),
+            "selected": selected_names,
+            "called": called,
+            "all_tools_bound": len(selected_tools) == len(self.tools)
+        }
+
+        with self.lock:
+            self.stats["selections"] += 1
+            self.stats["tools_bound"] += len(selected_tools)
+            self.stats["schema_tokens"] += self.get_schema_tokens(selected_tools)
+            self.stats["full_schema_tokens"] += self.full_schema_tokens
+            self.stats["tool_calls"] += len(called)
+            self.stats["tool_calls_selected"] += sum(name in selected_names for name in called)
+
+            if self.log_path:
+                with open(self.log_path, "a") as log_file:
+                    log_file.write(json.dumps(entry) + "\n")
+
+        return entry
+
+    def get_stats(self):
+        """
+        Gets the selection stats since the selector was created.
+
+        Returns:
+            dict: Selections, average tools bound, estimated schema tokens sent vs binding every tool, and the time spent selecting
+        """
+        with self.lock:
+            stats = dict(self.stats)
+
+        selections = stats["selections"] or 1
+        stats["avg_tools_bound"] = stats["tools_bound"] / selections
+        stats["schema_tokens_saved"] = stats["full_schema_tokens"] - stats["schema_tokens"]
+        stats["avg_selection_ms"] = stats["selection_seconds"] / selections * 1000
+        return stats
+
+    def evaluate(self, traces, top_n=None):
+        """
+        Replays logged traces through the selector.
+
+        Args:
+            traces (list): Dicts with the "query" and the tools the model "called"
+            top_n (int, optional): How many tools to select, defaults to the selector's
+
+        Returns:
+            dict: The accuracy (share of traces with tool calls where every called tool was selected),
+            the recall of the called tools and the estimated schema tokens per call with and without selection
+        """
+        top_n = self.top_n if top_n is None else top_n
+        evaluated = hits = called_total = called_selected = schema_tokens = 0
+
+        for trace in traces:
+            selected = self.select([HumanMessage(content=trace["query"])], top_n)
+            schema_tokens += self.get_schema_tokens(selected)
+            if not trace.get("called"):
+                continue
+
+            selected_names = {tool.name for tool in selected}
+            evaluated += 1
+            hits += set(trace["called"]) <= selected_names
+            called_total += len(trace["called"])
+            called_selected += sum(name in selected_names for name in trace["called"])
+
+        return {
+            "top_n": top_n,
+            "traces": len(traces),
+            "traces_with_tool_calls": evaluated,
+            "accuracy": hits / evaluated if evaluated else None,
+            "recall": called_selected / called_total if called_total else None,
+            "avg_schema_tokens": schema_tokens / len(traces) if traces else 0,
+            "full_schema_tokens": self.full_schema_tokens,
+            "method": "embedding" if self.use_embeddings and self.embedding_model is not None else "word overlap"
+        }
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python tool_selector.py [tool selection log] [top n]")
+        sys.exit(1)
+
+    from runnable import tools
+
+    with open(sys.argv[1]) as log_file:
+        traces = [json.loads(line) for line in log_file if line.strip()]
+
+    selector = ToolSelector(tools, log_path="")
+    for n in ([int(sys.argv[2])] if len(sys.argv) > 2 else [3, 5, 8]):
+        result = selector.evaluate(traces, n)
+        saved = 1 - result["avg_schema_tokens"] / result["full_schema_tokens"]
+        accuracy = "n/a" if result["accuracy"] is None else f"{result['accuracy']:.1%}"
+        recall = "n/a" if result["recall"] is None else f"{result['recall']:.1%}"
+        print(
+            f"Top {n}: accuracy {accuracy}, recall {recall} over {result['traces_with_tool_calls']} traces with tool calls, "
+            f"~{result['avg_schema_tokens']:.0f} schema tokens per call instead of ~{result['full_schema_tokens']} ({saved:.0%} saved, {result['method']})"
+        )
@@ -2,16 +2,19 @@
 title: n8n Pipe Function
 author: Cole Medin
 author_url: https://www.youtube.com/@ColeMedin
-version: 0.1.0
+version: 0.3.0
+requirements: httpx
 
 This module defines a Pipe class that utilizes N8N for an Agent
 """
 
-from typing import Optional, Callable, Awaitable
+from typing import Optional, Callable, Awaitable, AsyncGenerator, Union
 from pydantic import BaseModel, Field
-import os
+from collections import deque
+import asyncio
+import json
 import time
-import requests
+import httpx
 
 def extract_event_info(event_emitter) -> tuple[Optional[str], Optional[str]]:
     if not event_emitter or not event_emitter.__closure__:
@@ -23,6 +26,19 @@ def extract_event_info(event_emitter) -> tuple[Optional[str], Optional[str]]:
             return chat_id, message_id
     return None, None
 
+class CircuitOpenError(Exception):
+    pass
+
+class BreakerState:
+    """The circuit breaker state of one n8n webhook URL."""
+
+    def __init__(self):
+        self.state = "closed"
+        self.outcomes = deque()
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.last_error = None
+
 class Pipe:
     class Valves(BaseModel):
         n8n_url: str = Field(
@@ -37,6 +53,30 @@ class Pipe:
         enable_status_indicator: bool = Field(
             default=True, description="Enable or disable status indicator emissions"
         )
+        enable_streaming: bool = Field(
+            default=True,
+            description="Forward streamed n8n responses (chunked JSON lines or SSE) to the chat as they arrive",
+        )
+        connect_timeout: float = Field(
+            default=10.0, description="Seconds to wait for a connection to n8n"
+        )
+        read_timeout: float = Field(
+            default=300.0, description="Seconds to wait for the next piece of the n8n response"
+        )
+        breaker_failure_rate: float = Field(
+            default=0.5,
+            description="Stop calling n8n once this fraction of the recent calls failed (timeouts, connection errors, 5xx)",
+        )
+        breaker_minimum_calls: int = Field(
+            default=4, description="Number of recent calls needed before the failure rate is checked"
+        )
+        breaker_window: int = Field(
+            default=10, description="Number of recent calls the failure rate is computed over"
+        )
+        breaker_open_seconds: float = Field(
+            default=30.0,
+            description="Seconds to fail fast before letting a single probe call through to n8n again",
+        )
 
     def __init__(self):
         self.type = "pipe"
@@ -44,8 +84,88 @@ class Pipe:
         self.name = "N8N Pipe"
         self.valves = self.Valves()
         self.last_emit_time = 0
+        self.client = None
+        self.client_loop = None
+        # One breaker per webhook URL, so changing the n8n_url valve doesn't inherit another workflow's failures
+        self.breakers = {}
         pass
 
+    def get_client(self) -> httpx.AsyncClient:
+        # One pooled client per event loop so the connection to n8n is kept alive between chats
+        loop = asyncio.get_running_loop()
+        if self.client is None or self.client_loop is not loop:
+            self.client = httpx.AsyncClient(
+                timeout=httpx.Timeout(
+                    self.valves.read_timeout, connect=self.valves.connect_timeout
+                ),
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            )
+            self.client_loop = loop
+        return self.client
+
+    def get_breaker(self, url: str) -> BreakerState:
+        if url not in self.breakers:
+            self.breakers[url] = BreakerState()
+        return self.breakers[url]
+
+    def breaker_before_call(self, breaker: BreakerState):
+        # Circuit breaker so a slow or down n8n fails fast instead of every chat waiting for the timeout
+        if breaker.state == "open":
+            waited = time.monotonic() - breaker.opened_at
+            if waited < self.valves.breaker_open_seconds:
+                raise CircuitOpenError(
+                    f"N8N workflow is unavailable (circuit open after: {breaker.last_error}), "
+                    f"retrying in {self.valves.breaker_open_seconds - waited:.0f}s"
+                )
+            breaker.state = "half_open"
+            breaker.probe_in_flight = False
+
+        if breaker.state == "half_open":
+            if breaker.probe_in_flight:
+                raise CircuitOpenError(
+                    "N8N workflow is unavailable (circuit half open, waiting for the probe call)"
+                )
+            breaker.probe_in_flight = True
+
+    def breaker_record(self, breaker: BreakerState, error: Optional[Exception] = None):
+        # 4xx responses mean n8n answered, so only timeouts, connection errors and 5xx count
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+        failed = error is not None and (status_code is None or status_code >= 500)
+
+        if not failed:
+            if breaker.state == "half_open":
+                breaker.state = "closed"
+                breaker.outcomes.clear()
+            breaker.probe_in_flight = False
+            breaker.outcomes.append(True)
+        else:
+            breaker.last_error = str(error) or type(error).__name__
+            breaker.outcomes.append(False)
+            failures = breaker.outcomes.count(False)
+            if breaker.state == "half_open" or (
+                len(breaker.outcomes) >= self.valves.breaker_minimum_calls
+                and failures / len(breaker.outcomes)
+                >= self.valves.breaker_failure_rate
+            ):
+                breaker.state = "open"
+                breaker.opened_at = time.monotonic()
+                breaker.probe_in_flight = False
+
+        while len(breaker.outcomes) > self.valves.breaker_window:
+            breaker.outcomes.popleft()
+
+    def get_breaker_state(self, url: Optional[str] = None) -> dict:
+        breaker = self.get_breaker(url or self.valves.n8n_url)
+        return {
+            "state": breaker.state,
+            "failure_rate": (
+                breaker.outcomes.count(False) / len(breaker.outcomes)
+                if breaker.outcomes
+                else 0.0
+            ),
+            "last_error": breaker.last_error,
+        }
+
     async def emit_status(
         self,
         __event_emitter__: Callable[[dict], Awaitable[None]],
@@ -74,50 +194,197 @@ class Pipe:
             )
             self.last_emit_time = current_time
 
+    async def emit_status_while_waiting(
+        self,
+        __event_emitter__: Callable[[dict], Awaitable[None]],
+        first_chunk: asyncio.Event,
+    ):
+        # Keeps the status indicator alive every emit_interval until n8n starts responding
+        start_time = time.time()
+        while not first_chunk.is_set():
+            try:
+                await asyncio.wait_for(
+                    first_chunk.wait(), timeout=self.valves.emit_interval
+                )
+            except asyncio.TimeoutError:
+                await self.emit_status(
+                    __event_emitter__,
+                    "info",
+                    f"/Waiting for N8N Workflow... ({int(time.time() - start_time)}s)",
+                    False,
+                )
+
+    def parse_stream_line(self, line: str) -> Optional[str]:
+        """
+        Gets the text out of one line of a streamed n8n response. Handles SSE
+        "data:" lines, n8n streaming chunks ({"type": "item", "content": "..."})
+        and single line JSON responses with the response field.
+        Returns None for lines without text (begin/end markers, blank lines).
+        """
+        line = line.strip()
+        is_sse_data = line.startswith("data:")
+        if is_sse_data:
+            line = line[len("data:") :].strip()
+            if line == "[DONE]":
+                return None
+        elif line.startswith(("event:", "id:", "retry:", ":")):
+            return None
+        if not line:
+            return None
+
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            # SSE data can be plain text, anything else is part of a multi-line JSON body
+            if is_sse_data:
+                return line
+            raise
+        if isinstance(data, dict):
+            if data.get("type") == "error":
+                raise Exception(f"Error from N8N: {data.get('content')}")
+            if isinstance(data.get("content"), str):
+                return data["content"]
+            if self.valves.response_field in data:
+                return data[self.valves.response_field]
+            # Streaming chunks (and SSE events) always have a type, a regular
+            # (non-streamed) JSON response without the response field is an error
+            if not is_sse_data and "type" not in data:
+                raise Exception(
+                    f"N8N response has no '{self.valves.response_field}' field: {line[:200]}"
+                )
+        elif isinstance(data, str):
+            return data
+        return None
+
+    async def stream_n8n_response(
+        self, response: httpx.Response
+    ) -> AsyncGenerator[str, None]:
+        content_type = response.headers.get("content-type", "")
+
+        if content_type.startswith("text/plain"):
+            async for text in response.aiter_text():
+                yield text
+            return
+
+        # JSON lines (or SSE) are forwarded one line at a time. A regular JSON
+        # response spread over several lines is buffered and parsed at the end.
+        buffered_lines = []
+        async for line in response.aiter_lines():
+            if buffered_lines:
+                buffered_lines.append(line)
+                continue
+            try:
+                text = self.parse_stream_line(line)
+            except json.JSONDecodeError:
+                buffered_lines.append(line)
+                continue
+            if text:
+                yield text
+
+        if buffered_lines:
+            data = json.loads("\n".join(buffered_lines))
+            if not isinstance(data, dict) or self.valves.response_field not in data:
+                raise Exception(
+                    f"N8N response has no '{self.valves.response_field}' field"
+                )
+            yield data[self.valves.response_field]
+
+    async def run_workflow(
+        self,
+        question: str,
+        chat_id: Optional[str],
+        __event_emitter__: Callable[[dict], Awaitable[None]] = None,
+    ) -> AsyncGenerator[str, None]:
+        headers = {
+            "Authorization": f"Bearer {self.valves.n8n_bearer_token}",
+            "Content-Type": "application/json",
+        }
+        payload = {"sessionId": f"{chat_id}"}
+        payload[self.valves.input_field] = question
+
+        url = self.valves.n8n_url
+        breaker = self.get_breaker(url)
+        self.breaker_before_call(breaker)
+
+        first_chunk = asyncio.Event()
+        status_task = asyncio.create_task(
+            self.emit_status_while_waiting(__event_emitter__, first_chunk)
+        )
+        try:
+            async with self.get_client().stream(
+                "POST", url, json=payload, headers=headers
+            ) as response:
+                if response.status_code != 200:
+                    error_text = (await response.aread()).decode(errors="replace")
+                    raise httpx.HTTPStatusError(
+                        f"Error: {response.status_code} - {error_text}",
+                        request=response.request,
+                        response=response,
+                    )
+
+                async for text in self.stream_n8n_response(response):
+                    first_chunk.set()
+                    yield text
+        except (httpx.HTTPError, asyncio.TimeoutError) as e:
+            self.breaker_record(breaker, e)
+            raise
+        except BaseException:
+            # Not n8n's fault (bad response field, chat closed), release a half open probe
+            breaker.probe_in_flight = False
+            raise
+        else:
+            self.breaker_record(breaker)
+        finally:
+            first_chunk.set()
+            status_task.cancel()
+
+    async def stream_workflow(
+        self,
+        question: str,
+        chat_id: Optional[str],
+        __event_emitter__: Callable[[dict], Awaitable[None]] = None,
+    ) -> AsyncGenerator[str, None]:
+        try:
+            async for text in self.run_workflow(question, chat_id, __event_emitter__):
+                yield text
+        except Exception as e:
+            await self.emit_status(
+                __event_emitter__,
+                "error",
+                f"Error during sequence execution: {str(e)}",
+                True,
+            )
+            yield f"Error: {str(e)}"
+            return
+
+        await self.emit_status(__event_emitter__, "info", "Complete", True)
+
     async def pipe(
         self,
         body: dict,
         __user__: Optional[dict] = None,
         __event_emitter__: Callable[[dict], Awaitable[None]] = None,
         __event_call__: Callable[[dict], Awaitable[dict]] = None,
-    ) -> Optional[dict]:
-        await self.emit_status(
-            __event_emitter__, "info", "/Calling N8N Workflow...", False
-        )
+    ) -> Union[str, dict, AsyncGenerator[str, None]]:
+        # Shows when the workflow is degraded, so a fail fast answer isn't a surprise
+        breaker_state = self.get_breaker_state()
+        if breaker_state["state"] != "closed":
+            await self.emit_status(
+                __event_emitter__,
+                "warning",
+                f"/N8N workflow degraded ({breaker_state['state']}, "
+                f"{breaker_state['failure_rate']:.0%} of recent calls failed): {breaker_state['last_error']}",
+                False,
+            )
+        else:
+            await self.emit_status(
+                __event_emitter__, "info", "/Calling N8N Workflow...", False
+            )
         chat_id, _ = extract_event_info(__event_emitter__)
         messages = body.get("messages", [])
 
-        # Verify a message is available
-        if messages:
-            question = messages[-1]["content"]
-            try:
-                # Invoke N8N workflow
-                headers = {
-                    "Authorization": f"Bearer {self.valves.n8n_bearer_token}",
-                    "Content-Type": "application/json",
-                }
-                payload = {"sessionId": f"{chat_id}"}
-                payload[self.valves.input_field] = question
-                response = requests.post(
-                    self.valves.n8n_url, json=payload, headers=headers
-                )
-                if response.status_code == 200:
-                    n8n_response = response.json()[self.valves.response_field]
-                else:
-                    raise Exception(f"Error: {response.status_code} - {response.text}")
-
-                # Set assitant message with chain reply
-                body["messages"].append({"role": "assistant", "content": n8n_response})
-            except Exception as e:
-                await self.emit_status(
-                    __event_emitter__,
-                    "error",
-                    f"Error during sequence execution: {str(e)}",
-                    True,
-                )
-                return {"error": str(e)}
         # If no message is available alert user
-        else:
+        if not messages:
             await self.emit_status(
                 __event_emitter__,
                 "error",
@@ -130,6 +397,30 @@ class Pipe:
                     "content": "No messages found in the request body",
                 }
             )
+            return "No messages found in the request body"
+
+        question = messages[-1]["content"]
+
+        # Open WebUI forwards an async generator to the UI chunk by chunk
+        if self.valves.enable_streaming and body.get("stream", False):
+            return self.stream_workflow(question, chat_id, __event_emitter__)
+
+        try:
+            # Invoke N8N workflow
+            n8n_response = "".join(
+                [text async for text in self.run_workflow(question, chat_id, __event_emitter__)]
+            )
+
+            # Set assitant message with chain reply
+            body["messages"].append({"role": "assistant", "content": n8n_response})
+        except Exception as e:
+            await self.emit_status(
+                __event_emitter__,
+                "error",
+                f"Error during sequence execution: {str(e)}",
+                True,
+            )
+            return {"error": str(e)}
 
         await self.emit_status(__event_emitter__, "info", "Complete", True)
         return n8n_response
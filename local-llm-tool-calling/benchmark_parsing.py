@@ -0,0 +1,126 @@
+"""
+Benchmark of the parse failures and retries of the local model, with and
+without constrained decoding (constrained_decoding.py).
+
+Each prompt is sent like the first step of prompt_ai: the system prompt with
+tool_text and the user's message. A response that JsonOutputParser can't parse,
+or that doesn't match the tool schemas, is a failure and the prompt is sent again
+(like the agent executor does) up to AGENT_MAX_RETRIES times. Nothing is sent to
+Asana, the tool calls are only checked, never run.
+
+Run it with the model in your .env (a Hugging Face model or ollama/[model]):
+
+python benchmark_parsing.py
+
+Optionally with the number of rounds per prompt and a path to save the results as JSON:
+
+python benchmark_parsing.py 5 parsing-results.json
+"""
+
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.messages import SystemMessage, HumanMessage
+from datetime import datetime
+import importlib
+import json
+import time
+import sys
+
+from constrained_decoding import validate_response
+from agent_executor import max_retries
+
+# The Streamlit script has a dash in its name so it is imported by name (main() only runs as a script)
+agent = importlib.import_module("local-agent-with-ui")
+
+prompts = [
+    "Create a task to buy groceries due tomorrow.",
+    "Add a task called 'Write the quarterly report' due on 2024-12-31.",
+    "Remind me to call the dentist.",
+    "Create two tasks: 'Book flights' and 'Reserve a hotel', both due next Friday.",
+    "Hi! What can you help me with?",
+    "Thanks, that's all for today.",
+    "I need a task for reviewing the pull request \"Fix login\" due today.",
+    "Can you create a task named Plan the team offsite?"
+]
+
+def run_prompt(chat_model, prompt):
+    """
+    Sends a prompt until the response parses and matches the schema, or the retries are used up.
+
+    Returns:
+        dict: The attempts, parse failures, schema failures and latency in seconds
+    """
+    messages = [
+        SystemMessage(content=f"You are a personal assistant who helps manage tasks in Asana.\n{agent.tool_text}\nThe current date is: {datetime.now().date()}."),
+        HumanMessage(content=prompt)
+    ]
+    parser = JsonOutputParser(pydantic_object=agent.ToolCallOrResponse)
+    result = {"attempts": 0, "parse_failures": 0, "schema_failures": 0, "succeeded": False}
+
+    start = time.perf_counter()
+    while result["attempts"] <= max_retries:
+        result["attempts"] += 1
+        completion = chat_model.invoke(messages)
+        try:
+            ai_response = parser.parse(completion.content)
+        except Exception:
+            result["parse_failures"] += 1
+            continue
+
+        if validate_response(ai_response, agent.available_tools) is not None:
+            result["schema_failures"] += 1
+            continue
+
+        result["succeeded"] = True
+        break
+
+    result["latency"] = time.perf_counter() - start
+    return result
+
+def run_benchmark(rounds=3):
+    """
+    Runs every prompt rounds times unconstrained and then constrained.
+
+    Returns:
+        dict: The totals and rates per mode
+    """
+    results = {}
+    for mode, enabled in (("unconstrained", False), ("constrained", True)):
+        chat_model = agent.get_chat_model(constrained=enabled)
+        print(f"\nBenchmarking {agent.model} {mode}")
+
+        runs = []
+        for prompt in prompts:
+            for _ in range(rounds):
+                runs.append(run_prompt(chat_model, prompt))
+            print(f"  {prompt[:60]}: {sum(run['attempts'] for run in runs[-rounds:])} calls for {rounds} rounds")
+
+        calls = sum(run["attempts"] for run in runs)
+        results[mode] = {
+            "prompts": len(runs),
+            "llm_calls": calls,
+            "parse_failure_rate": sum(run["parse_failures"] for run in runs) / calls,
+            "schema_failure_rate": sum(run["schema_failures"] for run in runs) / calls,
+            "retry_rate": (calls - len(runs)) / len(runs),
+            "success_rate": sum(run["succeeded"] for run in runs) / len(runs),
+            "avg_latency": sum(run["latency"] for run in runs) / len(runs)
+        }
+
+    return results
+
+def print_results(results):
+    print(f"\n{'Mode':<14} | {'Calls':>5} | {'Parse fail':>10} | {'Schema fail':>11} | {'Retries/prompt':>14} | {'Success':>7} | {'Avg latency':>11}")
+    print("-" * 90)
+    for mode, result in results.items():
+        print(
+            f"{mode:<14} | {result['llm_calls']:>5} | {result['parse_failure_rate']:>10.1%} | {result['schema_failure_rate']:>11.1%} | "
+            f"{result['retry_rate']:>14.2f} | {result['success_rate']:>7.1%} | {result['avg_latency']:>10.2f}s"
+        )
+
+if __name__ == "__main__":
+    results = run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
+    print_results(results)
+
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "w") as results_file:
+            json.dump({"model": agent.model, "results": results}, results_file, indent=2)
+        print(f"Saved the results to {sys.argv[2]}")
@@ -0,0 +1,144 @@
+"""
+Grammar-constrained decoding for the local tool calling models.
+
+The local models are only asked (by tool_text) to answer with a ToolCallOrResponse
+JSON object, and every time one doesn't, JsonOutputParser fails and the whole
+prompt is sent again. This compiles ToolCallOrResponse, with the argument schema
+of every available tool, into a JSON schema that the backend enforces while it
+generates, so every output parses (and only calls real tools) on the first try:
+
+- Hugging Face (TGI and the Inference API): grammar {"type": "json", "value": schema}.
+  HuggingFaceEndpoint passes the bound arguments as the text-generation parameters
+  (and to InferenceClient.text_generation when streaming), where TGI only takes a
+  grammar, which it compiles for the sampler
+- Ollama (through its OpenAI compatible API): response_format {"type": "json_schema", ...},
+  which Ollama turns into its structured output format
+
+Turn it off with CONSTRAINED_DECODING=false to compare with benchmark_parsing.py.
+"""
+
+from dotenv import load_dotenv
+import inspect
+import os
+
+load_dotenv()
+
+constrained_decoding = os.getenv('CONSTRAINED_DECODING', 'true').lower() in ["true", "yes", "1"]
+
+json_types = {str: "string", int: "integer", float: "number", bool: "boolean", dict: "object", list: "array"}
+
+def get_tool_args_schema(selected_tool):
+    """
+    Gets the JSON schema of a tool's arguments.
+
+    Args:
+        selected_tool: A LangChain tool (uses its args schema) or a plain function (uses its signature)
+
+    Returns:
+        dict: A JSON schema for an object with the tool's arguments as properties
+    """
+    if getattr(selected_tool, "args_schema", None) is not None:
+        schema = selected_tool.args_schema.schema()
+        properties = {
+            name: {key: value for key, value in prop.items() if key != "title"}
+            for name, prop in schema.get("properties", {}).items()
+        }
+        required = schema.get("required", [])
+    else:
+        properties = {}
+        required = []
+        for name, parameter in inspect.signature(selected_tool).parameters.items():
+            # The tools are called by the LLM with JSON, so arguments without a type hint are strings
+            properties[name] = {"type": json_types.get(parameter.annotation, "string")}
+            if parameter.default is inspect.Parameter.empty:
+                required.append(name)
+
+    for prop in properties.values():
+        # Arguments without a type (like LangChain's for untyped parameters) can be any JSON value
+        if prop.get("type") is None and "anyOf" not in prop:
+            prop["type"] = ["string", "number", "boolean", "object", "array", "null"]
+
+    return {"type": "object", "properties": properties, "required": required, "additionalProperties": False}
+
+def get_tool_call_or_response_schema(available_tools):
+    """
+    Compiles ToolCallOrResponse with the available tools into one JSON schema.
+
+    Every tool call has to be one of the tools, with that tool's arguments.
+
+    Args:
+        available_tools (dict): The tool name to tool mapping
+
+    Returns:
+        dict: The JSON schema for the whole response
+    """
+    tool_call_schemas = [
+        {
+            "type": "object",
+            "properties": {
+                "name": {"type": "string", "enum": [name]},
+                "args": get_tool_args_schema(selected_tool)
+            },
+            "required": ["name", "args"],
+            "additionalProperties": False
+        }
+        for name, selected_tool in available_tools.items()
+    ]
+
+    return {
+        "title": "ToolCallOrResponse",
+        "type": "object",
+        "properties": {
+            "tool_calls": {"type": "array", "items": {"anyOf": tool_call_schemas}},
+            "content": {"type": "string"}
+        },
+        "required": ["tool_calls", "content"],
+        "additionalProperties": False
+    }
+
+def get_constrained_kwargs(backend, schema):
+    """
+    Gets the arguments to bind to the chat model so its backend enforces the schema.
+
+    Args:
+        backend (str): "huggingface" or "ollama", any other backend isn't constrained
+        schema (dict): The JSON schema from get_tool_call_or_response_schema
+
+    Returns:
+        dict: The keyword arguments for chat_model.bind (empty if the backend isn't supported)
+    """
+    if backend == "huggingface":
+        return {"grammar": {"type": "json", "value": schema}}
+    if backend == "ollama":
+        return {"response_format": {"type": "json_schema", "json_schema": {"name": "ToolCallOrResponse", "schema": schema}}}
+    return {}
+
+def constrain_chat_model(chat_model, backend, available_tools, enabled=constrained_decoding):
+    """Binds the ToolCallOrResponse grammar for the available tools to the chat model, if enabled and supported."""
+    kwargs = get_constrained_kwargs(backend, get_tool_call_or_response_schema(available_tools)) if enabled else {}
+    return chat_model.bind(**kwargs) if kwargs else chat_model
+
+def validate_response(ai_response, available_tools):
+    """
+    Checks a parsed response against the compiled schema, without needing a JSON schema library.
+
+    Returns:
+        str: Why the response doesn't match the schema, or None if it does
+    """
+    if not isinstance(ai_response, dict) or not isinstance(ai_response.get("tool_calls"), list) or not isinstance(ai_response.get("content"), str):
+        return "the response needs a tool_calls list and a content string"
+
+    for tool_call in ai_response["tool_calls"]:
+        if not isinstance(tool_call, dict) or tool_call.get("name") not in available_tools:
+            return f"unknown tool call {tool_call}"
+
+        args_schema = get_tool_args_schema(available_tools[tool_call["name"]])
+        args = tool_call.get("args")
+        if not isinstance(args, dict):
+            return f"the args of {tool_call['name']} need to be an object"
+        missing = [name for name in args_schema["required"] if name not in args]
+        unknown = [name for name in args if name not in args_schema["properties"]]
+        if missing or unknown:
+            return f"bad args for {tool_call['name']}: missing {missing}, unknown {unknown}"
+
+    return None
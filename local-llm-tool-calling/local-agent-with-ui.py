@@ -15,9 +15,14 @@ from langchain_core.pydantic_v1 import BaseModel, Field
 from langchain_huggingface import HuggingFacePipeline, HuggingFaceEndpoint, ChatHuggingFace
 from langchain_core.messages import SystemMessage, AIMessage, HumanMessage, ToolMessage
 
+from agent_executor import AgentExecutor, AgentBudgetError, format_trace
+from constrained_decoding import constrain_chat_model, constrained_decoding
+
 load_dotenv()
 
 model = os.getenv('LLM_MODEL', 'meta-llama/Meta-Llama-3-8B-Instruct')
+stream_response = os.getenv('STREAM_RESPONSE', 'true').lower() in ["true", "yes", "1"]
+ollama_base_url = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434/v1')
 
 configuration = asana.Configuration()
 configuration.access_token = os.getenv('ASANA_ACCESS_TOKEN', '')
@@ -57,7 +62,7 @@ def create_asana_task(task_name, due_on="today"):
 
 @st.cache_resource
 def get_local_model():
-    if "gpt" in model:
+    if "gpt" in model or model.startswith("ollama/"):
         return model
     else:
         return HuggingFaceEndpoint(
@@ -113,39 +118,37 @@ Any message that starts with "Thought:" is you thinking to yourself. This isn't
 Don't repeat an action. If a thought tells you that you already took an action for a user, don't do it again.
 """       
 
-def prompt_ai(messages, nested_calls=0, invoked_tools=[]):
-    if nested_calls > 3:
-        raise Exception("Failsafe - AI is failing too much!")
+def get_chat_model(constrained=constrained_decoding):
+    """
+    Gets the chat model for LLM_MODEL, constrained to only generate valid
+    ToolCallOrResponse JSON for the available tools when the backend supports it.
+    """
+    if "gpt" in model:
+        return ChatOpenAI(model=llm)
+    elif model.startswith("ollama/"):
+        chat_model = ChatOpenAI(model=model.removeprefix("ollama/"), base_url=ollama_base_url, api_key="ollama")
+        return constrain_chat_model(chat_model, "ollama", available_tools, constrained)
+    else:
+        return constrain_chat_model(ChatHuggingFace(llm=llm), "huggingface", available_tools, constrained)
 
-    # First, prompt the AI with the latest user message
-    parser = JsonOutputParser(pydantic_object=ToolCallOrResponse)
-    asana_chatbot = ChatHuggingFace(llm=llm) | parser if "gpt" not in model else ChatOpenAI(model=llm) | parser
+def prompt_ai(messages, invoked_tools=None, on_content=None, on_step=None):
+    chat_model = get_chat_model()
+    if on_content is not None:
+        # The chat model on its own, its completion is parsed as it streams in so tool calls can start early
+        executor = AgentExecutor(chat_model, available_tools, on_content=on_content, on_step=on_step)
+    else:
+        # The LLM piped into the parser, run in a loop by the executor until it responds to the user
+        parser = JsonOutputParser(pydantic_object=ToolCallOrResponse)
+        executor = AgentExecutor(chat_model | parser, available_tools)
 
     try:
-        ai_response = asana_chatbot.invoke(messages)
-    except:
-        return prompt_ai(messages, nested_calls + 1)
-    print(ai_response)
-
-    # Second, see if the AI decided it needs to invoke a tool
-    has_tool_calls = len(ai_response["tool_calls"]) > 0
-    if has_tool_calls:
-        # Next, for each tool the AI wanted to call, call it and add the tool result to the list of messages
-        for tool_call in ai_response["tool_calls"]:
-            if str(tool_call) not in invoked_tools:
-                tool_name = tool_call["name"].lower()
-                selected_tool = available_tools[tool_name]
-                tool_output = selected_tool(**tool_call["args"])
-
-                messages.append(AIMessage(content=f"Thought: - I called {tool_name} with args {tool_call['args']} and got back: {tool_output}."))  
-                invoked_tools.append(str(tool_call))  
-            else:
-                return ai_response          
+        ai_response, trace = executor.run(messages, invoked_tools)
+    except AgentBudgetError as e:
+        ai_response, trace = {"tool_calls": [], "content": f"Sorry, I couldn't finish that request. {e}"}, e.trace
 
-        # Prompt the AI again now that the result of calling the tool(s) has been added to the chat history
-        return prompt_ai(messages, nested_calls + 1, invoked_tools)
-
-    return ai_response
+    print(ai_response)
+    print(format_trace(trace))
+    return ai_response, trace
 
 
 def main():
@@ -154,9 +157,15 @@ def main():
     # Initialize chat history
     if "messages" not in st.session_state:
         st.session_state.messages = [
-            SystemMessage(content=f"You are a personal assistant who helps manage tasks in Asana. The current date is: {datetime.now().date()}.\n{tool_text}")
+            # The static instructions and tool descriptions come first and the date last, so the start of every
+            # prompt is the same and the backend can reuse its KV cache (TGI and Ollama cache matching prefixes)
+            SystemMessage(content=f"You are a personal assistant who helps manage tasks in Asana.\n{tool_text}\nThe current date is: {datetime.now().date()}.")
         ]
 
+    # The tool calls already made are remembered per session so the LLM can't repeat an action
+    if "invoked_tools" not in st.session_state:
+        st.session_state.invoked_tools = set()
+
     # Display chat messages from history on app rerun
     for message in st.session_state.messages:
         message_json = json.loads(message.json())
@@ -175,8 +184,27 @@ def main():
 
         # Display assistant response in chat message container
         with st.chat_message("assistant"):
-            ai_response = prompt_ai(st.session_state.messages)
-            st.markdown(ai_response['content'])
+            placeholder = st.empty()
+            streamed_text = []
+
+            def show_streamed_text(text):
+                streamed_text.append(text)
+                placeholder.markdown("".join(streamed_text) + "▌")
+
+            def clear_streamed_text():
+                # Text from a step that called tools (or failed and is retried) isn't the final response
+                streamed_text.clear()
+                placeholder.empty()
+
+            ai_response, trace = prompt_ai(
+                st.session_state.messages,
+                st.session_state.invoked_tools,
+                show_streamed_text if stream_response else None,
+                clear_streamed_text if stream_response else None
+            )
+            placeholder.markdown(ai_response['content'])
+            with st.expander("Agent trace"):
+                st.text(format_trace(trace))
         
         st.session_state.messages.append(AIMessage(content=ai_response['content']))
 
@@ -0,0 +1,194 @@
+"""
+Incremental JSON parser for the agents' ToolCallOrResponse output.
+
+JsonOutputParser only runs once the whole completion has arrived, so the user
+sees nothing until the model is done and no tool can start before then. This
+parser is fed the completion chunk by chunk as it streams in and emits:
+
+1. ("content", text) for each new piece of the top level "content" string, already unescaped
+2. ("tool_call", dict) for each entry of the top level "tool_calls" array, as soon as its object closes
+
+So the response can be shown as it is written and every tool call can be run
+while the model is still generating the rest of the JSON. Anything before the
+JSON object (like "Here is the JSON response" or a ```json fence) and after it is ignored.
+
+parser = StreamingToolCallParser()
+for chunk in llm.stream(messages):
+    for event_type, value in parser.feed(chunk.content):
+        ...
+ai_response = parser.close()
+"""
+
+from langchain_core.exceptions import OutputParserException
+import json
+
+escapes = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+class StreamingToolCallParser:
+    def __init__(self):
+        self.buffer = []
+        self.position = 0
+        self.root_start = None
+        self.root_end = None
+        # One entry per open object or array: [type, key it is the value of, expecting a key next]
+        self.stack = []
+        self.key = None
+        self.in_string = False
+        self.string_is_key = False
+        self.string_chars = []
+        self.escape = False
+        self.unicode_digits = None
+        self.high_surrogate = None
+        self.streaming_content = False
+        self.tool_call_start = None
+        self.tool_calls = 0
+
+    def at_root(self):
+        return len(self.stack) == 1
+
+    def in_tool_calls(self):
+        return len(self.stack) == 2 and self.stack[1][0] == "array" and self.stack[1][1] == "tool_calls"
+
+    def feed(self, text):
+        """
+        Parses the next chunk of the completion.
+
+        Args:
+            text (str): The new text, in any size of chunk
+
+        Returns:
+            list: The (event type, value) tuples the chunk completed, "content" or "tool_call"
+        """
+        if not isinstance(text, str):
+            # Some chat models stream content as a list of parts
+            text = "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in text or [])
+
+        events = []
+        content = []
+        self.buffer.append(text)
+
+        for char in text:
+            index = self.position
+            self.position += 1
+
+            if self.root_end is not None:
+                break
+
+            if self.root_start is None:
+                if char == "{":
+                    self.root_start = index
+                    self.stack.append(["object", None, True])
+                continue
+
+            if self.in_string:
+                self.parse_string_char(char, content)
+                continue
+
+            if char == '"':
+                self.in_string = True
+                self.string_is_key = self.stack[-1][0] == "object" and self.stack[-1][2]
+                self.string_chars = []
+                # Only the value of the root's "content" key is streamed out
+                self.streaming_content = not self.string_is_key and self.at_root() and self.key == "content"
+            elif char in "{[":
+                if char == "{" and self.in_tool_calls():
+                    self.tool_call_start = index
+                parent_key = self.key if self.at_root() else None
+                self.stack.append(["object" if char == "{" else "array", parent_key, char == "{"])
+            elif char in "}]":
+                self.stack.pop()
+                if not self.stack:
+                    self.root_end = index
+                elif char == "}" and self.in_tool_calls() and self.tool_call_start is not None:
+                    events.extend(self.flush_content(content))
+                    events.append(("tool_call", self.parse_tool_call(index)))
+                    self.tool_call_start = None
+            elif char == ":":
+                self.stack[-1][2] = False
+            elif char == ",":
+                if self.stack[-1][0] == "object":
+                    self.stack[-1][2] = True
+
+        events.extend(self.flush_content(content))
+        return events
+
+    def parse_string_char(self, char, content):
+        if self.unicode_digits is not None:
+            self.unicode_digits += char
+            if len(self.unicode_digits) == 4:
+                self.add_string_char(chr(int(self.unicode_digits, 16)), content)
+                self.unicode_digits = None
+        elif self.escape:
+            self.escape = False
+            if char == "u":
+                self.unicode_digits = ""
+            else:
+                self.add_string_char(escapes.get(char, char), content)
+        elif char == "\\":
+            self.escape = True
+        elif char == '"':
+            self.in_string = False
+            self.streaming_content = False
+            if self.string_is_key and self.at_root():
+                self.key = "".join(self.string_chars)
+        else:
+            self.add_string_char(char, content)
+
+    def add_string_char(self, char, content):
+        # 😀 style surrogate pairs are only emitted once both halves have arrived
+        if 0xD800 <= ord(char) <= 0xDBFF:
+            self.high_surrogate = char
+            return
+        if self.high_surrogate is not None:
+            if 0xDC00 <= ord(char) <= 0xDFFF:
+                char = (self.high_surrogate + char).encode("utf-16", "surrogatepass").decode("utf-16")
+            self.high_surrogate = None
+
+        if self.streaming_content:
+            content.append(char)
+        elif self.string_is_key:
+            self.string_chars.append(char)
+
+    def flush_content(self, content):
+        if not content:
+            return []
+        text = "".join(content)
+        content.clear()
+        return [("content", text)]
+
+    def get_text(self, start, end):
+        text = "".join(self.buffer)
+        self.buffer = [text]
+        return text[start:end + 1]
+
+    def parse_tool_call(self, end):
+        self.tool_calls += 1
+        try:
+            return json.loads(self.get_text(self.tool_call_start, end))
+        except json.JSONDecodeError as e:
+            raise OutputParserException(f"Invalid JSON for tool call {self.tool_calls}: {e}") from e
+
+    def close(self):
+        """
+        Finishes the parse once the stream has ended.
+
+        Returns:
+            dict: The whole ToolCallOrResponse object, the same as JsonOutputParser would give
+
+        Raises:
+            OutputParserException: If the completion didn't contain one complete JSON object
+        """
+        if self.root_start is None:
+            raise OutputParserException("Invalid json output: no JSON object in the completion")
+        if self.root_end is None:
+            raise OutputParserException("Invalid json output: the completion ended before the JSON object was closed")
+
+        try:
+            ai_response = json.loads(self.get_text(self.root_start, self.root_end))
+        except json.JSONDecodeError as e:
+            raise OutputParserException(f"Invalid json output: {e}") from e
+
+        if not isinstance(ai_response, dict):
+            raise OutputParserException("Invalid json output: expected a JSON object")
+
+        return ai_response
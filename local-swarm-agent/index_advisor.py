@@ -0,0 +1,243 @@
+"""
+Query plan inspection and index advisor for the RSS feed database.
+
+The schema in ai-news-complete-tables.sql only has the indexes SQLite creates for
+primary keys and UNIQUE columns, so the joins and filters the agents write on
+columns like rss_items.rss_feed_id or rss_items.published_date scan the whole table.
+
+Before every statement runs, run_sql_select_statement asks SQLite for its plan
+(EXPLAIN QUERY PLAN). Every full table scan over a table with at least
+SQL_ADVISOR_MIN_ROWS rows is appended to SQL_SCAN_LOG together with the columns
+of that table the statement filters, joins, or sorts on.
+
+To see which indexes would remove the most logged scans, run:
+
+python index_advisor.py report
+
+To create the recommended indexes and compare the timings of a replay of the
+logged queries before and after, run:
+
+python index_advisor.py apply
+"""
+
+from collections import Counter
+import statistics
+import sqlite3
+import json
+import time
+import sys
+import re
+import os
+
+from db_connection import database_path
+
+scan_log = os.getenv('SQL_SCAN_LOG', 'sql_scans.jsonl')
+min_table_rows = int(os.getenv('SQL_ADVISOR_MIN_ROWS', '1000'))
+replay_rounds = 5
+
+# Words that can follow a table name in a FROM/JOIN clause but aren't an alias
+non_alias_words = {
+    "where", "join", "inner", "left", "right", "full", "outer", "cross", "natural", "on",
+    "using", "group", "order", "limit", "having", "union", "except", "intersect", "window"
+}
+
+comparison_pattern = r"\s*(?:=|==|!=|<>|<=|>=|<|>|\bin\b|\bbetween\b|\blike\b|\bglob\b|\bis\b)"
+
+def get_table_aliases(sql_statement):
+    """Maps every name a table is referenced by in the statement (its name or alias) to the table name."""
+    aliases = {}
+    for table, alias in re.findall(r"\b(?:from|join)\s+(\w+)(?:\s+(?:as\s+)?(\w+))?", sql_statement, re.IGNORECASE):
+        aliases[table.lower()] = table.lower()
+        if alias and alias.lower() not in non_alias_words:
+            aliases[alias.lower()] = table.lower()
+
+    return aliases
+
+def get_indexed_columns(cursor, table):
+    """Gets the columns that already lead an index on the table (including an INTEGER PRIMARY KEY)."""
+    indexed = set()
+    table_info = cursor.execute(f"PRAGMA table_info({table})").fetchall()
+    primary_keys = [row for row in table_info if row[5] > 0]
+    if len(primary_keys) == 1 and primary_keys[0][2].upper() == "INTEGER":
+        indexed.add(primary_keys[0][1].lower())
+
+    for index in cursor.execute(f"PRAGMA index_list({table})").fetchall():
+        index_columns = cursor.execute(f"PRAGMA index_info({index[1]})").fetchall()
+        if index_columns and index_columns[0][2]:
+            indexed.add(index_columns[0][2].lower())
+
+    return indexed
+
+def get_candidate_columns(cursor, sql_statement, table, names):
+    """
+    Finds the columns of a table that the statement compares, joins or sorts on.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor on the database
+        sql_statement (str): The SELECT statement
+        table (str): The scanned table
+        names (set): The names the table goes by in the statement (table name and aliases)
+
+    Returns:
+        list: The columns that would benefit from an index and don't have one yet
+    """
+    columns = {row[1].lower() for row in cursor.execute(f"PRAGMA table_info({table})").fetchall()}
+    statement = sql_statement.lower()
+    # A column qualified with this table's name or alias, or not qualified at all
+    prefix = r"(?:\b(?:" + "|".join(re.escape(name) for name in names) + r")\.|(?<![\w.]))"
+
+    candidates = []
+    for column in sorted(columns - get_indexed_columns(cursor, table)):
+        column_reference = prefix + re.escape(column) + r"\b"
+        if (re.search(column_reference + comparison_pattern, statement)
+                or re.search(r"(?:=|<|>)\s*" + column_reference, statement)
+                or re.search(r"\border\s+by\b[^;]*?" + column_reference, statement)):
+            candidates.append(column)
+
+    return candidates
+
+def get_table_rows(cursor, table):
+    # MAX(rowid) is an index lookup, good enough as a size estimate without counting every row
+    row = cursor.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()
+    return row[0] or 0
+
+def inspect_statement(cursor, sql_statement, log_path=scan_log):
+    """
+    Runs EXPLAIN QUERY PLAN on a statement and logs the full scans of large tables.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor on the database
+        sql_statement (str): The SELECT statement about to be executed
+        log_path (str): The JSONL file to append the scans to
+
+    Returns:
+        list: The logged scans, each a dict with the table, its row count and the candidate columns
+    """
+    plan = cursor.execute(f"EXPLAIN QUERY PLAN {sql_statement}").fetchall()
+    aliases = get_table_aliases(sql_statement)
+
+    scans = []
+    for _, _, _, detail in plan:
+        # Scans through an index (e.g. a covering index) are already as good as it gets
+        match = re.match(r"SCAN (?:TABLE )?(\w+)(?: AS (\w+))?$", detail)
+        if not match:
+            continue
+
+        name = (match.group(2) or match.group(1)).lower()
+        table = aliases.get(name, name)
+        rows = get_table_rows(cursor, table)
+        if rows < min_table_rows:
+            continue
+
+        names = {table} | {alias for alias, aliased_table in aliases.items() if aliased_table == table}
+        scans.append({
+            "time": time.time(),
+            "sql": sql_statement,
+            "table": table,
+            "rows": rows,
+            "columns": get_candidate_columns(cursor, sql_statement, table, names),
+            "detail": detail
+        })
+
+    if scans:
+        with open(log_path, "a") as log_file:
+            for scan in scans:
+                log_file.write(json.dumps(scan) + "\n")
+
+    return scans
+
+def read_scan_log(log_path=scan_log):
+    if not os.path.exists(log_path):
+        return []
+
+    with open(log_path, "r") as log_file:
+        return [json.loads(line) for line in log_file if line.strip()]
+
+def recommend_indexes(scans):
+    """
+    Aggregates the logged scans into index recommendations.
+
+    Returns:
+        list: (table, column, number of scans it would remove, CREATE INDEX statement), most impactful first
+    """
+    counts = Counter((scan["table"], column) for scan in scans for column in scan["columns"])
+    return [
+        (table, column, count, f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table} ({column})")
+        for (table, column), count in counts.most_common()
+    ]
+
+def print_report(log_path=scan_log):
+    scans = read_scan_log(log_path)
+    if not scans:
+        print(f"No full table scans logged in {log_path} yet.")
+        return
+
+    print(f"{len(scans)} full table scans logged over {len({scan['sql'] for scan in scans})} distinct statements\n")
+
+    print(f"{'Table':<28} | {'Scans':>5} | {'Max rows':>9}")
+    print("-" * 50)
+    for table, count in Counter(scan["table"] for scan in scans).most_common():
+        max_rows = max(scan["rows"] for scan in scans if scan["table"] == table)
+        print(f"{table:<28} | {count:>5} | {max_rows:>9}")
+
+    recommendations = recommend_indexes(scans)
+    print("\nRecommended indexes:\n")
+    if not recommendations:
+        print("None - the scans don't filter, join or sort on an unindexed column.")
+    for table, column, count, statement in recommendations:
+        print(f"{statement};  -- would help {count} logged scans")
+
+def time_replay(conn, statements):
+    """Runs every statement replay_rounds times and returns the median seconds per statement."""
+    timings = {}
+    for statement in statements:
+        durations = []
+        for _ in range(replay_rounds):
+            start = time.perf_counter()
+            conn.execute(statement).fetchall()
+            durations.append(time.perf_counter() - start)
+        timings[statement] = statistics.median(durations)
+
+    return timings
+
+def apply_recommendations(log_path=scan_log, path=database_path):
+    """Creates the recommended indexes and prints the replay timings of the logged statements before and after."""
+    scans = read_scan_log(log_path)
+    recommendations = recommend_indexes(scans)
+    if not recommendations:
+        print("No indexes to create.")
+        return
+
+    statements = list(dict.fromkeys(scan["sql"] for scan in scans))
+    conn = sqlite3.connect(path)
+    try:
+        before = time_replay(conn, statements)
+
+        for _, _, _, statement in recommendations:
+            print(f"Creating index: {statement}")
+            conn.execute(statement)
+        conn.execute("ANALYZE")
+        conn.commit()
+
+        after = time_replay(conn, statements)
+    finally:
+        conn.close()
+
+    print(f"\n{'Before (ms)':>11} | {'After (ms)':>10} | {'Speedup':>7} | Statement")
+    print("-" * 80)
+    for statement in statements:
+        speedup = before[statement] / after[statement] if after[statement] else float("inf")
+        print(f"{before[statement] * 1000:>11.3f} | {after[statement] * 1000:>10.3f} | {speedup:>6.1f}x | {' '.join(statement.split())[:80]}")
+
+    total_before, total_after = sum(before.values()), sum(after.values())
+    print(f"\nReplay total: {total_before * 1000:.3f}ms before, {total_after * 1000:.3f}ms after")
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+
+    if command == "report":
+        print_report()
+    elif command == "apply":
+        apply_recommendations()
+    else:
+        print("Usage: python index_advisor.py [report|apply]")
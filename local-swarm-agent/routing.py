@@ -0,0 +1,295 @@
+"""
+Handoff short-circuit for the swarm's router agent.
+
+Every turn that starts at (or comes back to) sql_router_agent costs a full LLM
+call just so the router can pick transfer_to_rss_feeds_agent, transfer_to_user_agent
+or transfer_to_analytics_agent. TimedSwarm intercepts those router calls:
+
+1. A local classifier scores the question against each specialist, with a
+   sentence-transformers model over the specialist descriptions if it is
+   installed (ROUTING_EMBEDDING_MODEL), otherwise with keywords. If it is at
+   least ROUTING_CONFIDENCE sure (ROUTING_KEYWORD_CONFIDENCE for keywords), the
+   transfer is answered locally.
+2. Otherwise, follow-up questions go straight back to the session's last
+   specialist, but only if the classifier found nothing ("and the week before?")
+   or leans towards that same specialist.
+3. Otherwise the router LLM decides as before.
+
+When a specialist just handed the conversation back to the router, neither
+shortcut is used: the specialist decided the question isn't its own, so sending
+it straight back could bounce between the two until the turn limit.
+
+A short-circuited transfer is put in the history exactly like the router's own
+tool call would be, so Swarm and the specialists can't tell the difference.
+TimedSwarm also times every real LLM call per agent, which gives the latency
+saved by each avoided handoff (the average router call latency).
+"""
+
+from openai.types.chat.chat_completion_chunk import ChatCompletionChunk, Choice as ChunkChoice, ChoiceDelta, ChoiceDeltaToolCall, ChoiceDeltaToolCallFunction
+from openai.types.chat.chat_completion_message_tool_call import ChatCompletionMessageToolCall, Function
+from openai.types.chat.chat_completion import ChatCompletion, Choice
+from openai.types.chat import ChatCompletionMessage
+from dotenv import load_dotenv
+from swarm import Swarm
+import threading
+import time
+import uuid
+import re
+import os
+
+from sql_agents import sql_router_agent, rss_feed_agent, user_agent, analytics_agent
+
+load_dotenv()
+confidence_threshold = float(os.getenv('ROUTING_CONFIDENCE', '0.7'))
+keyword_confidence_threshold = float(os.getenv('ROUTING_KEYWORD_CONFIDENCE', '0.58'))
+embedding_model_name = os.getenv('ROUTING_EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+
+# Every specialist starts with this share of a keyword hit, so a tie (or a near tie) is never sure
+keyword_prior = 0.25
+
+specialists = {
+    rss_feed_agent.name: {
+        "transfer": "transfer_to_rss_feeds_agent",
+        "description": "Questions about RSS feeds, news articles and items, their titles, links, authors, "
+                       "languages, publication dates and categories.",
+        "keywords": ["rss", "feed", "feeds", "article", "articles", "item", "items", "news", "publish", "published",
+                     "author", "authors", "category", "categories", "link", "links", "title", "titles", "language"]
+    },
+    user_agent.name: {
+        "transfer": "transfer_to_user_agent",
+        "description": "Questions about users, their accounts, usernames, emails, sign ups, logins, "
+                       "sessions and their category and feed preferences.",
+        "keywords": ["user", "users", "username", "usernames", "email", "emails", "signed up", "sign up", "signup",
+                     "login", "logged in", "session", "sessions", "preference", "preferences", "account", "accounts"]
+    },
+    analytics_agent.name: {
+        "transfer": "transfer_to_analytics_agent",
+        "description": "Analytics questions that need counting, totals, averages, rankings, trends and "
+                       "comparisons across the data, like the most popular or most viewed articles.",
+        "keywords": ["how many", "count", "number of", "average", "total", "most", "least", "top", "trend",
+                     "trends", "popular", "statistics", "stats", "compare", "percentage", "breakdown", "growth",
+                     "rank", "ranking", "insights", "per day", "per week", "per month"]
+    }
+}
+
+def get_keyword_scores(question):
+    text = question.lower()
+    return {
+        name: sum(1 for keyword in specialist["keywords"] if re.search(rf"\b{re.escape(keyword)}\b", text))
+        for name, specialist in specialists.items()
+    }
+
+class SpecialistClassifier:
+    """Picks the specialist agent for a question, with a confidence between 0 and 1."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.embedding_model = None
+        self.specialist_embeddings = None
+        self.use_embeddings = True
+
+    def get_embedding_scores(self, question):
+        if not self.use_embeddings:
+            return None
+
+        with self.lock:
+            if self.embedding_model is None:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                except ImportError:
+                    self.use_embeddings = False
+                    return None
+
+                self.embedding_model = SentenceTransformer(embedding_model_name)
+                self.specialist_embeddings = self.embedding_model.encode(
+                    [specialist["description"] for specialist in specialists.values()], normalize_embeddings=True
+                )
+
+        import numpy as np
+
+        similarities = self.specialist_embeddings @ self.embedding_model.encode([question], normalize_embeddings=True)[0]
+        # Softmax with a temperature so clearly closer descriptions get most of the probability
+        weights = np.exp((similarities - similarities.max()) * 20)
+        return dict(zip(specialists, (weights / weights.sum()).tolist()))
+
+    def classify(self, question):
+        """
+        Args:
+            question (str): The user's question
+
+        Returns:
+            tuple: (specialist agent name, confidence, method) or (None, 0.0, method) if nothing matched
+        """
+        scores = self.get_embedding_scores(question)
+        method = "embedding"
+        if scores is None:
+            method = "keywords"
+            hits = get_keyword_scores(question)
+            total = sum(hits.values())
+            # Additive smoothing: one hit on its own gives 0.71, two hits against one 0.6, three against two 0.57 and a tie 0.45
+            scores = {
+                name: (count + keyword_prior) / (total + keyword_prior * len(hits)) for name, count in hits.items()
+            } if total else None
+
+        if not scores:
+            return None, 0.0, method
+
+        best = max(scores, key=scores.get)
+        return best, scores[best], method
+
+def get_transfer_completion(transfer, stream):
+    """Builds the response the router LLM would give when calling a transfer function."""
+    call_id = f"call_{uuid.uuid4().hex[:24]}"
+    if stream:
+        return iter([ChatCompletionChunk(
+            id=f"chatcmpl-{uuid.uuid4().hex}",
+            object="chat.completion.chunk",
+            created=int(time.time()),
+            model="local-router",
+            choices=[ChunkChoice(
+                index=0,
+                finish_reason="tool_calls",
+                delta=ChoiceDelta(role="assistant", tool_calls=[ChoiceDeltaToolCall(
+                    index=0, id=call_id, type="function",
+                    function=ChoiceDeltaToolCallFunction(name=transfer, arguments="{}")
+                )])
+            )]
+        )])
+
+    return ChatCompletion(
+        id=f"chatcmpl-{uuid.uuid4().hex}",
+        object="chat.completion",
+        created=int(time.time()),
+        model="local-router",
+        choices=[Choice(
+            index=0,
+            finish_reason="tool_calls",
+            message=ChatCompletionMessage(role="assistant", tool_calls=[ChatCompletionMessageToolCall(
+                id=call_id, type="function", function=Function(name=transfer, arguments="{}")
+            )])
+        )]
+    )
+
+class TimedSwarm(Swarm):
+    """
+    Swarm that times every LLM call per agent and answers the router agent's
+    handoffs locally when the classifier (or the session's last specialist) is confident.
+
+    Pass the session ID in the context variables ("session_id") so the last
+    specialist is remembered per session.
+    """
+
+    def __init__(self, client=None, router_agent=sql_router_agent, threshold=confidence_threshold,
+                 keyword_threshold=keyword_confidence_threshold):
+        super().__init__(client=client)
+        self.router_agent = router_agent
+        self.threshold = threshold
+        self.keyword_threshold = keyword_threshold
+        self.classifier = SpecialistClassifier()
+        self.lock = threading.Lock()
+        self.last_specialists = {}
+        self.agent_stats = {}
+        self.stats = {"handoffs_avoided": 0, "by_classifier": 0, "by_last_specialist": 0, "router_llm_calls": 0}
+
+    def record_call(self, agent_name, latency):
+        with self.lock:
+            agent_stats = self.agent_stats.setdefault(agent_name, {"llm_calls": 0, "total_latency": 0.0})
+            agent_stats["llm_calls"] += 1
+            agent_stats["total_latency"] += latency
+
+    def timed(self, agent_name, completion, start, stream):
+        if not stream:
+            self.record_call(agent_name, time.perf_counter() - start)
+            return completion
+
+        # A streamed call takes until its last chunk
+        def timed_stream():
+            yield from completion
+            self.record_call(agent_name, time.perf_counter() - start)
+
+        return timed_stream()
+
+    def pick_specialist(self, history, context_variables):
+        """
+        Decides if the router's handoff can be answered locally.
+
+        Returns:
+            tuple: (specialist agent name, "classifier" or "last_specialist") or (None, None) to ask the router LLM
+        """
+        # A specialist handed the conversation back, so the router LLM has to decide where it goes next
+        if history and history[-1].get("tool_name") == "transfer_back_to_router_agent":
+            return None, None
+
+        session_id = context_variables.get("session_id")
+        question = context_variables.get("question") or next(
+            (message["content"] for message in reversed(history) if message["role"] == "user"), ""
+        )
+
+        specialist, confidence, method = self.classifier.classify(question)
+        threshold = self.keyword_threshold if method == "keywords" else self.threshold
+        if specialist is not None and confidence >= threshold:
+            return specialist, "classifier"
+
+        # Follow ups go back to the last specialist, unless the classifier leans towards another one
+        if session_id is None:
+            return None, None
+        with self.lock:
+            last_specialist = self.last_specialists.get(session_id)
+        if last_specialist is not None and specialist in [None, last_specialist]:
+            return last_specialist, "last_specialist"
+
+        return None, None
+
+    def forget_session(self, session_id):
+        """Drops the last specialist of a session (when it is reset or expired)."""
+        with self.lock:
+            self.last_specialists.pop(session_id, None)
+
+    def get_chat_completion(self, agent, history, context_variables, model_override, stream, debug):
+        session_id = context_variables.get("session_id")
+        # Without a session ID there is no session to remember the specialist for
+        if agent.name in specialists and session_id is not None:
+            with self.lock:
+                self.last_specialists[session_id] = agent.name
+
+        if agent.name == self.router_agent.name:
+            specialist, reason = self.pick_specialist(history, context_variables)
+            if specialist is not None:
+                with self.lock:
+                    self.stats["handoffs_avoided"] += 1
+                    self.stats[f"by_{reason}"] += 1
+                return get_transfer_completion(specialists[specialist]["transfer"], stream)
+
+            with self.lock:
+                self.stats["router_llm_calls"] += 1
+
+        start = time.perf_counter()
+        completion = super().get_chat_completion(
+            agent=agent,
+            history=history,
+            context_variables=context_variables,
+            model_override=model_override,
+            stream=stream,
+            debug=debug
+        )
+        return self.timed(agent.name, completion, start, stream)
+
+    def get_stats(self):
+        """
+        Gets the routing and latency stats.
+
+        Returns:
+            dict: Handoffs avoided (and why), router LLM calls, the estimated latency saved
+            in seconds, and the number and average latency of the LLM calls per agent
+        """
+        with self.lock:
+            stats = dict(self.stats)
+            agents = {name: dict(agent_stats) for name, agent_stats in self.agent_stats.items()}
+
+        for agent_stats in agents.values():
+            agent_stats["avg_latency"] = agent_stats["total_latency"] / agent_stats["llm_calls"]
+
+        router_latency = agents.get(self.router_agent.name, {}).get("avg_latency")
+        stats["latency_saved"] = stats["handoffs_avoided"] * router_latency if router_latency else None
+        stats["agents"] = agents
+        return stats
@@ -1,15 +1,68 @@
 from dotenv import load_dotenv
 from openai import OpenAI
-from swarm import Swarm
 import json
+import os
 
 from sql_agents import sql_router_agent
+from routing import TimedSwarm
+
+load_dotenv()
+summary_model = os.getenv('SWARM_SUMMARY_MODEL', 'qwen2.5:3b')
+history_max_messages = int(os.getenv('SWARM_HISTORY_MAX_MESSAGES', '30'))
+history_keep_messages = int(os.getenv('SWARM_HISTORY_KEEP_MESSAGES', '12'))
+# Caps the messages (LLM responses, handoffs and tool results) one user turn can add, so agents can't bounce forever
+max_turns = int(os.getenv('SWARM_MAX_TURNS', '10'))
 
 ollama_client = OpenAI(
     base_url="http://localhost:11434/v1",        
     api_key="ollama"            
 )
 
+def summarize_messages(messages, client=ollama_client):
+    """Asks the LLM for a short summary of messages that are about to be dropped from the history."""
+    transcript = []
+    for message in messages:
+        if message["role"] == "system":
+            transcript.append(message["content"])
+        elif message["role"] == "tool":
+            transcript.append(f"Result of {message.get('tool_name', 'tool')}: {str(message['content'])[:300]}")
+        elif message.get("content"):
+            transcript.append(f"{message.get('sender') or message['role']}: {message['content']}")
+
+    response = client.chat.completions.create(
+        model=summary_model,
+        messages=[{
+            "role": "user",
+            "content": "Summarize this conversation between a user and SQL data agents in a few sentences. "
+                       "Keep every fact, number and name the user might refer back to.\n\n" + "\n".join(transcript)
+        }]
+    )
+    return response.choices[0].message.content
+
+def trim_history(messages, client=ollama_client, max_messages=history_max_messages, keep_messages=history_keep_messages):
+    """
+    Caps the history that is sent to the LLM every turn.
+
+    Once there are more than max_messages messages, everything before the last
+    keep_messages is replaced by a single system message summarizing it. The cut is
+    always made at a user message so tool calls stay together with their results.
+
+    Returns:
+        tuple: (the new messages, whether the history was summarized)
+    """
+    if len(messages) <= max_messages:
+        return messages, False
+
+    cut = next(
+        (i for i in range(len(messages) - keep_messages, len(messages)) if messages[i]["role"] == "user"),
+        None
+    )
+    if not cut:
+        return messages, False
+
+    summary = summarize_messages(messages[:cut], client)
+    return [{"role": "system", "content": f"Summary of the earlier conversation: {summary}"}] + messages[cut:], True
+
 def process_and_print_streaming_response(response):
     content = ""
     last_sender = ""
@@ -66,7 +119,8 @@ def pretty_print_messages(messages) -> None:
 def run_demo_loop(
     starting_agent, context_variables=None, stream=False, debug=False
 ) -> None:
-    client = Swarm(client=ollama_client)
+    # Answers the router agent's handoffs locally when it can
+    client = TimedSwarm(client=ollama_client)
     print("Starting Ollama Swarm CLI 🐝")
 
     messages = []
@@ -76,12 +130,16 @@ def run_demo_loop(
         user_input = input("\033[90mUser\033[0m: ")
         messages.append({"role": "user", "content": user_input})
 
+        # The SQL agents use the question to only put the relevant tables in their instructions
+        turn_context_variables = {**(context_variables or {}), "question": user_input, "session_id": "cli"}
+
         response = client.run(
             agent=agent,
             messages=messages,
-            context_variables=context_variables or {},
+            context_variables=turn_context_variables,
             stream=stream,
             debug=debug,
+            max_turns=max_turns,
         )
 
         if stream:
@@ -90,6 +148,7 @@ def run_demo_loop(
             pretty_print_messages(response.messages)
 
         messages.extend(response.messages)
+        messages, _ = trim_history(messages)
         agent = response.agent
 
 if __name__ == "__main__":
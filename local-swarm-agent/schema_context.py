@@ -0,0 +1,214 @@
+"""
+Compact schema context for the SQL agents' system prompts.
+
+Instead of pasting all of ai-news-complete-tables.sql into the instructions of
+every agent on every turn, the schema is read once from sqlite_master and the
+table PRAGMAs and summarized as one line per table, e.g.:
+
+rss_items: id INTEGER pk, rss_feed_id INTEGER -> rss_feeds.id, title VARCHAR(255), ...
+
+When the user's question is known (context_variables["question"]), only the
+SQL_SCHEMA_TOP_TABLES most relevant tables are included, plus the tables they
+reference through foreign keys so joins still work. Relevance comes from a small
+embedding index over the table descriptions if sentence-transformers is installed
+(SQL_SCHEMA_EMBEDDING_MODEL), otherwise from the words the question and the
+table/column names have in common.
+
+To see the schema context and how many prompt tokens it saves for a question, run:
+
+python schema_context.py "Which users liked the most articles last week?"
+"""
+
+import threading
+import sys
+import re
+import os
+
+from db_connection import read_only_cursor
+
+schema_file = "ai-news-complete-tables.sql"
+top_tables = int(os.getenv('SQL_SCHEMA_TOP_TABLES', '4'))
+embedding_model_name = os.getenv('SQL_SCHEMA_EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+
+def estimate_tokens(text):
+    # Rough estimate (~4 characters per token) that is good enough to compare prompt sizes
+    return max(1, len(text) // 4)
+
+def get_words(text):
+    """Splits text and identifiers (rss_feed_id, createdAt) into lowercase singular words."""
+    words = set()
+    for word in re.findall(r"[a-z0-9]+", re.sub(r"([a-z])([A-Z])", r"\1 \2", text).lower().replace("_", " ")):
+        words.add(word[:-1] if len(word) > 3 and word.endswith("s") else word)
+
+    return words
+
+def get_column_comments(create_sql):
+    # Trailing "-- comment" on a column line of the CREATE TABLE, e.g. the allowed values of a column
+    comments = {}
+    for line in (create_sql or "").splitlines():
+        match = re.match(r"\s*(\w+)\s+[^-]*--\s*(.+)$", line)
+        if match:
+            comments[match.group(1).lower()] = match.group(2).strip()
+
+    return comments
+
+def read_schema(cursor):
+    """
+    Reads the tables, columns and foreign keys of the database.
+
+    Returns:
+        dict: Table name -> {"line": compact summary line, "references": referenced tables, "words": words describing the table}
+    """
+    tables = {}
+    rows = cursor.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    ).fetchall()
+
+    for table, create_sql in rows:
+        foreign_keys = {
+            row[3].lower(): f"{row[2]}.{row[4] or 'id'}"
+            for row in cursor.execute(f"PRAGMA foreign_key_list({table})").fetchall()
+        }
+        comments = get_column_comments(create_sql)
+
+        columns = []
+        for _, name, column_type, not_null, _, primary_key in cursor.execute(f"PRAGMA table_info({table})").fetchall():
+            column = f"{name} {column_type}".strip()
+            if primary_key:
+                column += " pk"
+            if name.lower() in foreign_keys:
+                column += f" -> {foreign_keys[name.lower()]}"
+            if name.lower() in comments:
+                column += f" ({comments[name.lower()]})"
+            columns.append(column)
+
+        tables[table] = {
+            "line": f"{table}: {', '.join(columns)}",
+            "references": {reference.split(".")[0] for reference in foreign_keys.values()},
+            "words": get_words(table + " " + " ".join(column.split()[0] for column in columns))
+        }
+
+    return tables
+
+class SchemaContext:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tables = None
+        self.embedding_model = None
+        self.table_embeddings = None
+        self.use_embeddings = True
+
+    def get_tables(self):
+        # The schema doesn't change while the agents run, so it is only read once
+        with self.lock:
+            if self.tables is None:
+                with read_only_cursor() as cursor:
+                    self.tables = read_schema(cursor)
+
+        return self.tables
+
+    def get_embedding_scores(self, question):
+        """Cosine similarity of the question to each table description, or None if sentence-transformers isn't available."""
+        if not self.use_embeddings:
+            return None
+
+        tables = self.get_tables()
+        with self.lock:
+            if self.embedding_model is None:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                except ImportError:
+                    self.use_embeddings = False
+                    return None
+
+                self.embedding_model = SentenceTransformer(embedding_model_name)
+                self.table_embeddings = self.embedding_model.encode(
+                    [" ".join(sorted(tables[table]["words"])) + " | " + tables[table]["line"] for table in tables],
+                    normalize_embeddings=True
+                )
+
+        question_embedding = self.embedding_model.encode([question], normalize_embeddings=True)[0]
+        return dict(zip(tables, (self.table_embeddings @ question_embedding).tolist()))
+
+    def get_lexical_scores(self, question):
+        question_words = get_words(question)
+        return {
+            table: len(question_words & info["words"]) / len(info["words"])
+            for table, info in self.get_tables().items()
+        }
+
+    def select_tables(self, question, limit=top_tables):
+        """
+        Picks the tables most relevant to a question, plus the tables they reference.
+
+        Args:
+            question (str): The user's question
+            limit (int): How many tables to pick before adding the referenced ones
+
+        Returns:
+            list: The selected table names in schema order
+        """
+        tables = self.get_tables()
+        scores = self.get_embedding_scores(question) or self.get_lexical_scores(question)
+
+        ranked = sorted(tables, key=lambda table: scores[table], reverse=True)
+        selected = {table for table in ranked[:limit] if scores[table] > 0}
+        if not selected:
+            # Nothing in the question matches the schema, give the agent everything
+            return list(tables)
+
+        for table in list(selected):
+            selected |= tables[table]["references"]
+
+        return [table for table in tables if table in selected]
+
+    def get_context(self, question=None):
+        """
+        Builds the schema summary to put in an agent's instructions.
+
+        Args:
+            question (str, optional): The user's question, used to only include the relevant tables
+
+        Returns:
+            str: One line per table with its columns, primary keys and foreign keys
+        """
+        tables = self.get_tables()
+        selected = self.select_tables(question) if question else list(tables)
+
+        summary = "\n".join(tables[table]["line"] for table in selected)
+        if len(selected) < len(tables):
+            others = ", ".join(table for table in tables if table not in selected)
+            summary += f"\n(Other tables in the DB: {others})"
+
+        return summary
+
+schema_context = SchemaContext()
+
+def get_schema_context(question=None):
+    """Gets the compact schema summary, limited to the tables relevant to the question if one is given."""
+    return schema_context.get_context(question)
+
+def get_token_report(question=None):
+    """
+    Compares the prompt size of the compact schema context with the full DDL.
+
+    Returns:
+        dict: Estimated tokens of the full DDL and the compact context, and the reduction (0-1)
+    """
+    with open(schema_file, "r") as table_schema_file:
+        full_tokens = estimate_tokens(table_schema_file.read())
+
+    compact_tokens = estimate_tokens(get_schema_context(question))
+    return {
+        "full_ddl_tokens": full_tokens,
+        "compact_tokens": compact_tokens,
+        "reduction": 1 - compact_tokens / full_tokens
+    }
+
+if __name__ == "__main__":
+    question = " ".join(sys.argv[1:]) or None
+
+    print(get_schema_context(question))
+    report = get_token_report(question)
+    print(f"\nFull DDL: ~{report['full_ddl_tokens']} tokens, schema context: ~{report['compact_tokens']} tokens "
+          f"({report['reduction']:.0%} smaller per agent turn)")
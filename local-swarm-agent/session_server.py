@@ -0,0 +1,301 @@
+"""
+Asyncio session server for the SQL agent swarm.
+
+Instead of the single blocking input() loop in run.py, this serves any number of
+concurrent chat sessions over a local TCP socket. Each session keeps its own
+history and current agent (starting at sql_router_agent), and turns of different
+sessions run in parallel in a thread pool (the SQL agents query through per-thread
+read-only connections). The history of a session is capped with the same
+summarization window as run.py, so it doesn't grow without bound, and sessions
+idle for SWARM_SESSION_IDLE_SECONDS are dropped (as are the least recently used
+ones past SWARM_MAX_SESSIONS), so neither does the number of sessions.
+
+The protocol is newline-delimited JSON. A client sends one object per line:
+
+{"session_id": "abc", "message": "How many RSS feeds are there?"}
+{"session_id": "abc", "message": "...", "stream": false}
+{"type": "stats"}                     (stats for every session, the expired sessions and the handoffs routing.py avoided)
+{"type": "stats", "session_id": "abc"}
+{"type": "reset", "session_id": "abc"}
+
+And the server answers a message with one object per line, streamed by default:
+
+{"type": "delta", "sender": "RSS Feed Agent", "content": "There are"}
+{"type": "tool_call", "sender": "RSS Feed Agent", "name": "run_sql_select_statement"}
+{"type": "done", "agent": "RSS Feed Agent", "latency": 2.31, "first_token_latency": 1.42}
+
+Start the server with:
+
+python session_server.py
+
+And chat with it (any number of times in parallel) with:
+
+python session_server.py client [session id]
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+import statistics
+import asyncio
+import json
+import time
+import uuid
+import sys
+import os
+
+from run import ollama_client, trim_history, max_turns
+from routing import TimedSwarm
+from sql_agents import sql_router_agent
+
+server_host = os.getenv('SWARM_SERVER_HOST', '127.0.0.1')
+server_port = int(os.getenv('SWARM_SERVER_PORT', '8765'))
+server_workers = int(os.getenv('SWARM_SERVER_WORKERS', '8'))
+session_idle_seconds = float(os.getenv('SWARM_SESSION_IDLE_SECONDS', '3600'))
+max_sessions = int(os.getenv('SWARM_MAX_SESSIONS', '1000'))
+
+class Session:
+    def __init__(self, session_id, starting_agent):
+        self.id = session_id
+        self.agent = starting_agent
+        self.messages = []
+        # Turns of one session run one at a time, different sessions run in parallel
+        self.lock = asyncio.Lock()
+        self.latencies = []
+        self.first_token_latencies = []
+        self.stats = {"turns": 0, "errors": 0, "summaries": 0, "created_at": time.time(), "last_active": time.time()}
+
+    def get_stats(self):
+        """
+        Gets the memory and latency stats of the session.
+
+        Returns:
+            dict: Turns, history size (messages and bytes), summaries made, current agent and turn latencies in seconds
+        """
+        latencies = sorted(self.latencies)
+        return {
+            **self.stats,
+            "agent": self.agent.name,
+            "history_messages": len(self.messages),
+            "history_bytes": len(json.dumps(self.messages, default=str).encode()),
+            "avg_latency": statistics.mean(latencies) if latencies else None,
+            "p50_latency": latencies[len(latencies) // 2] if latencies else None,
+            "p95_latency": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None,
+            "avg_first_token_latency": statistics.mean(self.first_token_latencies) if self.first_token_latencies else None
+        }
+
+class SessionServer:
+    def __init__(self, starting_agent=sql_router_agent, client=ollama_client):
+        self.starting_agent = starting_agent
+        self.client = client
+        # Answers the router agent's handoffs locally when it can and times every LLM call
+        self.swarm = TimedSwarm(client=client)
+        self.executor = ThreadPoolExecutor(max_workers=server_workers)
+        # Least recently used first
+        self.sessions = OrderedDict()
+        self.stats = {"expired_sessions": 0, "evicted_sessions": 0}
+
+    def remove_session(self, session_id):
+        self.sessions.pop(session_id, None)
+        self.swarm.forget_session(session_id)
+
+    def expire_sessions(self):
+        """Drops the sessions idle for longer than SWARM_SESSION_IDLE_SECONDS, then the least recently used past SWARM_MAX_SESSIONS."""
+        now = time.time()
+        # Sessions in the middle of a turn are never dropped
+        idle = [session for session in self.sessions.values() if not session.lock.locked()]
+
+        for session in idle:
+            if now - session.stats["last_active"] > session_idle_seconds:
+                self.remove_session(session.id)
+                self.stats["expired_sessions"] += 1
+
+        for session in idle:
+            if len(self.sessions) <= max_sessions:
+                break
+            if session.id in self.sessions:
+                self.remove_session(session.id)
+                self.stats["evicted_sessions"] += 1
+
+    def get_session(self, session_id):
+        if session_id not in self.sessions:
+            self.expire_sessions()
+            self.sessions[session_id] = Session(session_id, self.starting_agent)
+
+        self.sessions.move_to_end(session_id)
+        session = self.sessions[session_id]
+        session.stats["last_active"] = time.time()
+        return session
+
+    async def run_turn(self, session, user_input, send, stream=True):
+        """
+        Runs one user turn of a session and sends the response to the client.
+
+        Swarm is synchronous, so it runs in the thread pool and its stream is
+        handed back to the event loop chunk by chunk through a queue.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        messages = session.messages + [{"role": "user", "content": user_input}]
+
+        def run_swarm():
+            try:
+                for chunk in self.swarm.run(
+                    agent=session.agent,
+                    messages=messages,
+                    context_variables={"question": user_input, "session_id": session.id},
+                    stream=True,
+                    max_turns=max_turns
+                ):
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, {"error": str(e)})
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+
+        start = time.perf_counter()
+        first_token_latency = None
+        response = None
+        sender = session.agent.name
+        content = []
+        worker = loop.run_in_executor(self.executor, run_swarm)
+
+        while (chunk := await queue.get()) is not None:
+            if "error" in chunk:
+                session.stats["errors"] += 1
+                await send({"type": "error", "error": chunk["error"]})
+            elif "response" in chunk:
+                response = chunk["response"]
+            else:
+                sender = chunk.get("sender") or sender
+                if chunk.get("content"):
+                    if first_token_latency is None:
+                        first_token_latency = time.perf_counter() - start
+                    content.append(chunk["content"])
+                    if stream:
+                        await send({"type": "delta", "sender": sender, "content": chunk["content"]})
+
+                for tool_call in chunk.get("tool_calls") or []:
+                    if tool_call["function"]["name"]:
+                        await send({"type": "tool_call", "sender": sender, "name": tool_call["function"]["name"]})
+
+        await worker
+        latency = time.perf_counter() - start
+
+        if response is not None:
+            session.agent = response.agent
+            session.messages, summarized = await loop.run_in_executor(
+                self.executor, trim_history, messages + response.messages, self.client
+            )
+            session.stats["summaries"] += int(summarized)
+
+        session.stats["turns"] += 1
+        session.stats["last_active"] = time.time()
+        session.latencies.append(latency)
+        if first_token_latency is not None:
+            session.first_token_latencies.append(first_token_latency)
+
+        if not stream:
+            await send({"type": "message", "sender": sender, "content": "".join(content)})
+
+        await send({
+            "type": "done",
+            "agent": session.agent.name,
+            "latency": latency,
+            "first_token_latency": first_token_latency
+        })
+
+    async def handle_request(self, request, send):
+        request_type = request.get("type", "message")
+        session_id = request.get("session_id")
+
+        if request_type == "stats":
+            if session_id:
+                stats = {session_id: self.sessions[session_id].get_stats()} if session_id in self.sessions else {}
+            else:
+                stats = {session.id: session.get_stats() for session in self.sessions.values()}
+            await send({"type": "stats", "sessions": stats, "server": dict(self.stats, sessions=len(self.sessions)), "routing": self.swarm.get_stats()})
+        elif request_type == "reset":
+            self.remove_session(session_id)
+            await send({"type": "done", "session_id": session_id})
+        elif request_type == "message" and session_id and request.get("message"):
+            session = self.get_session(session_id)
+            async with session.lock:
+                await self.run_turn(session, request["message"], send, request.get("stream", True))
+        else:
+            await send({"type": "error", "error": f"Invalid request: {request}"})
+
+    async def handle_connection(self, reader, writer):
+        write_lock = asyncio.Lock()
+
+        async def send(event):
+            async with write_lock:
+                writer.write((json.dumps(event, default=str) + "\n").encode())
+                await writer.drain()
+
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError:
+                    await send({"type": "error", "error": "Requests must be one JSON object per line"})
+                    continue
+
+                await self.handle_request(request, send)
+        except ConnectionResetError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=server_host, port=server_port):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Swarm session server listening on {host}:{port} 🐝")
+        async with server:
+            await server.serve_forever()
+
+async def run_client(session_id, host=server_host, port=server_port):
+    """Interactive chat with the server, printing the streamed response as it arrives."""
+    reader, writer = await asyncio.open_connection(host, port)
+    loop = asyncio.get_running_loop()
+    print(f"Connected to {host}:{port} as session {session_id}")
+
+    while True:
+        user_input = await loop.run_in_executor(None, input, "\033[90mUser\033[0m: ")
+        writer.write((json.dumps({"session_id": session_id, "message": user_input}) + "\n").encode())
+        await writer.drain()
+
+        last_sender = None
+        while line := await reader.readline():
+            event = json.loads(line)
+            if event["type"] == "delta":
+                if event["sender"] != last_sender:
+                    print(f"\033[94m{event['sender']}:\033[0m", end=" ", flush=True)
+                    last_sender = event["sender"]
+                print(event["content"], end="", flush=True)
+            elif event["type"] == "tool_call":
+                print(f"\033[94m{event['sender']}: \033[95m{event['name']}\033[0m()")
+                last_sender = None
+            elif event["type"] == "error":
+                print(f"\nError: {event['error']}")
+            elif event["type"] == "done":
+                print(f"\n\033[90m({event['latency']:.2f}s)\033[0m")
+                break
+
+async def print_stats(host=server_host, port=server_port):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b'{"type": "stats"}\n')
+    await writer.drain()
+    stats = json.loads(await reader.readline())
+    print(json.dumps({"sessions": stats["sessions"], "server": stats["server"], "routing": stats["routing"]}, indent=2))
+    writer.close()
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "serve"
+
+    if command == "serve":
+        asyncio.run(SessionServer().serve())
+    elif command == "client":
+        asyncio.run(run_client(sys.argv[2] if len(sys.argv) > 2 else str(uuid.uuid4())))
+    elif command == "stats":
+        asyncio.run(print_stats())
+    else:
+        print("Usage: python session_server.py [serve|client [session id]|stats]")
@@ -0,0 +1,181 @@
+"""
+Deterministic synthetic dataset for the RSS feed schema, from a few thousand to
+tens of millions of rows.
+
+Every table of ai-news-complete-tables.sql is filled from its own seeded random
+generator, so the same scale and seed always produce exactly the same database
+(and the same benchmark results). Rows are streamed into SQLite with
+load_sql_data.bulk_insert, so memory use stays flat no matter the scale.
+
+The scale is the number of RSS items, the other tables are sized relative to it:
+
+feeds: items / 2000 (at least 5)       users: items / 20 (at least 10)
+item categories: 1-3 per item          interactions: 3 per item
+user preferences: 1-5 per user         feed views: 5 per user, sessions: 1 per user
+
+To generate a database with 1 million RSS items (about 8 million rows in total), run:
+
+python synthetic_data.py 1000000 synthetic-rss-feed-database.db
+
+Then point the agents (and benchmark.py) at it with:
+
+SQL_DATABASE_PATH=synthetic-rss-feed-database.db
+"""
+
+from datetime import datetime, timedelta
+import sqlite3
+import random
+import time
+import sys
+import os
+
+from load_sql_data import set_bulk_load_pragmas, execute_sql_script, bulk_insert
+
+default_seed = 42
+start_date = datetime(2022, 1, 1)
+date_range_seconds = 2 * 365 * 24 * 3600
+
+topics = [
+    "reinforcement learning", "large language models", "computer vision", "AI regulation",
+    "robotics", "protein folding", "autonomous vehicles", "speech recognition", "AI chips",
+    "recommendation systems", "generative art", "AI safety", "edge AI", "medical imaging"
+]
+verbs = ["advances", "transforms", "challenges", "reshapes", "accelerates", "questions"]
+categories = [
+    ("Machine Learning", "News related to machine learning algorithms and techniques"),
+    ("Natural Language Processing", "Updates on NLP research and applications"),
+    ("Computer Vision", "Advancements in image and video processing using AI"),
+    ("Ethics in AI", "Discussions on ethical considerations in AI development and deployment"),
+    ("Robotics", "News about AI in robotics and automation"),
+    ("AI in Healthcare", "Applications of AI in medicine and healthcare"),
+    ("Deep Learning", "Focused on deep neural networks and related technologies"),
+    ("AI Policy", "Laws, regulation and government policy around AI"),
+    ("AI Hardware", "Chips, accelerators and infrastructure for AI"),
+    ("Generative AI", "Models that generate text, images, audio and video"),
+    ("Reinforcement Learning", "Agents that learn from rewards"),
+    ("AI Startups", "Funding, launches and acquisitions of AI companies")
+]
+languages = ["en"] * 7 + ["fr", "de", "es"]
+interaction_types = ["view"] * 6 + ["like"] * 3 + ["share"]
+
+def get_table_sizes(scale):
+    """Gets the number of feeds, users and RSS items for a scale (the number of RSS items)."""
+    return {
+        "feeds": max(5, scale // 2000),
+        "users": max(10, scale // 20),
+        "items": scale
+    }
+
+def format_time(rng, start=start_date, seconds=date_range_seconds):
+    return (start + timedelta(seconds=rng.randrange(seconds))).strftime("%Y-%m-%d %H:%M:%S")
+
+def generate_feeds(seed, sizes):
+    rng = random.Random(f"{seed}-feeds")
+    for i in range(1, sizes["feeds"] + 1):
+        topic = rng.choice(topics)
+        yield (f"{topic.title()} Feed {i}", f"https://feed{i}.example.com/rss",
+               f"News about {topic}", f"https://feed{i}.example.com", rng.choice(languages))
+
+def generate_items(seed, sizes):
+    rng = random.Random(f"{seed}-items")
+    for i in range(1, sizes["items"] + 1):
+        feed_id = rng.randint(1, sizes["feeds"])
+        topic, verb = rng.choice(topics), rng.choice(verbs)
+        yield (feed_id, f"How {topic} {verb} the industry ({i})", f"https://feed{feed_id}.example.com/articles/{i}",
+               f"A look at how {topic} {verb} the industry", f"Full article content about {topic}...",
+               format_time(rng), f"Author {rng.randint(1, 5000)}")
+
+def generate_item_categories(seed, sizes):
+    rng = random.Random(f"{seed}-item-categories")
+    for item_id in range(1, sizes["items"] + 1):
+        for category_id in rng.sample(range(1, len(categories) + 1), rng.randint(1, 3)):
+            yield (item_id, category_id)
+
+def generate_users(seed, sizes):
+    rng = random.Random(f"{seed}-users")
+    for i in range(1, sizes["users"] + 1):
+        created_at = format_time(rng)
+        yield (f"user{i}", f"user{i}@example.com", f"{rng.getrandbits(128):032x}", created_at,
+               format_time(rng, datetime.strptime(created_at, "%Y-%m-%d %H:%M:%S"), 30 * 24 * 3600))
+
+def generate_user_category_preferences(seed, sizes):
+    rng = random.Random(f"{seed}-user-category-preferences")
+    for user_id in range(1, sizes["users"] + 1):
+        for category_id in rng.sample(range(1, len(categories) + 1), rng.randint(1, 5)):
+            yield (user_id, category_id)
+
+def generate_user_feed_preferences(seed, sizes):
+    rng = random.Random(f"{seed}-user-feed-preferences")
+    for user_id in range(1, sizes["users"] + 1):
+        for feed_id in rng.sample(range(1, sizes["feeds"] + 1), min(sizes["feeds"], rng.randint(1, 5))):
+            yield (user_id, feed_id)
+
+def generate_interactions(seed, sizes):
+    rng = random.Random(f"{seed}-interactions")
+    for _ in range(sizes["items"] * 3):
+        yield (rng.randint(1, sizes["users"]), rng.randint(1, sizes["items"]), rng.choice(interaction_types), format_time(rng))
+
+def generate_feed_views(seed, sizes):
+    rng = random.Random(f"{seed}-feed-views")
+    for _ in range(sizes["users"] * 5):
+        yield (rng.randint(1, sizes["users"]), rng.randint(1, sizes["feeds"]), format_time(rng))
+
+def generate_sessions(seed, sizes):
+    rng = random.Random(f"{seed}-sessions")
+    for user_id in range(1, sizes["users"] + 1):
+        created_at = format_time(rng)
+        expires_at = (datetime.strptime(created_at, "%Y-%m-%d %H:%M:%S") + timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")
+        yield (user_id, f"{user_id:x}-{rng.getrandbits(96):024x}", created_at, expires_at)
+
+# Table, columns and generator, in an order that respects the foreign keys
+tables = [
+    ("rss_feeds", ["name", "url", "description", "site_link", "language"], generate_feeds),
+    ("categories", ["name", "description"], lambda seed, sizes: iter(categories)),
+    ("rss_items", ["rss_feed_id", "title", "link", "description", "content", "published_date", "author"], generate_items),
+    ("rss_item_categories", ["rss_item_id", "category_id"], generate_item_categories),
+    ("users", ["username", "email", "password_hash", "created_at", "last_login"], generate_users),
+    ("user_category_preferences", ["user_id", "category_id"], generate_user_category_preferences),
+    ("user_feed_preferences", ["user_id", "rss_feed_id"], generate_user_feed_preferences),
+    ("article_interactions", ["user_id", "rss_item_id", "interaction_type", "interaction_time"], generate_interactions),
+    ("feed_views", ["user_id", "rss_feed_id", "viewed_at"], generate_feed_views),
+    ("user_sessions", ["user_id", "session_token", "created_at", "expires_at"], generate_sessions)
+]
+
+def generate_database(path, scale, seed=default_seed):
+    """
+    Creates a new database with the RSS feed schema filled with synthetic data.
+
+    Args:
+        path (str): The database file to create (it must not exist yet)
+        scale (int): The number of RSS items, the other tables are sized relative to it
+        seed (int): The seed for the random generators, the same seed gives the same data
+
+    Returns:
+        dict: The number of rows inserted per table
+    """
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} already exists, remove it first so the data stays deterministic")
+
+    sizes = get_table_sizes(scale)
+    conn = sqlite3.connect(path)
+    set_bulk_load_pragmas(conn)
+    execute_sql_script(conn, 'ai-news-complete-tables.sql')
+
+    start = time.perf_counter()
+    counts = {}
+    for table, columns, generator in tables:
+        counts[table] = bulk_insert(conn, table, columns, generator(seed, sizes))
+
+    conn.execute("ANALYZE")
+    conn.close()
+
+    total = sum(counts.values())
+    elapsed = time.perf_counter() - start
+    print(f"\nGenerated {total:,} rows in {elapsed:.2f}s ({total / elapsed:,.0f} rows/s) into {path}")
+    return counts
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python synthetic_data.py [number of RSS items] [database path] [seed]")
+    else:
+        generate_database(sys.argv[2], int(sys.argv[1]), int(sys.argv[3]) if len(sys.argv) > 3 else default_seed)
@@ -7,6 +7,7 @@ import os
 
 from langchain_core.messages import SystemMessage, AIMessage, HumanMessage   
 
+from circuit_breaker import get_breaker_states
 from runnable import get_runnable
 
 @st.cache_resource
@@ -47,6 +48,12 @@ async def prompt_ai(messages):
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
+def display_breaker_states():
+    # Shows which n8n workflows are failing fast because their circuit breaker is open
+    for url, state in get_breaker_states().items():
+        if state["state"] != "closed":
+            st.sidebar.warning(f"n8n workflow degraded ({state['state']}): {url}\n\n{state['last_error']}")
+
 async def main():
     st.title("n8n LangChain Agent")
 
@@ -91,6 +98,8 @@ async def main():
         
         st.session_state.messages.append(AIMessage(content=response_content))
 
+    display_breaker_states()
+
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
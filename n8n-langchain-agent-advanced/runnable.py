@@ -5,6 +5,8 @@ from langgraph.graph import END, StateGraph
 from typing_extensions import TypedDict
 from typing import Annotated, Literal, Dict
 from dotenv import load_dotenv
+import asyncio
+import json
 import os
 
 from langchain_openai import ChatOpenAI
@@ -53,9 +55,10 @@ async def call_model(state: GraphState, config: RunnableConfig) -> Dict[str, Any
     # We return an object because this will get added to the existing list
     return {"messages": response}
 
-def tool_node(state: GraphState) -> Dict[str, AnyMessage]:
+async def tool_node(state: GraphState) -> Dict[str, AnyMessage]:
     """
-    Function that handles all tool calls.
+    Function that handles all tool calls. The n8n webhooks are awaited
+    concurrently so the event loop isn't blocked while the workflows run.
 
     Args:
         state (GraphState): The current graph state
@@ -71,14 +74,17 @@ def tool_node(state: GraphState) -> Dict[str, AnyMessage]:
 
     if last_message and last_message.tool_calls:
         for call in last_message.tool_calls:
-            tool = available_functions.get(call['name'], None)
-
-            if tool is None:
+            if available_functions.get(call['name'], None) is None:
                 raise Exception(f"Tool '{call['name']}' not found.")
 
             print(f"\n\nInvoking tool: {call['name']} with args {call['args']}")
-            output = tool.invoke(call['args'])
-            print(f"Result of invoking tool: {output}\n\n")
+
+        results = await asyncio.gather(*[
+            available_functions[call['name']].ainvoke(call['args']) for call in last_message.tool_calls
+        ])
+
+        for call, output in zip(last_message.tool_calls, results):
+            print(f"Result of invoking tool {call['name']}: {output}\n\n")
 
             outputs.append(ToolMessage(
                 output if isinstance(output, str) else json.dumps(output), 
@@ -8,6 +8,7 @@ import asyncio
 import json
 import os
 
+from circuit_breaker import get_breaker_states
 from tools import available_functions
 
 load_dotenv()
@@ -83,6 +84,12 @@ def prompt_ai(messages):
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
+def display_breaker_states():
+    # Shows which n8n workflows are failing fast because their circuit breaker is open
+    for url, state in get_breaker_states().items():
+        if state["state"] != "closed":
+            st.sidebar.warning(f"n8n workflow degraded ({state['state']}): {url}\n\n{state['last_error']}")
+
 async def main():
     st.title("n8n LangChain Agent")
 
@@ -114,6 +121,8 @@ async def main():
         
             st.session_state.messages.append(AIMessage(content=response))
 
+    display_breaker_states()
+
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -1,10 +1,15 @@
 from dotenv import load_dotenv
-import requests
+import asyncio
+import weakref
+import httpx
 import json
+import time
 import os
 
 from langchain_core.tools import tool
 
+from circuit_breaker import get_breaker, record_outcome, CircuitOpenError
+
 load_dotenv()
 
 N8N_BEARER_TOKEN = os.environ["N8N_BEARER_TOKEN"]
@@ -12,12 +17,58 @@ SUMMARIZE_SLACK_CONVERSATION_WEBHOOK = os.environ["SUMMARIZE_SLACK_CONVERSATION_
 SEND_SLACK_MESSAGE_WEBHOOK = os.environ["SEND_SLACK_MESSAGE_WEBHOOK"]
 UPLOAD_GOOGLE_DOC_WEBHOOK = os.environ["UPLOAD_GOOGLE_DOC_WEBHOOK"]
 
+N8N_CONNECT_TIMEOUT = float(os.getenv("N8N_CONNECT_TIMEOUT", "5"))
+N8N_READ_TIMEOUT = float(os.getenv("N8N_READ_TIMEOUT", "120"))
+N8N_GET_RETRIES = int(os.getenv("N8N_GET_RETRIES", "2"))
+
+webhook_timeout = httpx.Timeout(N8N_READ_TIMEOUT, connect=N8N_CONNECT_TIMEOUT)
+webhook_limits = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60)
+
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # ~~~~~~~~~~~~ Helper Function for Invoking n8n Webhooks ~~~~~~~~~~~~~~~
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
+# Keep-alive connection pool shared by every webhook call so each tool call
+# doesn't have to open a new TCP/TLS connection to n8n
+sync_client = httpx.Client(timeout=webhook_timeout, limits=webhook_limits)
+
+# Async connections are tied to the event loop that opened them, so there is one pool per loop
+async_clients = weakref.WeakKeyDictionary()
+
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    client = async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(timeout=webhook_timeout, limits=webhook_limits)
+        async_clients[loop] = client
+
+    return client
+
+def get_webhook_headers():
+    return {
+        "Authorization": f"Bearer {N8N_BEARER_TOKEN}",
+        "Content-Type": "application/json"
+    }
+
+def serialize_response(response):
+    # Compact JSON keeps the tool output (and so the prompt) as small as possible
+    try:
+        return json.dumps(response.json(), separators=(",", ":"), ensure_ascii=False)
+    except ValueError:
+        return response.text
+
+def is_retryable(method, error, attempt):
+    # Only GETs are retried - retrying a POST could run the workflow (send the Slack message etc.) twice
+    if method != "GET" or attempt >= N8N_GET_RETRIES:
+        return False
+
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+
+    return isinstance(error, httpx.TransportError)
+
 def invoke_n8n_webhook(method, url, function_name, payload=None):
     """
     Helper function to make a GET or POST request.
@@ -31,23 +82,78 @@ def invoke_n8n_webhook(method, url, function_name, payload=None):
     Returns:
         str: The API response in JSON format or an error message
     """
-    headers = {
-        "Authorization": f"Bearer {N8N_BEARER_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    
-    try:
-        if method == "GET":
-            response = requests.get(url, headers=headers)
-        elif method == "POST":
-            response = requests.post(url, headers=headers, json=payload)
-        else:
-            return f"Unsupported method: {method}"
-
-        response.raise_for_status()
-        return json.dumps(response.json(), indent=2)
-    except Exception as e:
-        return f"Exception when calling {function_name}: {e}" 
+    if method not in ["GET", "POST"]:
+        return f"Unsupported method: {method}"
+
+    breaker = get_breaker(url)
+    attempt = 0
+    while True:
+        try:
+            # Fails fast without calling n8n if this workflow's circuit breaker is open
+            breaker.before_call()
+        except CircuitOpenError as e:
+            return f"Exception when calling {function_name}: {e}"
+
+        try:
+            response = sync_client.request(method, url, headers=get_webhook_headers(), json=payload if method == "POST" else None)
+            response.raise_for_status()
+            record_outcome(breaker)
+            return serialize_response(response)
+        except Exception as e:
+            record_outcome(breaker, e)
+            if not is_retryable(method, e, attempt):
+                return f"Exception when calling {function_name}: {e}"
+
+            time.sleep(0.5 * 2 ** attempt)
+            attempt += 1
+        except BaseException:
+            # Cancelled (e.g. the user stopped the agent), so there is no outcome to record
+            # but a half open breaker has to let the next probe through
+            breaker.release_probe()
+            raise
+
+async def ainvoke_n8n_webhook(method, url, function_name, payload=None):
+    """
+    Async version of invoke_n8n_webhook that doesn't block the event loop while n8n runs the workflow.
+
+    Args:
+        method (str): HTTP method ('GET' or 'POST')
+        url (str): The API endpoint
+        function_name (str): The name of the tool the AI agent invoked
+        payload (dict, optional): The payload for POST requests
+
+    Returns:
+        str: The API response in JSON format or an error message
+    """
+    if method not in ["GET", "POST"]:
+        return f"Unsupported method: {method}"
+
+    breaker = get_breaker(url)
+    attempt = 0
+    while True:
+        try:
+            # Fails fast without calling n8n if this workflow's circuit breaker is open
+            breaker.before_call()
+        except CircuitOpenError as e:
+            return f"Exception when calling {function_name}: {e}"
+
+        try:
+            response = await get_async_client().request(method, url, headers=get_webhook_headers(), json=payload if method == "POST" else None)
+            response.raise_for_status()
+            record_outcome(breaker)
+            return serialize_response(response)
+        except Exception as e:
+            record_outcome(breaker, e)
+            if not is_retryable(method, e, attempt):
+                return f"Exception when calling {function_name}: {e}"
+
+            await asyncio.sleep(0.5 * 2 ** attempt)
+            attempt += 1
+        except BaseException:
+            # Cancelled (e.g. the user stopped the agent), so there is no outcome to record
+            # but a half open breaker has to let the next probe through
+            breaker.release_probe()
+            raise
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -115,6 +221,25 @@ def create_google_doc(document_title, document_text):
         {"document_title": document_title, "document_text": document_text}
     )  
 
+# Async versions of the tools so the LangGraph agent can await them with ainvoke
+async def asummarize_slack_conversation():
+    return await ainvoke_n8n_webhook("GET", SUMMARIZE_SLACK_CONVERSATION_WEBHOOK, "summarize_slack_conversation")
+
+async def asend_slack_message(message):
+    return await ainvoke_n8n_webhook("POST", SEND_SLACK_MESSAGE_WEBHOOK, "send_slack_message", {"message": message})
+
+async def acreate_google_doc(document_title, document_text):
+    return await ainvoke_n8n_webhook(
+        "POST",
+        UPLOAD_GOOGLE_DOC_WEBHOOK,
+        "create_google_doc",
+        {"document_title": document_title, "document_text": document_text}
+    )
+
+summarize_slack_conversation.coroutine = asummarize_slack_conversation
+send_slack_message.coroutine = asend_slack_message
+create_google_doc.coroutine = acreate_google_doc
+
 # Maps the function names to the actual function object in the script
 # This mapping will also be used to create the list of tools to bind to the agent
 available_functions = {
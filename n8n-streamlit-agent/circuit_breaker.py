@@ -0,0 +1,159 @@
+"""
+Circuit breaker for the n8n webhooks, one breaker per webhook URL.
+
+When n8n is slow or down, every call would otherwise wait for the full timeout.
+Each breaker tracks the outcome of the last N8N_BREAKER_WINDOW calls to its URL:
+
+closed    -> calls go through. Once at least N8N_BREAKER_MINIMUM_CALLS calls were
+             made and the failure rate reaches N8N_BREAKER_FAILURE_RATE, it opens.
+open      -> calls fail fast with CircuitOpenError for N8N_BREAKER_OPEN_SECONDS.
+half_open -> after that, a single probe call is let through. If it succeeds the
+             breaker closes again, if it fails the breaker opens for another period.
+
+Timeouts, connection errors and 5xx responses count as failures. 4xx responses
+mean n8n answered, so they don't count against the workflow's health.
+
+Use get_breaker_states() to show which workflows are degraded.
+"""
+
+from collections import deque
+import threading
+import time
+import os
+
+failure_rate_threshold = float(os.getenv("N8N_BREAKER_FAILURE_RATE", "0.5"))
+minimum_calls = int(os.getenv("N8N_BREAKER_MINIMUM_CALLS", "4"))
+window_size = int(os.getenv("N8N_BREAKER_WINDOW", "10"))
+open_seconds = float(os.getenv("N8N_BREAKER_OPEN_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a webhook whose breaker is open."""
+
+    def __init__(self, url, retry_after):
+        self.url = url
+        self.retry_after = retry_after
+        super().__init__(f"The n8n workflow at {url} is unavailable right now, try again in {retry_after:.0f} seconds")
+
+class CircuitBreaker:
+    def __init__(self, url):
+        self.url = url
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.outcomes = deque(maxlen=window_size)
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.stats = {"calls": 0, "failures": 0, "rejected": 0, "times_opened": 0}
+        self.last_error = None
+
+    def before_call(self):
+        """
+        Checks if a call to the webhook is allowed right now.
+
+        Raises:
+            CircuitOpenError: If the breaker is open (or already probing) so the call should fail fast
+        """
+        with self.lock:
+            if self.state == OPEN:
+                waited = time.monotonic() - self.opened_at
+                if waited < open_seconds:
+                    self.stats["rejected"] += 1
+                    raise CircuitOpenError(self.url, open_seconds - waited)
+
+                self.state = HALF_OPEN
+                self.probe_in_flight = False
+
+            if self.state == HALF_OPEN:
+                # Only one probe at a time, everything else keeps failing fast until it comes back
+                if self.probe_in_flight:
+                    self.stats["rejected"] += 1
+                    raise CircuitOpenError(self.url, 0)
+
+                self.probe_in_flight = True
+
+            self.stats["calls"] += 1
+
+    def record_success(self):
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.state = CLOSED
+                self.outcomes.clear()
+                self.probe_in_flight = False
+
+            self.outcomes.append(True)
+
+    def record_failure(self, error):
+        with self.lock:
+            self.stats["failures"] += 1
+            self.last_error = str(error)
+
+            if self.state == HALF_OPEN:
+                self.open()
+                return
+
+            self.outcomes.append(False)
+            failures = self.outcomes.count(False)
+            if len(self.outcomes) >= minimum_calls and failures / len(self.outcomes) >= failure_rate_threshold:
+                self.open()
+
+    def release_probe(self):
+        """Lets another probe through when a half open call ended without an outcome (e.g. it was cancelled)."""
+        with self.lock:
+            self.probe_in_flight = False
+
+    def open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.probe_in_flight = False
+        self.stats["times_opened"] += 1
+        print(f"Circuit breaker opened for n8n workflow {self.url}: {self.last_error}")
+
+    def get_state(self):
+        with self.lock:
+            failure_rate = self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+            return {
+                "state": self.state,
+                "failure_rate": failure_rate,
+                "last_error": self.last_error,
+                **self.stats
+            }
+
+breakers = {}
+breakers_lock = threading.Lock()
+
+def get_breaker(url):
+    with breakers_lock:
+        if url not in breakers:
+            breakers[url] = CircuitBreaker(url)
+
+        return breakers[url]
+
+def is_failure(error):
+    """Determines if an error from calling a webhook counts against the health of the workflow."""
+    # Works for both httpx.HTTPStatusError and requests.HTTPError
+    status_code = getattr(getattr(error, "response", None), "status_code", None)
+    if status_code is not None:
+        return status_code >= 500
+
+    return True
+
+def record_outcome(breaker, error=None):
+    if error is None or not is_failure(error):
+        breaker.record_success()
+    else:
+        breaker.record_failure(error)
+
+def get_breaker_states():
+    """
+    Gets the state of the breaker for every webhook that has been called.
+
+    Returns:
+        dict: Webhook URL -> state (closed, open or half_open), failure rate, last error and call counts
+    """
+    with breakers_lock:
+        current_breakers = list(breakers.values())
+
+    return {breaker.url: breaker.get_state() for breaker in current_breakers}
@@ -2,10 +2,16 @@ import streamlit as st
 import requests
 import uuid
 
+from circuit_breaker import get_breaker, record_outcome, get_breaker_states, CircuitOpenError
+
 # Constants
 WEBHOOK_URL = "YOUR_N8N_WEBHOOK_URL_HERE"
 BEARER_TOKEN = "YOUR_BEARER_TOKEN_HERE"
 
+# Seconds to wait for a connection to n8n and for its response
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 120
+
 def generate_session_id():
     return str(uuid.uuid4())
 
@@ -18,11 +24,35 @@ def send_message_to_llm(session_id, message):
         "sessionId": session_id,
         "chatInput": message
     }
-    response = requests.post(WEBHOOK_URL, json=payload, headers=headers)
-    if response.status_code == 200:
-        return response.json()["output"]
-    else:
-        return f"Error: {response.status_code} - {response.text}"
+
+    # Fail fast if the workflow failed too often recently instead of waiting for another timeout
+    breaker = get_breaker(WEBHOOK_URL)
+    try:
+        breaker.before_call()
+    except CircuitOpenError as e:
+        return f"Error: {str(e)}"
+
+    try:
+        response = requests.post(WEBHOOK_URL, json=payload, headers=headers, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        response.raise_for_status()
+    except requests.HTTPError as e:
+        record_outcome(breaker, e)
+        return f"Error: {e.response.status_code} - {e.response.text}"
+    except requests.RequestException as e:
+        record_outcome(breaker, e)
+        return f"Error: {str(e)}"
+    except BaseException:
+        # Streamlit stops the script with an exception on a rerun, release a half open probe
+        breaker.release_probe()
+        raise
+
+    record_outcome(breaker)
+    return response.json()["output"]
+
+def display_breaker_states():
+    for url, state in get_breaker_states().items():
+        if state["state"] != "closed":
+            st.sidebar.warning(f"n8n workflow degraded ({state['state']}): {state['last_error']}")
 
 def main():
     st.title("Chat with LLM")
@@ -55,5 +85,7 @@ def main():
         with st.chat_message("assistant"):
             st.write(llm_response)
 
+    display_breaker_states()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
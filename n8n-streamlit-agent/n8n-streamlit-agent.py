@@ -3,6 +3,8 @@ import requests
 import uuid
 from supabase import create_client, Client
 
+from circuit_breaker import get_breaker, record_outcome, get_breaker_states, CircuitOpenError
+
 # Supabase setup
 SUPABASE_URL = "YOUR_SUPABASE_PROJECT_URL_HERE"
 SUPABASE_KEY = "YOUR_SUPABASE_ANONYMOUS_API_KEY_HERE"
@@ -11,6 +13,10 @@ supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 # Webhook URL (replace with your n8n webhook URL)
 WEBHOOK_URL = "YOUR_N8N_WEBHOOK_URL_HERE"
 
+# Seconds to wait for a connection to n8n and for its response
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 120
+
 def login(email: str, password: str):
     try:
         res = supabase.auth.sign_in_with_password({"email": email, "password": password})
@@ -27,6 +33,37 @@ def signup(email: str, password: str):
         st.error(f"Signup failed: {str(e)}")
         return None
 
+def post_to_webhook(payload, headers):
+    """
+    Sends the message to the n8n webhook through its circuit breaker, so a slow
+    or down n8n instance fails fast instead of hanging every chat.
+
+    Raises:
+        CircuitOpenError: If the workflow failed too often recently and is skipped
+        requests.RequestException: If n8n couldn't be reached or timed out
+    """
+    breaker = get_breaker(WEBHOOK_URL)
+    breaker.before_call()
+
+    try:
+        response = requests.post(WEBHOOK_URL, json=payload, headers=headers, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        response.raise_for_status()
+    except requests.RequestException as e:
+        record_outcome(breaker, e)
+        raise
+    except BaseException:
+        # Streamlit stops the script with an exception on a rerun, release a half open probe
+        breaker.release_probe()
+        raise
+
+    record_outcome(breaker)
+    return response
+
+def display_breaker_states():
+    for url, state in get_breaker_states().items():
+        if state["state"] != "closed":
+            st.sidebar.warning(f"n8n workflow degraded ({state['state']}): {state['last_error']}")
+
 def generate_session_id():
     return str(uuid.uuid4())
 
@@ -103,16 +140,20 @@ def main():
             headers = {
                 "Authorization": f"Bearer {access_token}"
             }
-            with st.spinner("AI is thinking..."):
-                response = requests.post(WEBHOOK_URL, json=payload, headers=headers)
-            
-            if response.status_code == 200:
+            try:
+                with st.spinner("AI is thinking..."):
+                    response = post_to_webhook(payload, headers)
+            except requests.HTTPError as e:
+                st.error(f"Error: {e.response.status_code} - {e.response.text}")
+            except (CircuitOpenError, requests.RequestException) as e:
+                st.error(f"Error: {str(e)}")
+            else:
                 ai_message = response.json().get("output", "Sorry, I couldn't generate a response.")
                 st.session_state.messages.append({"role": "assistant", "content": ai_message})
                 with st.chat_message("assistant"):
                     st.markdown(ai_message)
-            else:
-                st.error(f"Error: {response.status_code} - {response.text}")
+
+        display_breaker_states()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
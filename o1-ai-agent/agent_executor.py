@@ -0,0 +1,233 @@
+"""
+Loop-based executor for the JSON tool calling agents.
+
+prompt_ai used to call itself again after every tool call and every error, with
+a list of invoked tools shared by every session and immediate retries. This runs
+the same prompt -> tool calls -> prompt cycle as an explicit loop instead:
+
+1. Every tool call is de-duplicated against the calls already made in the session
+   (pass the session's set as invoked_tools), so the LLM can't repeat an action.
+2. Parse errors (the LLM didn't answer with valid JSON) and transport errors (the
+   API call itself failed) are retried with capped exponential backoff, up to
+   AGENT_MAX_RETRIES times in a row.
+3. A run stops after AGENT_MAX_STEPS LLM calls or AGENT_TIME_BUDGET seconds.
+
+Each run returns the final response and a trace of every step with its timings.
+
+With on_content the completion is streamed through streaming_json.py instead, so
+the response shows up as it is written and each tool call starts in a thread pool
+as soon as its JSON object is complete, while the LLM is still generating.
+"""
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import AIMessage
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+import json
+import time
+import os
+
+from streaming_json import StreamingToolCallParser
+
+load_dotenv()
+
+max_steps = int(os.getenv('AGENT_MAX_STEPS', '10'))
+time_budget = float(os.getenv('AGENT_TIME_BUDGET', '120'))
+max_retries = int(os.getenv('AGENT_MAX_RETRIES', '3'))
+backoff_base = float(os.getenv('AGENT_BACKOFF_BASE', '0.5'))
+backoff_max = float(os.getenv('AGENT_BACKOFF_MAX', '8'))
+tool_workers = int(os.getenv('AGENT_TOOL_WORKERS', '4'))
+
+class AgentBudgetError(Exception):
+    """Raised when a run runs out of steps, time or retries before the LLM gives a response."""
+
+    def __init__(self, message, trace):
+        super().__init__(message)
+        self.trace = trace
+
+def get_backoff(attempt, base=backoff_base, maximum=backoff_max):
+    """Gets the seconds to wait before retry number attempt (starting at 1)."""
+    return min(maximum, base * 2 ** (attempt - 1))
+
+def get_tool_call_key(tool_call):
+    """Gets a key that is the same for the same tool called with the same arguments, whatever their order."""
+    return json.dumps({"name": str(tool_call.get("name", "")).lower(), "args": tool_call.get("args") or {}}, sort_keys=True, default=str)
+
+def invoke_tool(selected_tool, args):
+    # LangChain tools take the arguments as a dict, plain functions as keyword arguments
+    if hasattr(selected_tool, "invoke"):
+        return selected_tool.invoke(args)
+    return selected_tool(**args)
+
+class AgentExecutor:
+    """
+    Runs a chain that returns a parsed ToolCallOrResponse dict until the LLM answers without tool calls.
+
+    Args:
+        chain: The LLM piped into the JsonOutputParser, or with on_content just the chat model,
+            whose completion is then streamed through the StreamingToolCallParser
+        available_tools (dict): The tool name to tool (LangChain tool or function) mapping
+        add_thought (callable): Called with each "Thought:" message, defaults to appending it to the messages
+        on_content (callable): Called with each new piece of the response to the user as it streams in
+        on_step (callable): Called before every LLM call (including retries), e.g. to clear the text
+            streamed by the previous call since only the last call's content is the response
+    """
+
+    def __init__(self, chain, available_tools, add_thought=None, on_content=None, on_step=None, max_steps=max_steps,
+                 time_budget=time_budget, max_retries=max_retries, backoff_base=backoff_base,
+                 backoff_max=backoff_max, tool_workers=tool_workers):
+        self.chain = chain
+        self.available_tools = available_tools
+        self.add_thought = add_thought
+        self.on_content = on_content
+        self.on_step = on_step
+        self.max_steps = max_steps
+        self.time_budget = time_budget
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.tool_workers = tool_workers
+
+    def call_llm(self, messages, dispatch):
+        if self.on_content is None:
+            ai_response = self.chain.invoke(messages)
+            for tool_call in ai_response.get("tool_calls") or []:
+                dispatch(tool_call)
+            return ai_response
+
+        # Tool calls are dispatched as soon as their JSON object closes, while the rest is still generating
+        parser = StreamingToolCallParser()
+        for chunk in self.chain.stream(messages):
+            for event_type, value in parser.feed(chunk.content):
+                if event_type == "content":
+                    self.on_content(value)
+                else:
+                    dispatch(value)
+
+        return parser.close()
+
+    def run(self, messages, invoked_tools=None):
+        """
+        Prompts the LLM and runs its tool calls until it responds to the user.
+
+        Args:
+            messages (list): The conversation so far, thoughts are appended to it
+            invoked_tools (set): The keys of the tool calls already made in this session, updated in place
+
+        Returns:
+            tuple: (the final response dict, the trace as a list of step dicts)
+        """
+        invoked_tools = set() if invoked_tools is None else invoked_tools
+        add_thought = self.add_thought or (lambda thought: messages.append(AIMessage(content=thought)))
+        trace = []
+        start = time.perf_counter()
+        deadline = start + self.time_budget
+        failures = 0
+
+        def record(step_type, step_start, step_end=None, **details):
+            trace.append({
+                "step": len(trace) + 1,
+                "type": step_type,
+                "start": step_start - start,
+                "duration": (step_end or time.perf_counter()) - step_start,
+                **details
+            })
+
+        def run_tool(selected_tool, args):
+            tool_start = time.perf_counter()
+            try:
+                return invoke_tool(selected_tool, args), None, tool_start, time.perf_counter()
+            except Exception as e:
+                return None, e, tool_start, time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.tool_workers) as pool:
+            for llm_call in range(1, self.max_steps + 1):
+                if time.perf_counter() >= deadline:
+                    raise AgentBudgetError(f"Time budget of {self.time_budget}s used up after {llm_call - 1} LLM calls", trace)
+
+                # The tool calls of this step in order, each with its future or why it wasn't run
+                pending = []
+
+                def dispatch(tool_call):
+                    tool_name = str(tool_call.get("name", "")).lower()
+                    key = get_tool_call_key(tool_call)
+                    if key in invoked_tools or any(key == other[1] for other in pending):
+                        pending.append((tool_call, key, "duplicate"))
+                    elif tool_name not in self.available_tools:
+                        pending.append((tool_call, key, "unknown"))
+                    else:
+                        pending.append((tool_call, key, pool.submit(run_tool, self.available_tools[tool_name], tool_call.get("args") or {})))
+
+                # First, prompt the AI with the conversation so far
+                if self.on_step is not None:
+                    self.on_step()
+                step_start = time.perf_counter()
+                try:
+                    ai_response = self.call_llm(messages, dispatch)
+                except Exception as e:
+                    failures += 1
+                    error = e
+                    record("parse_error" if isinstance(e, OutputParserException) else "transport_error", step_start, error=str(e))
+                else:
+                    failures = 0
+                    error = None
+                    record("llm", step_start, tool_calls=len(pending))
+
+                # Next, add the result of each tool call as a thought for the LLM (even if the rest of the completion failed)
+                for tool_call, key, outcome in pending:
+                    tool_name = str(tool_call.get("name", "")).lower()
+                    args = tool_call.get("args") or {}
+
+                    if outcome == "duplicate":
+                        # The LLM already made the exact same tool call, so tell it to respond instead of looping
+                        add_thought(f"Thought: - I already called {tool_name} with args {args} and got a response. I need to respond to the user now and not make another tool call.")
+                        record("duplicate", time.perf_counter(), name=tool_name)
+                        continue
+
+                    if outcome == "unknown":
+                        add_thought(f"Thought: - I tried to call {tool_name} but that tool doesn't exist. The tools I have are: {', '.join(self.available_tools)}.")
+                        record("tool_error", time.perf_counter(), name=tool_name, error="unknown tool")
+                        continue
+
+                    tool_output, tool_error, tool_start, tool_end = outcome.result()
+                    if tool_error is not None:
+                        # AI gave bad arguments for the function, so add that as a thought and have the LLM correct itself
+                        add_thought(f"Thought: - I called {tool_name} with args {args} but my arguments were wrong so I got this error: {tool_error}.")
+                        record("tool_error", tool_start, tool_end, name=tool_name, error=str(tool_error))
+                        continue
+
+                    # Add a thought so the LLM knows the result of invoking the tool
+                    add_thought(f"Thought: - I called {tool_name} with args {args} and got back: {tool_output}.")
+                    invoked_tools.add(key)
+                    record("tool", tool_start, tool_end, name=tool_name)
+
+                if error is not None:
+                    if failures > self.max_retries:
+                        raise AgentBudgetError(f"Failsafe - AI failed {failures} times in a row, last error: {error}", trace) from error
+
+                    # Back off before retrying, unless the wait alone would use up the time budget
+                    wait = get_backoff(failures, self.backoff_base, self.backoff_max)
+                    if time.perf_counter() + wait >= deadline:
+                        raise AgentBudgetError(f"Time budget of {self.time_budget}s used up retrying, last error: {error}", trace) from error
+                    time.sleep(wait)
+                    continue
+
+                # Finally, the AI is done once it responds without tool calls
+                if not pending:
+                    return ai_response, trace
+
+        raise AgentBudgetError(f"Failsafe - AI used all {self.max_steps} steps without responding to the user", trace)
+
+def format_trace(trace):
+    """Formats a run's trace as one line per step, for printing or showing in the UI."""
+    lines = []
+    for step in trace:
+        line = f"{step['step']}. {step['type']}"
+        if step.get("name"):
+            line += f" {step['name']}"
+        line += f" at {step['start']:.2f}s took {step['duration']:.2f}s"
+        if step.get("error"):
+            line += f" - {step['error']}"
+        lines.append(line)
+
+    return "\n".join(lines)
@@ -14,10 +14,14 @@ from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.pydantic_v1 import BaseModel, Field
 from langchain_core.messages import AIMessage, HumanMessage
 
+from agent_executor import AgentExecutor, AgentBudgetError, format_trace
+from prompt_cache import PromptCacheCallbackHandler, prompt_cache_tracker
+
 load_dotenv()
 
 model = os.getenv('LLM_MODEL', 'o1-mini')
 show_thoughts = os.getenv('SHOW_THOUGHTS', 'true').lower() in ["true", "yes", "1"]
+stream_response = os.getenv('STREAM_RESPONSE', 'true').lower() in ["true", "yes", "1"]
 
 configuration = asana.Configuration()
 configuration.access_token = os.getenv('ASANA_ACCESS_TOKEN', '')
@@ -256,52 +260,58 @@ def add_thought(thought):
         with st.chat_message("assistant"):
             st.markdown(thought)       
 
-def prompt_ai(nested_calls=0, invoked_tools=[]):
-    if nested_calls > 10:
-        raise Exception("Failsafe - AI is failing too much!")
-
-    # First, prompt the AI with the latest user message
-    parser = JsonOutputParser(pydantic_object=ToolCallOrResponse)
-    asana_chatbot = ChatOpenAI(model=model, temperature=1) | parser
+class StreamedResponse:
+    """
+    Shows the response to the user in the chat as it streams in, in a chat
+    message that is only added once the first text arrives (after any thoughts).
+    """
+    def __init__(self):
+        self.placeholder = None
+        self.text = ""
+
+    def write(self, text):
+        if self.placeholder is None:
+            self.placeholder = st.chat_message("assistant").empty()
+
+        self.text += text
+        self.placeholder.markdown(self.text + "▌")
+
+    def clear(self):
+        # Text from a step that called tools (or failed and is retried) isn't the final response
+        self.text = ""
+        if self.placeholder is not None:
+            self.placeholder.empty()
+
+# Prints the cached and uncached prompt tokens of every call to the LLM
+prompt_cache_callback = PromptCacheCallbackHandler(prompt_cache_tracker, label="o1")
+
+def prompt_ai(streamed_response=None):
+    if streamed_response is not None:
+        # The chat model on its own, its completion is parsed as it streams in so tool calls can start early
+        asana_chatbot = ChatOpenAI(
+            model=model,
+            temperature=1,
+            callbacks=[prompt_cache_callback],
+            model_kwargs={"stream_options": {"include_usage": True}}
+        )
+        executor = AgentExecutor(asana_chatbot, available_tools, add_thought=add_thought, on_content=streamed_response.write, on_step=streamed_response.clear)
+    else:
+        # The LLM piped into the parser, run in a loop by the executor until it responds to the user
+        parser = JsonOutputParser(pydantic_object=ToolCallOrResponse)
+        asana_chatbot = ChatOpenAI(model=model, temperature=1, callbacks=[prompt_cache_callback]) | parser
+        executor = AgentExecutor(asana_chatbot, available_tools, add_thought=add_thought)
+
+    # The tool calls already made are remembered per session so the LLM can't repeat an action
+    if "invoked_tools" not in st.session_state:
+        st.session_state.invoked_tools = set()
 
     try:
-        ai_response = asana_chatbot.invoke(st.session_state.messages)
-    except Exception as e:
-        print(e)
-        return prompt_ai(nested_calls + 1)
-    print(ai_response)
-
-    # Second, see if the AI decided it needs to invoke a tool
-    has_tool_calls = len(ai_response["tool_calls"]) > 0
-    if has_tool_calls:
-        # Next, for each tool the AI wanted to call, call it and add the tool result to the list of messages as a "thought" for the LLM
-        for tool_call in ai_response["tool_calls"]:
-            if str(tool_call) not in invoked_tools:
-                tool_name = tool_call["name"].lower()
-                selected_tool = available_tools[tool_name]
-
-                # Invoke the tool and add the response as a thought
-                try:
-                    tool_output = selected_tool.invoke(tool_call["args"])
-                except Exception as e:
-                    # AI gave bad arguments for the function, so add that as a thought and have the LLM correct itself
-                    add_thought(f"Thought: - I called {tool_name} with args {tool_call['args']} but my arguments were wrong so I got this error: {e}.")   
-                    return prompt_ai(nested_calls + 1, invoked_tools)
-
-                print(tool_output)
-
-                # Add a thought so the LLM knows the result of invoking the tool
-                add_thought(f"Thought: - I called {tool_name} with args {tool_call['args']} and got back: {tool_output}.")    
-
-                # Add to the list of tool calls so this app can prevent the LLM from repeating itself
-                invoked_tools.append(str(tool_call))  
-            else:
-                # In this case the LLM already tried to make the exact same tool call. So add a thought for that so it doesn't loop.
-                add_thought(f"Thought: - I already called {tool_call['name']} with args {tool_call['args']} and got a response. I need to respond to the user now and not make another tool call.")                            
-
-        # Prompt the AI again now that the result of calling the tool(s) has been added to the chat history
-        return prompt_ai(nested_calls + 1, invoked_tools)
+        ai_response, trace = executor.run(st.session_state.messages, st.session_state.invoked_tools)
+    except AgentBudgetError as e:
+        ai_response, trace = {"tool_calls": [], "content": f"Sorry, I couldn't finish that request. {e}"}, e.trace
 
+    print(format_trace(trace))
+    st.session_state.last_trace = trace
     return ai_response
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -316,7 +326,9 @@ def main():
     # Initialize chat history
     if "messages" not in st.session_state:
         st.session_state.messages = [
-            HumanMessage(content=f"You are a personal assistant who helps manage tasks in Asana. The current date is: {datetime.now().date()}.\n{tool_text}")
+            # The static instructions and tool descriptions come first and the date last, so the start of
+            # every prompt is byte for byte the same and OpenAI's prompt caching can reuse it
+            HumanMessage(content=f"You are a personal assistant who helps manage tasks in Asana.\n{tool_text}\nThe current date is: {datetime.now().date()}.")
         ]
 
     # Display chat messages from history on app rerun
@@ -336,9 +348,19 @@ def main():
         st.session_state.messages.append(HumanMessage(content=prompt))
 
         # Display assistant response in chat message container
-        ai_response = prompt_ai()
-        with st.chat_message("assistant"):
+        streamed_response = StreamedResponse() if stream_response else None
+        ai_response = prompt_ai(streamed_response)
+        if streamed_response is not None and streamed_response.placeholder is not None:
+            # Replace the streamed text (and its cursor) with the final response
+            response_container = streamed_response.placeholder.container()
+        else:
+            response_container = st.chat_message("assistant")
+
+        with response_container:
             st.markdown(ai_response['content'])
+            if show_thoughts:
+                with st.expander("Agent trace"):
+                    st.text(format_trace(st.session_state.last_trace))
         
         st.session_state.messages.append(AIMessage(content=ai_response['content']))
 
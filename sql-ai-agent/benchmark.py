@@ -0,0 +1,233 @@
+"""
+Benchmark of the swarm SQL agents on a (large) RSS feed database.
+
+For a set of representative questions this measures:
+
+1. SQL: the time to run the question's SELECT and format its results (median of
+   the rounds), and the size of the results that end up in the prompt
+2. Agent: the end-to-end latency of the whole swarm (router -> handoff -> SQL
+   agent -> tool call -> answer) with the LLM replaced by a stub, once with a
+   cold result cache and once warm, plus the number of LLM calls and the
+   estimated prompt tokens sent
+
+The stub LLM returns real openai ChatCompletion objects and plays the part of the
+model by transferring to the question's agent and calling run_sql_select_statement
+with the question's SQL, so everything except the model itself runs for real.
+Set BENCHMARK_LLM_LATENCY to add a fixed number of seconds per LLM call.
+
+Generate a big database with synthetic_data.py first, then run:
+
+SQL_DATABASE_PATH=synthetic-rss-feed-database.db python benchmark.py
+
+Optionally with the number of SQL rounds and a path to save the results as JSON:
+
+python benchmark.py 5 benchmark-results.json
+"""
+
+from openai.types.chat.chat_completion_message_tool_call import ChatCompletionMessageToolCall, Function
+from openai.types.chat.chat_completion import ChatCompletion, Choice
+from openai.types.chat import ChatCompletionMessage
+from types import SimpleNamespace
+from swarm import Swarm
+import statistics
+import json
+import time
+import sys
+import os
+
+from sql_agents import sql_router_agent, format_sql_results
+from db_connection import read_only_cursor, database_path
+from schema_context import estimate_tokens
+from sql_cache import result_cache
+
+llm_latency = float(os.getenv('BENCHMARK_LLM_LATENCY', '0'))
+
+# The agent that should answer each question (the function the router transfers with) and the SQL it should run
+questions = [
+    {
+        "question": "Which feeds publish in French?",
+        "transfer": "transfer_to_rss_feeds_agent",
+        "sql": "SELECT name, url FROM rss_feeds WHERE language = 'fr'"
+    },
+    {
+        "question": "What are the 10 most recent articles?",
+        "transfer": "transfer_to_rss_feeds_agent",
+        "sql": "SELECT title, published_date FROM rss_items ORDER BY published_date DESC LIMIT 10"
+    },
+    {
+        "question": "Show me all the articles.",
+        "transfer": "transfer_to_rss_feeds_agent",
+        "sql": "SELECT * FROM rss_items"
+    },
+    {
+        "question": "Which categories does user42 follow?",
+        "transfer": "transfer_to_user_agent",
+        "sql": """SELECT c.name FROM users u
+            JOIN user_category_preferences p ON p.user_id = u.id
+            JOIN categories c ON c.id = p.category_id
+            WHERE u.username = 'user42'"""
+    },
+    {
+        "question": "How many users signed up each month in 2023?",
+        "transfer": "transfer_to_user_agent",
+        "sql": """SELECT strftime('%Y-%m', created_at) AS month, COUNT(*) AS signups FROM users
+            WHERE created_at >= '2023-01-01' AND created_at < '2024-01-01' GROUP BY month ORDER BY month"""
+    },
+    {
+        "question": "How many articles has each feed published?",
+        "transfer": "transfer_to_analytics_agent",
+        "sql": """SELECT f.name, COUNT(i.id) AS articles FROM rss_feeds f
+            LEFT JOIN rss_items i ON i.rss_feed_id = f.id GROUP BY f.id ORDER BY articles DESC"""
+    },
+    {
+        "question": "Which 10 articles got the most likes?",
+        "transfer": "transfer_to_analytics_agent",
+        "sql": """SELECT i.title, COUNT(*) AS likes FROM article_interactions a
+            JOIN rss_items i ON i.id = a.rss_item_id WHERE a.interaction_type = 'like'
+            GROUP BY a.rss_item_id ORDER BY likes DESC LIMIT 10"""
+    },
+    {
+        "question": "What are the most popular categories by number of article views?",
+        "transfer": "transfer_to_analytics_agent",
+        "sql": """SELECT c.name, COUNT(*) AS views FROM article_interactions a
+            JOIN rss_item_categories ic ON ic.rss_item_id = a.rss_item_id
+            JOIN categories c ON c.id = ic.category_id
+            WHERE a.interaction_type = 'view' GROUP BY c.id ORDER BY views DESC"""
+    }
+]
+
+def get_completion(content=None, tool_call=None):
+    tool_calls = None
+    if tool_call is not None:
+        name, arguments = tool_call
+        tool_calls = [ChatCompletionMessageToolCall(
+            id=f"call_{time.perf_counter_ns()}",
+            type="function",
+            function=Function(name=name, arguments=json.dumps(arguments))
+        )]
+
+    return ChatCompletion(
+        id=f"chatcmpl-{time.perf_counter_ns()}",
+        object="chat.completion",
+        created=int(time.time()),
+        model="benchmark-stub",
+        choices=[Choice(
+            index=0,
+            finish_reason="tool_calls" if tool_calls else "stop",
+            message=ChatCompletionMessage(role="assistant", content=content, tool_calls=tool_calls)
+        )]
+    )
+
+class StubLLMClient:
+    """
+    Stands in for the OpenAI client Swarm calls (client.chat.completions.create).
+
+    It routes to the agent and SQL of the benchmark question being asked, and
+    counts the calls and the estimated prompt tokens.
+    """
+
+    def __init__(self, latency=llm_latency):
+        self.latency = latency
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.questions = {question["question"]: question for question in questions}
+
+    def create(self, messages, tools=None, **kwargs):
+        self.calls += 1
+        self.prompt_tokens += estimate_tokens(json.dumps(messages) + json.dumps(tools or []))
+        if self.latency:
+            time.sleep(self.latency)
+
+        question = self.questions[next(message["content"] for message in messages if message["role"] == "user")]
+        tool_names = [tool["function"]["name"] for tool in tools or []]
+        last_message = messages[-1]
+
+        if "run_sql_select_statement" in tool_names:
+            if last_message.get("tool_name") == "run_sql_select_statement":
+                return get_completion(content=f"Here is what I found:\n{last_message['content'][:500]}")
+            return get_completion(tool_call=("run_sql_select_statement", {"sql_statement": question["sql"]}))
+
+        if question["transfer"] in tool_names:
+            return get_completion(tool_call=(question["transfer"], {}))
+
+        return get_completion(content="I can't help with that.")
+
+def benchmark_sql(question, rounds):
+    """Times running a question's SQL and formatting the results, without the result cache."""
+    durations = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        with read_only_cursor() as cursor:
+            cursor.execute(question["sql"])
+            results = format_sql_results(cursor)
+        durations.append(time.perf_counter() - start)
+
+    # The formatted results are a header, a separator, the rows and a notice line if they were truncated
+    truncated = "results truncated" in results
+    return {
+        "sql_median_ms": statistics.median(durations) * 1000,
+        "result_bytes": len(results.encode()),
+        "result_rows": max(0, results.count("\n") - 2 - truncated),
+        "truncated": truncated
+    }
+
+def benchmark_agent(question):
+    """Times the whole swarm answering a question with the stub LLM, with a cold and then a warm result cache."""
+    client = StubLLMClient()
+    swarm = Swarm(client=client)
+    timings = {}
+
+    for run in ("cold", "warm"):
+        if run == "cold":
+            result_cache.clear()
+
+        start = time.perf_counter()
+        swarm.run(
+            agent=sql_router_agent,
+            messages=[{"role": "user", "content": question["question"]}],
+            context_variables={"question": question["question"]},
+            max_turns=10
+        )
+        timings[f"agent_{run}_ms"] = (time.perf_counter() - start) * 1000
+
+    timings["llm_calls"] = client.calls // 2
+    timings["prompt_tokens"] = client.prompt_tokens // 2
+    return timings
+
+def run_benchmark(rounds=3):
+    """
+    Runs every benchmark question.
+
+    Returns:
+        list: One dict per question with the SQL and agent measurements
+    """
+    results = []
+    for question in questions:
+        print(f"Benchmarking: {question['question']}")
+        result = {"question": question["question"], **benchmark_sql(question, rounds), **benchmark_agent(question)}
+        results.append(result)
+
+    return results
+
+def print_results(results):
+    print(f"\nDatabase: {database_path}, stub LLM latency: {llm_latency}s per call\n")
+    print(f"{'Question':<46} | {'SQL ms':>8} | {'Rows':>5} | {'Bytes':>6} | {'Agent cold ms':>13} | {'Agent warm ms':>13} | {'LLM calls':>9} | {'Prompt tok':>10}")
+    print("-" * 132)
+    for result in results:
+        rows = f"{result['result_rows']}{'+' if result['truncated'] else ''}"
+        print(
+            f"{result['question'][:46]:<46} | {result['sql_median_ms']:>8.2f} | {rows:>5} | {result['result_bytes']:>6} | "
+            f"{result['agent_cold_ms']:>13.2f} | {result['agent_warm_ms']:>13.2f} | {result['llm_calls']:>9} | {result['prompt_tokens']:>10}"
+        )
+
+    print("\n+ = results truncated by the row/size caps")
+
+if __name__ == "__main__":
+    results = run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
+    print_results(results)
+
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "w") as results_file:
+            json.dump({"database": database_path, "llm_latency": llm_latency, "results": results}, results_file, indent=2)
+        print(f"Saved the results to {sys.argv[2]}")
@@ -0,0 +1,99 @@
+"""
+Read-only connections to the RSS feed SQLite database for the SQL agents.
+
+Every thread gets its own connection (a sqlite3 connection and its cursors must
+not be shared between threads), so several swarm sessions can query in parallel
+without interleaving on one cursor. The connections can't change the database:
+
+- The database is opened with a mode=ro URI
+- PRAGMA query_only is turned on as a second line of defense
+- load_sql_data.py puts the database in WAL mode so readers never block each other
+
+Each statement also gets a timeout (SQL_STATEMENT_TIMEOUT seconds) enforced
+through a progress handler, so a runaway query written by the LLM is interrupted
+instead of hanging the agent.
+
+Example usage:
+
+from db_connection import read_only_cursor
+
+with read_only_cursor() as cursor:
+    cursor.execute("SELECT * FROM rss_feeds")
+    rows = cursor.fetchmany(10)
+"""
+
+from contextlib import contextmanager
+from dotenv import load_dotenv
+import threading
+import sqlite3
+import time
+import os
+
+load_dotenv()
+
+database_path = os.getenv('SQL_DATABASE_PATH', 'rss-feed-database.db')
+statement_timeout = float(os.getenv('SQL_STATEMENT_TIMEOUT', '10'))
+
+# How many SQLite virtual machine instructions run between timeout checks
+progress_handler_interval = 10000
+
+thread_local = threading.local()
+
+class StatementTimeoutError(Exception):
+    """Raised when a statement ran longer than the statement timeout and was interrupted."""
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        super().__init__(f"The SQL statement took longer than {timeout:g} seconds and was cancelled")
+
+def connect_read_only(path=database_path):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Database {path} not found, run load_sql_data.py first")
+
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+def get_connection():
+    """Gets the read-only connection of the current thread, opening it the first time."""
+    conn = getattr(thread_local, "conn", None)
+    if conn is None:
+        conn = connect_read_only()
+        thread_local.conn = conn
+
+    return conn
+
+@contextmanager
+def read_only_cursor(timeout=statement_timeout):
+    """
+    Gives a cursor on the current thread's read-only connection with the statement timeout active.
+
+    The timeout covers both executing the statement and fetching its rows, since
+    SQLite does most of the work of a SELECT while the rows are being stepped through.
+
+    Args:
+        timeout (float): Seconds before the statement is interrupted (0 disables the timeout)
+
+    Raises:
+        StatementTimeoutError: If the statement ran longer than the timeout
+    """
+    conn = get_connection()
+    deadline = time.monotonic() + timeout
+
+    def check_deadline():
+        # A non-zero return value makes SQLite interrupt the statement
+        return 1 if time.monotonic() > deadline else 0
+
+    if timeout > 0:
+        conn.set_progress_handler(check_deadline, progress_handler_interval)
+
+    cursor = conn.cursor()
+    try:
+        yield cursor
+    except sqlite3.OperationalError as e:
+        if timeout > 0 and "interrupted" in str(e):
+            raise StatementTimeoutError(timeout) from e
+        raise
+    finally:
+        cursor.close()
+        conn.set_progress_handler(None, 0)
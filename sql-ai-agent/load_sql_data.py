@@ -1,4 +1,7 @@
+import itertools
 import sqlite3
+import time
+import sys
 
 """
 This script is used to create a SQLlite database, add tables
@@ -11,35 +14,102 @@ python load_sql_data.py
 
 And then you will have a database loaded and ready to use
 with the agent swarm!
+
+To load test the agents on a bigger database, you can also add
+any number of generated RSS items on top of the mock data:
+
+python load_sql_data.py 2000000
 """
 
-def execute_sql_script(cursor, script_file):
+database_path = 'rss-feed-database.db'
+batch_size = 10000
+
+def set_bulk_load_pragmas(conn):
+    # WAL mode is stored in the database file, it lets the agents' read-only
+    # connections query in parallel without blocking each other
+    conn.execute("PRAGMA journal_mode = WAL")
+    # Only sync at checkpoints and keep temp data in memory, the load can simply be rerun if it crashes
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -65536")
+
+def execute_sql_script(conn, script_file):
     # Opens the .sql file given as script_file
     with open(script_file, 'r') as sql_file:
         sql_script = sql_file.read()
-    
-    # Gets all the sql commands and executes them one at a time
-    statements = sql_script.split(';')
-    for statement in statements:
-        if statement.strip():
-            cursor.execute(statement)
+
+    # SQLite parses the statements itself (so semicolons inside string literals
+    # are fine) and the whole file is applied in a single transaction
+    conn.executescript(f"BEGIN;\n{sql_script}\nCOMMIT;")
+
+def bulk_insert(conn, table, columns, rows):
+    """
+    Inserts rows with executemany in batches, all in one transaction.
+
+    Args:
+        conn (sqlite3.Connection): The database connection
+        table (str): The table to insert into
+        columns (list): The columns the rows have values for
+        rows (iterable): The rows to insert, can be a generator so they are never all in memory
+
+    Returns:
+        int: The number of rows inserted
+    """
+    statement = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    inserted = 0
+    start = time.perf_counter()
+
+    with conn:
+        rows = iter(rows)
+        while batch := list(itertools.islice(rows, batch_size)):
+            conn.executemany(statement, batch)
+            inserted += len(batch)
+
+            if inserted % (batch_size * 50) == 0:
+                print(f"  {table}: {inserted:,} rows ({inserted / (time.perf_counter() - start):,.0f} rows/s)")
+
+    elapsed = time.perf_counter() - start
+    print(f"Inserted {inserted:,} rows into {table} in {elapsed:.2f}s ({inserted / elapsed if elapsed else 0:,.0f} rows/s)")
+    return inserted
+
+def generate_mock_rss_items(conn, count):
+    """Yields count mock RSS items spread over the feeds in the database, without building them all in memory."""
+    feed_ids = [row[0] for row in conn.execute("SELECT id FROM rss_feeds")]
+
+    for i in range(count):
+        feed_id = feed_ids[i % len(feed_ids)]
+        yield (
+            feed_id,
+            f"Generated article {i} about AI",
+            f"https://example.com/feeds/{feed_id}/articles/{i}",
+            f"Mock description for generated article {i}",
+            f"Mock content for generated article {i}",
+            f"2023-{(i % 12) + 1:02d}-{(i % 28) + 1:02d} {(i % 24):02d}:{(i % 60):02d}:00",
+            f"Author {i % 500}"
+        )
 
 def main():
     # Connect to the database
-    conn = sqlite3.connect('rss-feed-database.db')
-    cursor = conn.cursor()
+    conn = sqlite3.connect(database_path)
+    set_bulk_load_pragmas(conn)
 
     # Execute SQL script to create tables for the AI RSS Feed system
-    execute_sql_script(cursor, 'ai-news-complete-tables.sql')
-    conn.commit()
+    execute_sql_script(conn, 'ai-news-complete-tables.sql')
 
     # Execute SQL script to insert mock data for the AI RSS Feed system
-    execute_sql_script(cursor, 'ai-news-complete-mock-data.sql')
-    conn.commit()
+    execute_sql_script(conn, 'ai-news-complete-mock-data.sql')
+
+    # Add generated RSS items if a number was given
+    if len(sys.argv) > 1:
+        bulk_insert(
+            conn,
+            "rss_items",
+            ["rss_feed_id", "title", "link", "description", "content", "published_date", "author"],
+            generate_mock_rss_items(conn, int(sys.argv[1]))
+        )
 
     # Query table to make sure things are looking good
-    cursor.execute("SELECT * FROM rss_feeds")
-    feeds = cursor.fetchall()
+    feeds = conn.execute("SELECT * FROM rss_feeds").fetchall()
     for feed in feeds:
         print(feed)
 
@@ -1,5 +1,36 @@
-from swarm.repl import run_demo_loop
+from swarm.repl.repl import process_and_print_streaming_response, pretty_print_messages
+from swarm import Swarm
+
 from sql_agents import sql_router_agent
 
+def run_demo_loop(starting_agent, context_variables=None, stream=False, debug=False) -> None:
+    # Same as swarm.repl.run_demo_loop, but passes the question to the agents in the context
+    # variables so they only put the tables relevant to it in their instructions
+    client = Swarm()
+    print("Starting Swarm CLI 🐝")
+
+    messages = []
+    agent = starting_agent
+
+    while True:
+        user_input = input("\033[90mUser\033[0m: ")
+        messages.append({"role": "user", "content": user_input})
+
+        response = client.run(
+            agent=agent,
+            messages=messages,
+            context_variables={**(context_variables or {}), "question": user_input},
+            stream=stream,
+            debug=debug,
+        )
+
+        if stream:
+            response = process_and_print_streaming_response(response)
+        else:
+            pretty_print_messages(response.messages)
+
+        messages.extend(response.messages)
+        agent = response.agent
+
 if __name__ == "__main__":
     run_demo_loop(sql_router_agent)
\ No newline at end of file
@@ -1,64 +1,135 @@
 from swarm import Agent
 import sqlite3
+import os
 
-conn = sqlite3.connect('rss-feed-database.db')
-cursor = conn.cursor()
+from db_connection import read_only_cursor, StatementTimeoutError
+from index_advisor import inspect_statement
+from sql_cache import result_cache
+from schema_context import get_schema_context
 
-with open("ai-news-complete-tables.sql", "r") as table_schema_file:
-    table_schemas = table_schema_file.read()
+# Caps on how much of a query result is put in the prompt
+max_result_rows = int(os.getenv('SQL_MAX_RESULT_ROWS', '200'))
+max_result_bytes = int(os.getenv('SQL_MAX_RESULT_BYTES', '16000'))
+max_column_width = int(os.getenv('SQL_MAX_COLUMN_WIDTH', '80'))
+width_sample_size = 50
 
-def run_sql_select_statement(sql_statement):
-    """Executes a SQL SELECT statement and returns the results of running the SELECT. Make sure you have a full SQL SELECT query created before calling this function."""
-    print(f"Executing SQL statement: {sql_statement}")
-    cursor.execute(sql_statement)
-    records = cursor.fetchall()
+def format_sql_results(cursor, max_rows=max_result_rows, max_bytes=max_result_bytes):
+    """
+    Formats the results of an executed query as a table without loading the whole result set.
+
+    Rows are pulled with fetchmany until max_rows or max_bytes is reached, and the
+    column widths are computed from the first batch only (longer values just push
+    their row out of alignment) so the rows are only walked once.
 
-    if not records:
+    Args:
+        cursor (sqlite3.Cursor): A cursor the SELECT statement was executed on
+        max_rows (int): The maximum number of rows to include
+        max_bytes (int): The maximum size of the formatted table in bytes
+
+    Returns:
+        str: The formatted table, ending with a notice if the results were truncated
+    """
+    rows = cursor.fetchmany(min(width_sample_size, max_rows))
+    if not rows:
         return "No results found."
     
     # Get column names
     column_names = [description[0] for description in cursor.description]
     
-    # Calculate column widths
+    # Calculate column widths from the sample (capped so one long value doesn't pad every row)
     col_widths = [len(name) for name in column_names]
-    for row in records:
+    for row in rows:
         for i, value in enumerate(row):
-            col_widths[i] = max(col_widths[i], len(str(value)))
-    
-    # Format the results
-    result_str = ""
+            col_widths[i] = min(max(col_widths[i], len(str(value))), max_column_width)
     
     # Add header
     header = " | ".join(name.ljust(width) for name, width in zip(column_names, col_widths))
-    result_str += header + "\n"
-    result_str += "-" * len(header) + "\n"
-    
-    # Add rows
-    for row in records:
-        row_str = " | ".join(str(value).ljust(width) for value, width in zip(row, col_widths))
-        result_str += row_str + "\n"
-    
-    return result_str    
+    lines = [header, "-" * len(header)]
+    size = len(header.encode()) * 2 + 2
+
+    # Add rows, fetching more in batches until a cap is hit or the results run out
+    row_count = 0
+    truncated = None
+    while rows and truncated is None:
+        for row in rows:
+            if row_count >= max_rows:
+                truncated = f"row limit of {max_rows}"
+                break
+
+            row_str = " | ".join(str(value).ljust(width) for value, width in zip(row, col_widths))
+            size += len(row_str.encode()) + 1
+            if size > max_bytes:
+                truncated = f"size limit of {max_bytes} bytes"
+                break
+
+            lines.append(row_str)
+            row_count += 1
+        else:
+            rows = cursor.fetchmany(width_sample_size)
+
+    if truncated is not None:
+        lines.append(f"... results truncated after {row_count} rows ({truncated}). "
+                     "Use a more specific query, aggregates or a LIMIT to get the rest.")
+
+    return "\n".join(lines) + "\n"
+
+def inspect_query_plan(cursor, sql_statement):
+    # Logs full scans of large tables for the index advisor, never gets in the way of the query itself
+    try:
+        for scan in inspect_statement(cursor, sql_statement):
+            print(f"Full scan of {scan['table']} ({scan['rows']} rows), index candidates: {scan['columns']}")
+    except sqlite3.Error:
+        pass
+
+def run_sql_select_statement(sql_statement):
+    """Executes a SQL SELECT statement and returns the results of running the SELECT. Make sure you have a full SQL SELECT query created before calling this function."""
+    print(f"Executing SQL statement: {sql_statement}")
+    try:
+        # Each thread (swarm session) queries through its own read-only connection
+        with read_only_cursor() as cursor:
+            # The agents often repeat a query across turns and handoffs, reuse the results if the DB hasn't changed
+            results = result_cache.get(sql_statement, cursor.connection)
+            if results is not None:
+                print(f"Using cached results (cache hit rate: {result_cache.get_stats()['hit_rate']:.0%})")
+                return results
+
+            inspect_query_plan(cursor, sql_statement)
+            cursor.execute(sql_statement)
+            results = format_sql_results(cursor)
+            result_cache.put(sql_statement, results, cursor.connection)
+
+        return results
+    except (sqlite3.Error, StatementTimeoutError) as e:
+        # Returned to the agent so it can fix the statement instead of crashing the swarm
+        return f"Error executing the SQL statement: {e}"
 
 def get_sql_router_agent_instructions():
     return """You are an orchestrator of different SQL data experts and it is your job to
     determine which of the agent is best suited to handle the user's request, 
     and transfer the conversation to that agent."""
 
-def get_sql_agent_instructions():
-    return f"""You are a SQL expert who takes in a request from a user for information
+def get_sql_agent_instructions(specialty):
+    def instructions(context_variables):
+        # Swarm calls this every turn, so only the tables relevant to the current question are sent
+        table_schemas = get_schema_context(context_variables.get("question"))
+
+        return f"""You are a SQL expert who takes in a request from a user for information
     they want to retrieve from the DB, creates a SELECT statement to retrieve the
     necessary information, and then invoke the function to run the query and
     get the results back to then report to the user the information they wanted to know.
     
-    Here are the table schemas for the DB you can query:
+    Here are the tables (name: columns, pk = primary key, -> = foreign key) in the DB you can query:
     
     {table_schemas}
 
     Write all of your SQL SELECT statements to work 100% with these schemas and nothing else.
     You are always willing to create and execute the SQL statements to answer the user's question.
+
+    {specialty}
     """
 
+    return instructions
+
 
 sql_router_agent = Agent(
     name="Router Agent",
@@ -66,17 +137,17 @@ sql_router_agent = Agent(
 )
 rss_feed_agent = Agent(
     name="RSS Feed Agent",
-    instructions=get_sql_agent_instructions() + "\n\nHelp the user with data related to RSS feeds. Be super enthusiastic about how many great RSS feeds there are in every one of your responses.",
+    instructions=get_sql_agent_instructions("Help the user with data related to RSS feeds. Be super enthusiastic about how many great RSS feeds there are in every one of your responses."),
     functions=[run_sql_select_statement]
 )
 user_agent = Agent(
     name="User Agent",
-    instructions=get_sql_agent_instructions() + "\n\nHelp the user with data related to users.",
+    instructions=get_sql_agent_instructions("Help the user with data related to users."),
     functions=[run_sql_select_statement],
 )
 analytics_agent = Agent(
     name="Analytics Agent",
-    instructions=get_sql_agent_instructions() + "\n\nHelp the user gain insights from the data with analytics. Be super accurate in reporting numbers and citing sources.",
+    instructions=get_sql_agent_instructions("Help the user gain insights from the data with analytics. Be super accurate in reporting numbers and citing sources."),
     functions=[run_sql_select_statement],
 )
 
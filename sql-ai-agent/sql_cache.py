@@ -0,0 +1,186 @@
+"""
+Result cache for the SELECT statements the SQL agents run.
+
+The router, RSS feed, user and analytics agents often run the same SELECT again
+on a later turn or right after a handoff. The formatted results are cached under
+a fingerprint of the statement (comments removed, whitespace collapsed and
+lowercased outside of string literals), so formatting differences between the
+agents still hit the same entry.
+
+An entry is only served while the database hasn't changed since it was cached.
+Changes are detected with the modification time and size of the database file
+and its WAL file, plus PRAGMA data_version, which SQLite bumps for a connection
+whenever another connection commits to the database.
+
+Entries are evicted least recently used first once the cached results take more
+than SQL_CACHE_MAX_BYTES. Setting it to 0 turns the cache off.
+"""
+
+from collections import OrderedDict
+import threading
+import re
+import os
+
+from db_connection import database_path
+
+max_cache_bytes = int(os.getenv('SQL_CACHE_MAX_BYTES', str(4 * 1024 * 1024)))
+
+# String literals are kept as is, everything else is normalized
+literal_pattern = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+comment_pattern = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+
+def fingerprint_statement(sql_statement):
+    """
+    Normalizes a SQL statement so equivalent statements get the same cache key.
+
+    Example:
+
+    fingerprint_statement("SELECT *\\n  FROM Users WHERE name = 'Jane';")
+    -> "select * from users where name = 'Jane'"
+    """
+    parts = literal_pattern.split(sql_statement)
+    normalized = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            normalized.append(part)
+        else:
+            normalized.append(re.sub(r"\s+", " ", comment_pattern.sub(" ", part).lower()))
+
+    return "".join(normalized).strip().rstrip(";").strip()
+
+def get_file_version(path=database_path):
+    """Gets (mtime, size) of the database and its WAL file, which change on every committed write."""
+    version = []
+    for file_path in (path, f"{path}-wal"):
+        try:
+            stat = os.stat(file_path)
+            version.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            version.append(None)
+
+    return tuple(version)
+
+class SQLResultCache:
+    def __init__(self, max_bytes=max_cache_bytes, path=database_path):
+        self.max_bytes = max_bytes
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+        self.file_version = None
+        self.data_versions = {}
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def update_version(self, conn, file_version, data_version):
+        """
+        Clears the cache if the database changed since the entries were cached.
+        Must be called with the lock held.
+
+        Returns:
+            bool: True if the database changed
+        """
+        # data_version is only comparable within one connection, so track it per connection
+        last_data_version = self.data_versions.get(id(conn))
+        self.data_versions[id(conn)] = data_version
+
+        changed = file_version != self.file_version or (
+            last_data_version is not None and last_data_version != data_version
+        )
+        if changed and self.entries:
+            self.entries.clear()
+            self.size = 0
+            self.stats["invalidations"] += 1
+        self.file_version = file_version
+        return changed
+
+    def check_version(self, conn):
+        """Clears the cache if the database changed since the entries were cached."""
+        file_version = get_file_version(self.path)
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+
+        with self.lock:
+            self.update_version(conn, file_version, data_version)
+
+    def get(self, sql_statement, conn):
+        """
+        Gets the cached results of a statement.
+
+        Args:
+            sql_statement (str): The SELECT statement
+            conn (sqlite3.Connection): The connection the statement would run on
+
+        Returns:
+            str: The formatted results, or None if they aren't cached
+        """
+        if self.max_bytes <= 0:
+            return None
+
+        self.check_version(conn)
+        key = fingerprint_statement(sql_statement)
+
+        with self.lock:
+            result = self.entries.get(key)
+            if result is None:
+                self.stats["misses"] += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return result
+
+    def put(self, sql_statement, result, conn):
+        """
+        Caches the results of a statement.
+
+        Args:
+            sql_statement (str): The SELECT statement
+            result (str): The formatted results
+            conn (sqlite3.Connection): The connection the statement ran on
+        """
+        size = len(result.encode())
+        if self.max_bytes <= 0 or size > self.max_bytes:
+            return
+
+        key = fingerprint_statement(sql_statement)
+        file_version = get_file_version(self.path)
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+
+        with self.lock:
+            # Checked and inserted under the same lock, so a result read before a change
+            # can't be cached after another thread already invalidated the cache for it
+            if self.update_version(conn, file_version, data_version):
+                return
+
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key).encode())
+
+            self.entries[key] = result
+            self.size += size
+
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted.encode())
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def get_stats(self):
+        """
+        Gets the cache statistics.
+
+        Returns:
+            dict: Hits, misses, hit rate, evictions, invalidations, and the number and size of the cached results
+        """
+        with self.lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self.entries)
+            stats["bytes"] = self.size
+
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+result_cache = SQLResultCache()